@@ -0,0 +1,126 @@
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+from google.cloud import certificate_manager_v1
+
+DEFAULT_INDEX_PATH = os.environ.get('CERT_EXPIRY_INDEX_PATH', '/tmp/certificate_expiry_index.sqlite3')
+LIST_PAGE_SIZE = 500
+
+class CertificateExpiryIndex:
+    """
+    A compact on-disk index of certificate expiry times, keyed by expiry.
+
+    The index is refreshed from Certificate Manager one project at a time. After a
+    project's first full refresh, later refreshes only list certificates whose
+    update_time is newer than the last one seen, so threshold queries never need
+    to call the API.
+    """
+
+    def __init__(self, path: str = DEFAULT_INDEX_PATH):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS certificates ("
+            "name TEXT PRIMARY KEY, project TEXT NOT NULL, expire_time REAL, update_time REAL);"
+            "CREATE INDEX IF NOT EXISTS certificates_by_expiry ON certificates (expire_time);"
+            "CREATE TABLE IF NOT EXISTS projects ("
+            "project TEXT PRIMARY KEY, last_update_time REAL NOT NULL, refreshed_at REAL NOT NULL);"
+        )
+        self._conn.commit()
+
+    def watermark(self, project: str) -> Optional[float]:
+        """Return the newest update_time indexed for `project`, or None if it was never refreshed."""
+        with self._lock:
+            row = self._conn.execute("SELECT last_update_time FROM projects WHERE project = ?", (project,)).fetchone()
+        return row[0] if row else None
+
+    def refresh_project(self, client: certificate_manager_v1.CertificateManagerClient, project: str,
+                        full: bool = False) -> Dict[str, int]:
+        """
+        Bring the index up to date for one project.
+
+        Args:
+            client (certificate_manager_v1.CertificateManagerClient): The client used to list certificates.
+            project (str): The GCP project ID.
+            full (bool): Re-list every certificate and drop ones that no longer exist. A project
+                that was never indexed is always refreshed in full.
+
+        Returns:
+            Dict[str, int]: The number of certificates 'listed' and 'removed'.
+        """
+        watermark = None if full else self.watermark(project)
+        request = certificate_manager_v1.ListCertificatesRequest(
+            parent=f"projects/{project}/locations/global",
+            page_size=LIST_PAGE_SIZE,
+        )
+        if watermark is not None:
+            request.filter = f'update_time > "{_to_rfc3339(watermark)}"'
+
+        rows = []
+        for certificate in client.list_certificates(request=request):
+            rows.append((
+                certificate.name,
+                project,
+                _to_epoch(certificate.expire_time),
+                _to_epoch(certificate.update_time),
+            ))
+
+        newest = max([row[3] for row in rows if row[3] is not None] + [watermark or 0.0])
+        removed = 0
+        with self._lock:
+            if watermark is None:
+                names = {row[0] for row in rows}
+                existing = [r[0] for r in self._conn.execute(
+                    "SELECT name FROM certificates WHERE project = ?", (project,))]
+                stale = [(name,) for name in existing if name not in names]
+                self._conn.executemany("DELETE FROM certificates WHERE name = ?", stale)
+                removed = len(stale)
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO certificates (name, project, expire_time, update_time) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO projects (project, last_update_time, refreshed_at) VALUES (?, ?, ?)",
+                (project, newest, time.time()),
+            )
+            self._conn.commit()
+        return {"listed": len(rows), "removed": removed}
+
+    def remove(self, name: str) -> None:
+        """Drop a certificate from the index, e.g. after it was deleted."""
+        with self._lock:
+            self._conn.execute("DELETE FROM certificates WHERE name = ?", (name,))
+            self._conn.commit()
+
+    def expiring_before(self, cutoff: float, projects: Optional[List[str]] = None) -> List[Dict]:
+        """
+        Return indexed certificates that expire before `cutoff`, soonest first.
+
+        Args:
+            cutoff (float): The epoch time to compare expiry against.
+            projects (List[str], optional): Only return certificates from these projects.
+
+        Returns:
+            List[Dict]: One dictionary per certificate with 'name', 'project' and 'expire_time'.
+        """
+        query = "SELECT name, project, expire_time FROM certificates WHERE expire_time IS NOT NULL AND expire_time <= ?"
+        params: list = [cutoff]
+        if projects:
+            query += f" AND project IN ({', '.join('?' for _ in projects)})"
+            params.extend(projects)
+        query += " ORDER BY expire_time"
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [{"name": name, "project": project, "expire_time": _to_rfc3339(expire_time)}
+                for name, project, expire_time in rows]
+
+def _to_epoch(value) -> Optional[float]:
+    if value is None:
+        return None
+    return value.timestamp()
+
+def _to_rfc3339(epoch: float) -> str:
+    return datetime.fromtimestamp(epoch, tz=timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
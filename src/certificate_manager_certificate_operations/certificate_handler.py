@@ -1,75 +1,384 @@
 from google.cloud import certificate_manager_v1
-from google.protobuf import field_mask_pb2
-from typing import Dict, List
+from google.longrunning import operations_pb2
+from google.protobuf import field_mask_pb2, json_format
+from typing import Dict, List, Optional
+import itertools
+import threading
+import time
+from certificate_manager_certificate_operations.certificate_expiry_index import CertificateExpiryIndex
+from certificate_manager_certificate_operations.certificate_validation import (
+    certificate_id, iter_bundle_pairs, iter_directory_pairs, validate_certificate
+)
+from common.batch import BATCH_ACTION, run_batch
+from common.cache import cached, invalidate
+from common.client_registry import get_client
+from common.concurrency import DEFAULT_MAX_WORKERS, run_concurrently
+from common.idempotency import idempotent
+from common.instrumentation import instrumented
+from common.jobs import JOB_ACTIONS, run_job_action
 
-def certificate_manager_certificate_create_managed(request_data: Dict) -> Dict:
-    """Create a new managed certificate."""
-    project_id = request_data['project_id']
-    name = request_data['name']
-    client = certificate_manager_v1.CertificateManagerClient()
-    parent = f"projects/{project_id}/locations/global"
-    certificate = certificate_manager_v1.Certificate(
-        name=name,
+DEFAULT_PAGE_SIZE = 100
+DEFAULT_EXPIRY_THRESHOLD_DAYS = 30
+# Bulk uploads read, validate and upload this many certificate/key pairs at a time
+BULK_UPLOAD_WINDOW = 50
+
+def get_certificate_manager_client() -> certificate_manager_v1.CertificateManagerClient:
+    """Return the shared Certificate Manager client, creating it on first use."""
+    return get_client('certificate_manager', certificate_manager_v1.CertificateManagerClient)
+
+_expiry_index: Optional[CertificateExpiryIndex] = None
+_expiry_index_lock = threading.Lock()
+
+def get_expiry_index() -> CertificateExpiryIndex:
+    """
+    Return the shared certificate expiry index, opening it on first use.
+
+    The index is a local file rather than an API client, so it is kept out of the
+    client registry and its reads and writes are not counted as RPCs.
+    """
+    global _expiry_index
+    with _expiry_index_lock:
+        if _expiry_index is None:
+            _expiry_index = CertificateExpiryIndex()
+        return _expiry_index
+
+def _remove_if_deleted(operation: operations_pb2.Operation) -> None:
+    """Drop a certificate from the expiry index once a delete operation on it has succeeded."""
+    if not operation.done or operation.HasField('error') or not operation.HasField('metadata'):
+        return
+    metadata = certificate_manager_v1.OperationMetadata.deserialize(operation.metadata.value)
+    if metadata.verb == 'delete' and metadata.target:
+        get_expiry_index().remove(metadata.target)
+
+def _certificate_cache_key(project_id: str, name: str) -> str:
+    return f"certificate:{project_id}:{name}"
+
+def _should_wait(request_data: Dict) -> bool:
+    """Return False when the caller opted out of waiting on the long-running operation."""
+    return request_data.get('wait', True) is not False
+
+def _operation_started(operation, message: str) -> Dict:
+    """Build the response for an operation that was started but not waited on."""
+    return {"message": message, "operation": operation.operation.name, "done": False}
+
+def _managed_certificate(request_data: Dict) -> certificate_manager_v1.Certificate:
+    return certificate_manager_v1.Certificate(
+        name=request_data['name'],
         description=request_data['description'],
         scope=request_data['scope'],
         managed=certificate_manager_v1.Certificate.ManagedCertificate (
             domains=request_data['domains'] ##Must be a list 
         )
     )
+
+def _self_managed_certificate(request_data: Dict) -> certificate_manager_v1.Certificate:
+    return certificate_manager_v1.Certificate(
+        name=request_data['name'],
+        description=request_data['description'],
+        scope=request_data['scope'],
+        self_managed=certificate_manager_v1.Certificate.SelfManagedCertificate(
+            pem_certificate=request_data['certificate'],
+            pem_private_key=request_data['private_key']
+        )
+    )
+
+def certificate_manager_certificate_create_managed(request_data: Dict) -> Dict:
+    """Create a new managed certificate."""
+    project_id = request_data['project_id']
+    name = request_data['name']
+    client = get_certificate_manager_client()
+    parent = f"projects/{project_id}/locations/global"
+    certificate = _managed_certificate(request_data)
     try:
         operation = client.create_certificate(parent=parent, certificate_id=name, certificate=certificate)
+        invalidate(_certificate_cache_key(project_id, name))
+        if not _should_wait(request_data):
+            return _operation_started(operation, f"Creation of managed certificate {name} started")
         result = operation.result()
         return {"message": f"Managed certificate {result.name} created successfully"}
     except Exception as e:
         return {"error": f"Error creating managed certificate: {str(e)}"}
 
+def _validation_error(request_data: Dict) -> Optional[Dict]:
+    """
+    Run the local pre-flight checks on a self-uploaded certificate request.
+
+    Returns None when the certificate passes, or was sent with 'validate': False,
+    and the error response to return otherwise.
+    """
+    if request_data.get('validate', True) is False:
+        return None
+    report = validate_certificate(request_data['certificate'], request_data['private_key'], request_data.get('domains'))
+    if report['valid']:
+        return None
+    return {"error": f"Certificate failed validation: {'; '.join(report['errors'])}", "validation": report}
+
 def certificate_manager_certificate_create_self_uploaded(request_data: Dict) -> Dict:
-    """Create a new self-uploaded certificate."""
+    """
+    Create a new self-uploaded certificate.
+
+    The certificate and key are checked locally first (see
+    `certificate_validation.validate_certificate`), so a mismatched key, an expired
+    certificate or a misordered chain is reported without calling the API.
+
+    Args:
+        request_data (Dict): A dictionary containing:
+            - project_id (str): The GCP project ID.
+            - name (str): The name of the certificate.
+            - description (str): The certificate description.
+            - scope (str): The certificate scope (e.g. 'DEFAULT').
+            - certificate (str): The PEM certificate chain, leaf first.
+            - private_key (str): The PEM private key.
+            - domains (list, optional): Domains the certificate's SAN list must cover.
+            - validate (bool, optional): Set to False to skip the local checks.
+            - wait (bool, optional): Set to False to return the operation name without waiting.
+
+    Returns:
+        Dict: A dictionary with a success message or error details.
+    """
+    error = _validation_error(request_data)
+    if error:
+        return error
     project_id = request_data['project_id']
     name = request_data['name']
-    client = certificate_manager_v1.CertificateManagerClient()
+    client = get_certificate_manager_client()
     parent = f"projects/{project_id}/locations/global"
-    certificate = certificate_manager_v1.Certificate(
-        name=name,
-        description=request_data['description'],
-        scope=request_data['scope'],
-        self_managed=certificate_manager_v1.Certificate.SelfManagedCertificate(
-            pem_certificate=request_data['certificate'],
-            pem_private_key=request_data['private_key']
-        )
-    )
+    certificate = _self_managed_certificate(request_data)
     try:
         operation = client.create_certificate(parent=parent, certificate_id=name, certificate=certificate)
+        invalidate(_certificate_cache_key(project_id, name))
+        if not _should_wait(request_data):
+            return _operation_started(operation, f"Creation of self-uploaded certificate {name} started")
         result = operation.result()
         return {"message": f"Self-uploaded certificate {result.name} created successfully"}
     except Exception as e:
         return {"error": f"Error creating self-uploaded certificate: {str(e)}"}
 
+def certificate_manager_certificate_validate(request_data: Dict) -> Dict:
+    """
+    Check a self-managed certificate and key locally, without uploading them.
+
+    Args:
+        request_data (Dict): A dictionary containing:
+            - certificate (str): The PEM certificate chain, leaf first.
+            - private_key (str): The PEM private key.
+            - domains (list, optional): Domains the certificate's SAN list must cover.
+
+    Returns:
+        Dict: The validation report; see `certificate_validation.validate_certificate`.
+    """
+    return validate_certificate(request_data['certificate'], request_data['private_key'], request_data.get('domains'))
+
+def certificate_manager_certificate_create_self_uploaded_bulk(request_data: Dict) -> Dict:
+    """
+    Validate and upload many self-managed certificates from a directory or a PEM bundle.
+
+    Pairs are read BULK_UPLOAD_WINDOW at a time, so large directories are never held in
+    memory at once. Each pair is validated locally, and the valid ones in a window are
+    uploaded concurrently. Certificate names are derived from the file names (directory)
+    or from the leaf's first DNS name (bundle).
+
+    Args:
+        request_data (Dict): A dictionary containing:
+            - project_id (str): The GCP project ID.
+            - directory (str): A directory of '<name>.key' files next to '<name>.crt'/'.pem'/'.cer' files.
+            - bundle (str): Or, a PEM file of private keys, each followed by its certificate chain.
+            - name_prefix (str, optional): A prefix for every certificate name.
+            - description (str, optional): The description of every certificate.
+            - scope (str, optional): The scope of every certificate. Defaults to 'DEFAULT'.
+            - dry_run (bool, optional): Set to True to only validate.
+            - wait (bool, optional): Set to False to return operation names without waiting.
+            - max_workers (int, optional): The maximum number of concurrent uploads.
+
+    Returns:
+        Dict: A dictionary with the 'uploaded', 'invalid' and 'failed' counts and a
+            'results' dictionary mapping each certificate name to its own response.
+
+    Raises:
+        ValueError: If neither 'directory' nor 'bundle' is given.
+    """
+    if 'directory' in request_data:
+        pairs = iter_directory_pairs(request_data['directory'])
+    elif 'bundle' in request_data:
+        pairs = iter_bundle_pairs(request_data['bundle'])
+    else:
+        raise ValueError("Either 'directory' or 'bundle' is required")
+    max_workers = int(request_data.get('max_workers', DEFAULT_MAX_WORKERS))
+    dry_run = request_data.get('dry_run', False) is True
+    name_prefix = request_data.get('name_prefix', '')
+    defaults = {
+        'project_id': request_data['project_id'],
+        'description': request_data.get('description', ''),
+        'scope': request_data.get('scope', 'DEFAULT'),
+        'wait': request_data.get('wait', True),
+        # Each pair is validated before it is queued for upload
+        'validate': False,
+    }
+
+    results = {}
+    counts = {"uploaded": 0, "invalid": 0, "failed": 0}
+    while True:
+        window = list(itertools.islice(pairs, BULK_UPLOAD_WINDOW))
+        if not window:
+            break
+        uploads = []
+        for source, pem_certificate, pem_private_key in window:
+            name = certificate_id(name_prefix + source)
+            if name in results:
+                counts["invalid"] += 1
+                results[f"{name}#{len(results)}"] = {"error": f"Duplicate certificate name {name}", "source": source}
+                continue
+            report = validate_certificate(pem_certificate, pem_private_key)
+            if not report['valid']:
+                counts["invalid"] += 1
+                results[name] = {"error": f"Certificate failed validation: {'; '.join(report['errors'])}",
+                                 "source": source}
+                continue
+            results[name] = {"message": f"Certificate {name} is valid", "warnings": report['warnings']}
+            uploads.append({**defaults, 'name': name, 'certificate': pem_certificate, 'private_key': pem_private_key})
+
+        if dry_run:
+            continue
+        outcomes = run_concurrently(certificate_manager_certificate_create_self_uploaded, uploads, max_workers)
+        for upload, (result, error) in zip(uploads, outcomes):
+            if error is not None:
+                result = {"error": f"Error creating self-uploaded certificate: {str(error)}"}
+            counts["failed" if 'error' in result else "uploaded"] += 1
+            results[upload['name']] = result
+
+    total = len(results)
+    if dry_run:
+        message = f"{total - counts['invalid']} of {total} certificates are valid"
+    else:
+        message = f"Uploaded {counts['uploaded']} of {total} certificates"
+    return {"message": message, **counts, "results": results}
+
 def certificate_manager_certificate_delete(request_data: Dict) -> Dict:
-    """Delete a certificate."""
+    """
+    Delete a certificate.
+
+    The certificate is dropped from the expiry index once the deletion has finished:
+    here when waiting, or on the 'operation_status' call that sees it done with 'wait': False.
+    """
     project_id = request_data['project_id']
     name = request_data['name']
-    client = certificate_manager_v1.CertificateManagerClient()
+    client = get_certificate_manager_client()
     certificate_name = f"projects/{project_id}/locations/global/certificates/{name}"
     try:
         operation = client.delete_certificate(name=certificate_name)
+        invalidate(_certificate_cache_key(project_id, name))
+        if not _should_wait(request_data):
+            return _operation_started(operation, f"Deletion of certificate {name} started")
         operation.result()
+        get_expiry_index().remove(certificate_name)
         return {"message": f"Certificate {name} deleted successfully"}
     except Exception as e:
         return {"error": f"Error deleting certificate: {str(e)}"}
 
+def certificate_to_dict(certificate: certificate_manager_v1.Certificate, fields: Optional[List[str]] = None) -> Dict:
+    """
+    Convert a certificate to a JSON-native dictionary.
+
+    Fields left at their default value are omitted, enums are rendered by name and
+    timestamps as RFC 3339 strings.
+
+    Args:
+        certificate (certificate_manager_v1.Certificate): The certificate to convert.
+        fields (List[str], optional): Dotted field paths to keep (e.g. 'expire_time',
+            'managed.state'). All fields are kept when omitted.
+
+    Returns:
+        Dict: The certificate as a dictionary.
+    """
+    data = json_format.MessageToDict(certificate_manager_v1.Certificate.pb(certificate), preserving_proto_field_name=True)
+    return _project_fields(data, fields)
+
+def _project_fields(data: Dict, fields: Optional[List[str]]) -> Dict:
+    """Keep only the dotted field paths in `fields`, or everything when it is empty."""
+    if not fields:
+        return data
+
+    projected = {}
+    for path in fields:
+        source, target = data, projected
+        keys = path.split('.')
+        for key in keys[:-1]:
+            source = source.get(key)
+            if not isinstance(source, dict):
+                break
+            target = target.setdefault(key, {})
+        else:
+            if keys[-1] in source:
+                target[keys[-1]] = source[keys[-1]]
+    return projected
+
 def certificate_manager_certificate_get(request_data: Dict) -> Dict:
-    """Get details of a certificate."""
+    """
+    Get details of a certificate.
+
+    Args:
+        request_data (Dict): A dictionary containing:
+            - project_id (str): The GCP project ID.
+            - name (str): The name of the certificate.
+            - fields (list, optional): Dotted field paths to return (e.g. ['expire_time', 'managed.state']).
+            - cache (bool, optional): Set to False to bypass the read-through cache.
+
+    Returns:
+        Dict: The certificate as a JSON-native dictionary, or error details.
+    """
     project_id = request_data['project_id']
     name = request_data['name']
-    client = certificate_manager_v1.CertificateManagerClient()
+    client = get_certificate_manager_client()
     certificate_name = f"projects/{project_id}/locations/global/certificates/{name}"
     try:
-        certificate = client.get_certificate(name=certificate_name)
-        return str(certificate)
+        data = cached(
+            _certificate_cache_key(project_id, name),
+            lambda: certificate_to_dict(client.get_certificate(name=certificate_name)),
+            use_cache=request_data.get('cache', True) is not False,
+        )
+        return _project_fields(data, request_data.get('fields'))
     except Exception as e:
         return {"error": f"Error getting certificate details: {str(e)}"}
 
+def certificate_manager_certificate_list(request_data: Dict) -> Dict:
+    """
+    List one page of certificates in a project.
+
+    Paging and filtering run on the server; pass the returned 'next_page_token' back as
+    'page_token' to fetch the following page.
+
+    Args:
+        request_data (Dict): A dictionary containing:
+            - project_id (str): The GCP project ID.
+            - page_size (int, optional): The maximum number of certificates to return.
+            - page_token (str, optional): The token of the page to fetch.
+            - filter (str, optional): A server-side filter expression (e.g. 'labels.env = prod').
+            - order_by (str, optional): A server-side sort order (e.g. 'expire_time').
+            - fields (list, optional): Dotted field paths to return for each certificate.
+
+    Returns:
+        Dict: A dictionary with the 'certificates' on this page and the 'next_page_token',
+            or error details.
+    """
+    project_id = request_data['project_id']
+    client = get_certificate_manager_client()
+    request = certificate_manager_v1.ListCertificatesRequest(
+        parent=f"projects/{project_id}/locations/global",
+        page_size=int(request_data.get('page_size', DEFAULT_PAGE_SIZE)),
+        page_token=request_data.get('page_token', ''),
+        filter=request_data.get('filter', ''),
+        order_by=request_data.get('order_by', ''),
+    )
+    try:
+        page = next(iter(client.list_certificates(request=request).pages))
+        fields = request_data.get('fields')
+        return {
+            "certificates": [certificate_to_dict(certificate, fields) for certificate in page.certificates],
+            "next_page_token": page.next_page_token,
+        }
+    except Exception as e:
+        return {"error": f"Error listing certificates: {str(e)}"}
+
 def certificate_manager_certificate_update(request_data: Dict) -> Dict:
     """
     Update a certificate in Google Cloud Certificate Manager.
@@ -80,65 +389,173 @@ def certificate_manager_certificate_update(request_data: Dict) -> Dict:
     For self-uploaded certificates:
     - Can only update the description.
 
+    The update is sent as a partial resource with a field mask built from the request.
+    The current certificate is only fetched when 'domains' is given, to check that it
+    is managed.
+
     Args:
         request_data (Dict): A dictionary containing:
             - project_id (str): The GCP project ID.
             - name (str): The name of the certificate to update.
+            - names (list, optional): Names of several certificates to update concurrently, in place of 'name'.
             - description (str, optional): New description for the certificate.
             - domains (list, optional): New list of domains for managed certificates.
+            - wait (bool, optional): Set to False to return the operation name without waiting.
+            - max_workers (int, optional): The maximum number of concurrent updates when 'names' is given.
 
     Returns:
-        Dict: A dictionary with a success message or error details.
+        Dict: A dictionary with a success message or error details. When 'names' is given,
+            a 'results' dictionary maps each name to its own response.
     """
+    if 'names' in request_data:
+        names = request_data['names']
+        max_workers = int(request_data.get('max_workers', DEFAULT_MAX_WORKERS))
+        outcomes = run_concurrently(lambda name: _update_certificate(request_data, name), names, max_workers)
+        results = {name: result if error is None else {"error": f"Error updating certificate: {str(error)}"}
+                   for name, (result, error) in zip(names, outcomes)}
+        failed = sum(1 for result in results.values() if 'error' in result)
+        return {"message": f"Updated {len(names) - failed} of {len(names)} certificates", "results": results}
+    return _update_certificate(request_data, request_data['name'])
+
+def _update_certificate(request_data: Dict, name: str) -> Dict:
+    """Update a single certificate; see `certificate_manager_certificate_update`."""
     project_id = request_data['project_id']
-    name = request_data['name']
-    client = certificate_manager_v1.CertificateManagerClient()
+    client = get_certificate_manager_client()
     certificate_name = f"projects/{project_id}/locations/global/certificates/{name}"
 
     try:
-        # Get the current certificate
-        current_cert = client.get_certificate(name=certificate_name)
-
-        # Initialize update mask paths
+        certificate = certificate_manager_v1.Certificate(name=certificate_name)
         update_mask_paths = []
 
         # Update description if provided
         if 'description' in request_data:
-            current_cert.description = request_data['description']
+            certificate.description = request_data['description']
             update_mask_paths.append('description')
 
         # Update domains if provided and certificate is managed
-        if 'domains' in request_data and current_cert.managed:
-            current_cert.managed.domains = request_data['domains']
-            update_mask_paths.append('managed.domains')
+        if 'domains' in request_data:
+            current_cert = client.get_certificate(name=certificate_name)
+            if current_cert.managed:
+                certificate.managed = certificate_manager_v1.Certificate.ManagedCertificate(
+                    domains=request_data['domains']
+                )
+                update_mask_paths.append('managed.domains')
 
         # If no updates are requested, return early
         if not update_mask_paths:
             return {"message": "No updates requested"}
 
-        # Create update mask
         update_mask = field_mask_pb2.FieldMask(paths=update_mask_paths)
-
-        # Update the certificate
-        operation = client.update_certificate(certificate=current_cert, update_mask=update_mask)
+        operation = client.update_certificate(certificate=certificate, update_mask=update_mask)
+        invalidate(_certificate_cache_key(project_id, name))
+        if not _should_wait(request_data):
+            return _operation_started(operation, f"Update of certificate {name} started")
         result = operation.result()
 
         return {"message": f"Certificate {result.name} updated successfully"}
     except Exception as e:
         return {"error": f"Error updating certificate: {str(e)}"}
 
+def certificate_manager_certificate_scan_expiring(request_data: Dict) -> Dict:
+    """
+    Find certificates that expire within a threshold across one or more projects.
+
+    Projects are refreshed into the on-disk expiry index concurrently, and the
+    threshold query is then answered from the index alone. Incremental refreshes only
+    pick up new and updated certificates; use 'refresh': 'full' to also drop deleted ones.
 
+    Args:
+        request_data (Dict): A dictionary containing:
+            - projects (list): The GCP project IDs to scan (or 'project_id' for a single project).
+            - days (float, optional): The expiry threshold in days. Defaults to 30.
+            - refresh (str, optional): 'incremental' (default), 'full', or 'none' to query the index as is.
+            - max_workers (int, optional): The maximum number of projects refreshed concurrently.
 
+    Returns:
+        Dict: A dictionary with the expiring 'certificates' (soonest first), their 'count',
+            and the per-project 'refreshed' results.
+    """
+    projects = request_data.get('projects') or [request_data['project_id']]
+    days = float(request_data.get('days', DEFAULT_EXPIRY_THRESHOLD_DAYS))
+    refresh = request_data.get('refresh', 'incremental')
+    if refresh not in ('incremental', 'full', 'none'):
+        raise ValueError(f"Unknown refresh mode: {refresh}")
+    max_workers = int(request_data.get('max_workers', DEFAULT_MAX_WORKERS))
+    index = get_expiry_index()
+
+    refreshed = {}
+    if refresh != 'none':
+        client = get_certificate_manager_client()
+        outcomes = run_concurrently(
+            lambda project: index.refresh_project(client, project, full=refresh == 'full'), projects, max_workers
+        )
+        for project, (result, error) in zip(projects, outcomes):
+            refreshed[project] = result if error is None else {"error": f"Error refreshing expiry index: {str(error)}"}
+
+    certificates = index.expiring_before(time.time() + days * 86400, projects)
+    return {"certificates": certificates, "count": len(certificates), "refreshed": refreshed}
+
+def certificate_manager_certificate_operation_status(request_data: Dict) -> Dict:
+    """
+    Get the status of a long-running Certificate Manager operation.
+
+    Args:
+        request_data (Dict): A dictionary containing:
+            - operation (str): The full operation name returned by an action run with 'wait': False.
+
+    A finished certificate deletion is also dropped from the expiry index.
+
+    Returns:
+        Dict: A dictionary with the operation name, whether it is done, and the certificate
+            name or error once it has finished.
+    """
+    operation_name = request_data['operation']
+    client = get_certificate_manager_client()
+    try:
+        operation = client.get_operation(request=operations_pb2.GetOperationRequest(name=operation_name))
+        _remove_if_deleted(operation)
+        response = {"operation": operation.name, "done": operation.done}
+        if operation.HasField('error'):
+            response["error"] = f"Operation failed: {operation.error.message}"
+        elif operation.HasField('response') and operation.response.value:
+            response["certificate"] = certificate_manager_v1.Certificate.deserialize(operation.response.value).name
+        return response
+    except Exception as e:
+        return {"error": f"Error getting operation status: {str(e)}"}
+
+@instrumented('certificate')
+@idempotent
 def certificate_manager_certificate_handle_action(request_data: Dict[str, str]) -> Dict:
-    """Handle Certificate Manager actions based on the provided request data."""
+    """
+    Handle Certificate Manager actions based on the provided request data.
+
+    The create, create_self_uploaded, delete and update actions accept 'wait': False to
+    return the operation name immediately; poll it with action 'operation_status'.
+    Self-uploaded certificates are validated locally before upload; use action
+    'validate' to only check them, or 'create_self_uploaded_bulk' to upload a
+    directory or bundle of them.
+
+    Use action 'batch' with an 'actions' list (and optional 'max_workers') to run
+    several actions concurrently in one invocation, or 'job_submit' to run more than
+    fit in one invocation as a resumable job (see `common.jobs.run_job_action`).
+    """
     action = request_data['action']
+    if action == BATCH_ACTION:
+        return run_batch(certificate_manager_certificate_handle_action, request_data)
+    if action in JOB_ACTIONS:
+        return run_job_action(certificate_manager_certificate_handle_action, request_data)
 
     action_map = {
         'create': certificate_manager_certificate_create_managed,
         'create_self_uploaded': certificate_manager_certificate_create_self_uploaded,
+        'create_self_uploaded_bulk': certificate_manager_certificate_create_self_uploaded_bulk,
+        'validate': certificate_manager_certificate_validate,
         'delete': certificate_manager_certificate_delete,
         'get': certificate_manager_certificate_get,
+        'list': certificate_manager_certificate_list,
         'update': certificate_manager_certificate_update,
+        'operation_status': certificate_manager_certificate_operation_status,
+        'scan_expiring': certificate_manager_certificate_scan_expiring,
     }
     
     if action not in action_map:
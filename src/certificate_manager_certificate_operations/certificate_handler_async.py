@@ -0,0 +1,211 @@
+import asyncio
+from google.cloud import certificate_manager_v1
+from google.longrunning import operations_pb2
+from google.protobuf import field_mask_pb2
+from typing import Dict
+from certificate_manager_certificate_operations.certificate_handler import (
+    DEFAULT_PAGE_SIZE, _certificate_cache_key, _managed_certificate, _operation_started, _project_fields,
+    _remove_if_deleted, _self_managed_certificate, _should_wait, _validation_error,
+    certificate_manager_certificate_handle_action, certificate_to_dict, get_expiry_index
+)
+from common.batch import BATCH_ACTION, run_batch_async
+from common.cache import cached_async, invalidate
+from common.client_registry import get_async_client
+from common.concurrency import DEFAULT_MAX_CONCURRENCY, run_concurrently_async
+from common.dispatch import run_on_sync_dispatcher
+from common.idempotency import idempotent
+from common.instrumentation import instrumented
+from common.jobs import JOB_ACTIONS
+
+# scan_expiring refreshes the on-disk expiry index and the bulk upload reads files,
+# so they keep running on the synchronous handler, in a worker thread
+THREADED_ACTIONS = ('scan_expiring', 'create_self_uploaded_bulk', 'validate')
+
+def get_certificate_manager_async_client() -> certificate_manager_v1.CertificateManagerAsyncClient:
+    """Return the shared Certificate Manager async client for the running event loop, creating it on first use."""
+    return get_async_client('certificate_manager', certificate_manager_v1.CertificateManagerAsyncClient)
+
+async def _create(request_data: Dict, certificate: certificate_manager_v1.Certificate, kind: str) -> Dict:
+    project_id = request_data['project_id']
+    name = request_data['name']
+    client = get_certificate_manager_async_client()
+    try:
+        operation = await client.create_certificate(
+            parent=f"projects/{project_id}/locations/global", certificate_id=name, certificate=certificate
+        )
+        invalidate(_certificate_cache_key(project_id, name))
+        if not _should_wait(request_data):
+            return _operation_started(operation, f"Creation of {kind} certificate {name} started")
+        result = await operation.result()
+        return {"message": f"{kind.capitalize()} certificate {result.name} created successfully"}
+    except Exception as e:
+        return {"error": f"Error creating {kind} certificate: {str(e)}"}
+
+async def certificate_manager_certificate_create_managed(request_data: Dict) -> Dict:
+    """Create a new managed certificate."""
+    return await _create(request_data, _managed_certificate(request_data), 'managed')
+
+async def certificate_manager_certificate_create_self_uploaded(request_data: Dict) -> Dict:
+    """Create a new self-uploaded certificate, after the same local checks as the sync handler."""
+    error = _validation_error(request_data)
+    if error:
+        return error
+    return await _create(request_data, _self_managed_certificate(request_data), 'self-uploaded')
+
+async def certificate_manager_certificate_delete(request_data: Dict) -> Dict:
+    """Delete a certificate."""
+    project_id = request_data['project_id']
+    name = request_data['name']
+    client = get_certificate_manager_async_client()
+    certificate_name = f"projects/{project_id}/locations/global/certificates/{name}"
+    try:
+        operation = await client.delete_certificate(name=certificate_name)
+        invalidate(_certificate_cache_key(project_id, name))
+        if not _should_wait(request_data):
+            return _operation_started(operation, f"Deletion of certificate {name} started")
+        await operation.result()
+        await asyncio.to_thread(get_expiry_index().remove, certificate_name)
+        return {"message": f"Certificate {name} deleted successfully"}
+    except Exception as e:
+        return {"error": f"Error deleting certificate: {str(e)}"}
+
+async def certificate_manager_certificate_get(request_data: Dict) -> Dict:
+    """Get details of a certificate; see `certificate_handler.certificate_manager_certificate_get`."""
+    project_id = request_data['project_id']
+    name = request_data['name']
+    client = get_certificate_manager_async_client()
+    certificate_name = f"projects/{project_id}/locations/global/certificates/{name}"
+
+    async def _load():
+        return certificate_to_dict(await client.get_certificate(name=certificate_name))
+
+    try:
+        data = await cached_async(_certificate_cache_key(project_id, name), _load,
+                                  use_cache=request_data.get('cache', True) is not False)
+        return _project_fields(data, request_data.get('fields'))
+    except Exception as e:
+        return {"error": f"Error getting certificate details: {str(e)}"}
+
+async def certificate_manager_certificate_list(request_data: Dict) -> Dict:
+    """List one page of certificates in a project; see `certificate_handler.certificate_manager_certificate_list`."""
+    project_id = request_data['project_id']
+    client = get_certificate_manager_async_client()
+    request = certificate_manager_v1.ListCertificatesRequest(
+        parent=f"projects/{project_id}/locations/global",
+        page_size=int(request_data.get('page_size', DEFAULT_PAGE_SIZE)),
+        page_token=request_data.get('page_token', ''),
+        filter=request_data.get('filter', ''),
+        order_by=request_data.get('order_by', ''),
+    )
+    try:
+        pager = await client.list_certificates(request=request)
+        async for page in pager.pages:
+            break
+        fields = request_data.get('fields')
+        return {
+            "certificates": [certificate_to_dict(certificate, fields) for certificate in page.certificates],
+            "next_page_token": page.next_page_token,
+        }
+    except Exception as e:
+        return {"error": f"Error listing certificates: {str(e)}"}
+
+async def certificate_manager_certificate_update(request_data: Dict) -> Dict:
+    """
+    Update one certificate, or several concurrently when 'names' is given.
+
+    Takes the same request and returns the same result as
+    `certificate_handler.certificate_manager_certificate_update`.
+    """
+    if 'names' in request_data:
+        names = request_data['names']
+        max_concurrency = int(request_data.get('max_workers', DEFAULT_MAX_CONCURRENCY))
+        outcomes = await run_concurrently_async(lambda name: _update_certificate(request_data, name),
+                                                names, max_concurrency)
+        results = {name: result if error is None else {"error": f"Error updating certificate: {str(error)}"}
+                   for name, (result, error) in zip(names, outcomes)}
+        failed = sum(1 for result in results.values() if 'error' in result)
+        return {"message": f"Updated {len(names) - failed} of {len(names)} certificates", "results": results}
+    return await _update_certificate(request_data, request_data['name'])
+
+async def _update_certificate(request_data: Dict, name: str) -> Dict:
+    """Update a single certificate; see `certificate_manager_certificate_update`."""
+    project_id = request_data['project_id']
+    client = get_certificate_manager_async_client()
+    certificate_name = f"projects/{project_id}/locations/global/certificates/{name}"
+
+    try:
+        certificate = certificate_manager_v1.Certificate(name=certificate_name)
+        update_mask_paths = []
+
+        if 'description' in request_data:
+            certificate.description = request_data['description']
+            update_mask_paths.append('description')
+
+        # Domains can only be changed on managed certificates
+        if 'domains' in request_data:
+            current_cert = await client.get_certificate(name=certificate_name)
+            if current_cert.managed:
+                certificate.managed = certificate_manager_v1.Certificate.ManagedCertificate(
+                    domains=request_data['domains']
+                )
+                update_mask_paths.append('managed.domains')
+
+        if not update_mask_paths:
+            return {"message": "No updates requested"}
+
+        update_mask = field_mask_pb2.FieldMask(paths=update_mask_paths)
+        operation = await client.update_certificate(certificate=certificate, update_mask=update_mask)
+        invalidate(_certificate_cache_key(project_id, name))
+        if not _should_wait(request_data):
+            return _operation_started(operation, f"Update of certificate {name} started")
+        result = await operation.result()
+
+        return {"message": f"Certificate {result.name} updated successfully"}
+    except Exception as e:
+        return {"error": f"Error updating certificate: {str(e)}"}
+
+async def certificate_manager_certificate_operation_status(request_data: Dict) -> Dict:
+    """Get the status of a long-running Certificate Manager operation; see `certificate_handler.certificate_manager_certificate_operation_status`."""
+    operation_name = request_data['operation']
+    client = get_certificate_manager_async_client()
+    try:
+        operation = await client.get_operation(request=operations_pb2.GetOperationRequest(name=operation_name))
+        await asyncio.to_thread(_remove_if_deleted, operation)
+        response = {"operation": operation.name, "done": operation.done}
+        if operation.HasField('error'):
+            response["error"] = f"Operation failed: {operation.error.message}"
+        elif operation.HasField('response') and operation.response.value:
+            response["certificate"] = certificate_manager_v1.Certificate.deserialize(operation.response.value).name
+        return response
+    except Exception as e:
+        return {"error": f"Error getting operation status: {str(e)}"}
+
+@instrumented('certificate')
+@idempotent
+async def certificate_manager_certificate_handle_action_async(request_data: Dict[str, str]) -> Dict:
+    """
+    Handle Certificate Manager actions on the event loop.
+
+    Takes the same requests and returns the same results as
+    `certificate_handler.certificate_manager_certificate_handle_action`, but keeps every
+    call and long-running operation wait in flight on one event loop instead of a thread each.
+    """
+    action = request_data['action']
+    if action == BATCH_ACTION:
+        return await run_batch_async(certificate_manager_certificate_handle_action_async, request_data)
+    if action in JOB_ACTIONS or action in THREADED_ACTIONS:
+        return await run_on_sync_dispatcher(certificate_manager_certificate_handle_action, request_data)
+
+    action_map = {
+        'create': certificate_manager_certificate_create_managed,
+        'create_self_uploaded': certificate_manager_certificate_create_self_uploaded,
+        'delete': certificate_manager_certificate_delete,
+        'get': certificate_manager_certificate_get,
+        'list': certificate_manager_certificate_list,
+        'update': certificate_manager_certificate_update,
+        'operation_status': certificate_manager_certificate_operation_status,
+    }
+
+    if action not in action_map:
+        raise NotImplementedError(f"Unknown action: {action}")
+    return await action_map[action](request_data)
@@ -0,0 +1,166 @@
+import os
+import re
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, List, Optional, Tuple
+from cryptography import x509
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import serialization
+
+# Certificates expiring sooner than this are accepted with a warning
+EXPIRY_WARNING_DAYS = 30
+CERTIFICATE_SUFFIXES = ('.crt', '.pem', '.cer')
+KEY_SUFFIX = '.key'
+
+def _public_key_bytes(key) -> bytes:
+    return key.public_bytes(serialization.Encoding.DER, serialization.PublicFormat.SubjectPublicKeyInfo)
+
+def _dns_names(certificate: x509.Certificate) -> List[str]:
+    try:
+        extension = certificate.extensions.get_extension_for_class(x509.SubjectAlternativeName)
+    except x509.ExtensionNotFound:
+        return []
+    return extension.value.get_values_for_type(x509.DNSName)
+
+def _covers(names: List[str], domain: str) -> bool:
+    domain = domain.lower()
+    for name in (name.lower() for name in names):
+        if name == domain:
+            return True
+        # A wildcard matches exactly one label
+        if name.startswith('*.') and domain.count('.') == name.count('.') and domain.endswith(name[1:]):
+            return True
+    return False
+
+def validate_certificate(pem_certificate: str, pem_private_key: str, domains: Optional[List[str]] = None,
+                         now: Optional[datetime] = None) -> Dict:
+    """
+    Check a self-managed certificate locally before it is uploaded.
+
+    The checks are that:
+    - the certificate chain and the private key parse
+    - the private key belongs to the leaf (first) certificate
+    - the leaf is currently valid (a warning is added if it expires within EXPIRY_WARNING_DAYS)
+    - the leaf's SAN list covers every domain in `domains` (a warning is added if it has no SAN)
+    - each certificate in the chain was issued by the one that follows it
+
+    Args:
+        pem_certificate (str): The PEM leaf certificate, optionally followed by its intermediates.
+        pem_private_key (str): The unencrypted PEM private key.
+        domains (List[str], optional): Domains the certificate must be valid for.
+        now (datetime, optional): The reference time. Defaults to the current UTC time.
+
+    Returns:
+        Dict: A dictionary containing 'valid', the 'errors' and 'warnings' found, and, when the
+            certificate parses, its 'subject', 'san', 'not_before', 'not_after' and 'chain_length'.
+    """
+    errors: List[str] = []
+    warnings: List[str] = []
+    try:
+        chain = x509.load_pem_x509_certificates(pem_certificate.encode())
+    except ValueError as e:
+        return {"valid": False, "errors": [f"Certificate could not be parsed: {e}"], "warnings": warnings}
+    try:
+        private_key = serialization.load_pem_private_key(pem_private_key.encode(), password=None)
+    except (TypeError, ValueError) as e:
+        private_key = None
+        errors.append(f"Private key could not be parsed: {e}")
+
+    leaf = chain[0]
+    if private_key is not None and _public_key_bytes(private_key.public_key()) != _public_key_bytes(leaf.public_key()):
+        errors.append("Private key does not match the certificate")
+
+    now = now or datetime.now(timezone.utc)
+    if now < leaf.not_valid_before_utc:
+        errors.append(f"Certificate is not valid before {leaf.not_valid_before_utc.isoformat()}")
+    elif now > leaf.not_valid_after_utc:
+        errors.append(f"Certificate expired on {leaf.not_valid_after_utc.isoformat()}")
+    elif leaf.not_valid_after_utc - now < timedelta(days=EXPIRY_WARNING_DAYS):
+        warnings.append(f"Certificate expires on {leaf.not_valid_after_utc.isoformat()}")
+
+    san = _dns_names(leaf)
+    if not san:
+        warnings.append("Certificate has no DNS subject alternative names")
+    for domain in domains or []:
+        if not _covers(san, domain):
+            errors.append(f"Certificate is not valid for {domain}")
+
+    for position, (certificate, issuer) in enumerate(zip(chain, chain[1:])):
+        try:
+            certificate.verify_directly_issued_by(issuer)
+        except (ValueError, TypeError, InvalidSignature) as e:
+            errors.append(f"Chain certificate {position + 1} was not issued by certificate {position + 2}: {e}")
+
+    return {
+        "valid": not errors,
+        "errors": errors,
+        "warnings": warnings,
+        "subject": leaf.subject.rfc4514_string(),
+        "san": san,
+        "not_before": leaf.not_valid_before_utc.isoformat(),
+        "not_after": leaf.not_valid_after_utc.isoformat(),
+        "chain_length": len(chain),
+    }
+
+def certificate_id(name: str) -> str:
+    """Turn a file name or common name into a valid Certificate Manager certificate ID."""
+    slug = re.sub(r'[^a-z0-9-]+', '-', name.lower()).strip('-')
+    if not slug or not slug[0].isalpha():
+        slug = f"cert-{slug}".rstrip('-')
+    return slug[:63].rstrip('-')
+
+def iter_directory_pairs(directory: str) -> Iterator[Tuple[str, str, str]]:
+    """
+    Yield (name, pem_certificate, pem_private_key) for each pair of files in a directory.
+
+    A pair is a '<name>.key' file next to a '<name>.crt', '<name>.pem' or '<name>.cer' file.
+    Files are read one pair at a time. Certificates without a key are yielded with an
+    empty key, so they are reported as invalid rather than silently skipped.
+    """
+    for entry in sorted(os.listdir(directory)):
+        stem, suffix = os.path.splitext(entry)
+        if suffix not in CERTIFICATE_SUFFIXES:
+            continue
+        with open(os.path.join(directory, entry)) as f:
+            pem_certificate = f.read()
+        key_path = os.path.join(directory, stem + KEY_SUFFIX)
+        pem_private_key = ''
+        if os.path.exists(key_path):
+            with open(key_path) as f:
+                pem_private_key = f.read()
+        yield stem, pem_certificate, pem_private_key
+
+def iter_bundle_pairs(path: str) -> Iterator[Tuple[str, str, str]]:
+    """
+    Yield (name, pem_certificate, pem_private_key) for each entry of a PEM bundle.
+
+    Each entry is a private key followed by its certificate chain. The bundle is read
+    one PEM block at a time, and entries are named after the leaf's first DNS name (or
+    common name).
+    """
+    def _emit(key: str, certificates: List[str]):
+        pem_certificate = ''.join(certificates)
+        try:
+            leaf = x509.load_pem_x509_certificate(certificates[0].encode())
+            names = _dns_names(leaf) or [attribute.value for attribute in
+                                        leaf.subject.get_attributes_for_oid(x509.NameOID.COMMON_NAME)]
+            name = str(names[0]) if names else ''
+        except ValueError:
+            name = ''
+        return name, pem_certificate, key
+
+    key, certificates, block = None, [], []
+    with open(path) as f:
+        for line in f:
+            block.append(line)
+            if not line.startswith('-----END '):
+                continue
+            pem = ''.join(block)
+            block = []
+            if 'PRIVATE KEY-----' in line:
+                if key is not None and certificates:
+                    yield _emit(key, certificates)
+                key, certificates = pem, []
+            elif key is not None:
+                certificates.append(pem)
+    if key is not None and certificates:
+        yield _emit(key, certificates)
@@ -0,0 +1,74 @@
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from common.concurrency import DEFAULT_MAX_CONCURRENCY, DEFAULT_MAX_WORKERS, run_concurrently, run_concurrently_async
+from common.idempotency import IDEMPOTENCY_KEY
+
+BATCH_ACTION = 'batch'
+
+def run_batch(handler: Callable[[Dict], Any], request_data: Dict) -> Dict[str, Any]:
+    """
+    Run a batch request through a single-action dispatcher.
+
+    A batch request looks like:
+        {"action": "batch", "actions": [{...}, {...}], "max_workers": 10, ...}
+
+    Every other top-level key is used as a default for each item, so fields shared
+    by the whole batch (e.g. 'project' or 'zone') only need to be given once.
+
+    Args:
+        handler (Callable[[Dict], Any]): The dispatcher that handles one action.
+        request_data (Dict): The batch request.
+
+    Returns:
+        Dict[str, Any]: A dictionary containing:
+            - results (List[Dict]): One entry per item in input order, holding either 'result' or 'error'.
+            - succeeded (int): The number of items that completed without error.
+            - failed (int): The number of items that raised an error.
+
+    Raises:
+        ValueError: If 'actions' is missing, an item is not a dict or is itself a batch
+            request, or an item reuses the batch's 'idempotency_key'.
+    """
+    items, max_workers = _batch_items(request_data, DEFAULT_MAX_WORKERS)
+    return _batch_summary(run_concurrently(handler, items, max_workers))
+
+async def run_batch_async(handler: Callable[[Dict], Awaitable[Any]], request_data: Dict) -> Dict[str, Any]:
+    """
+    Run a batch request through a single-action async dispatcher.
+
+    Takes the same request and returns the same summary as `run_batch`; 'max_workers'
+    bounds the number of actions in flight and defaults to DEFAULT_MAX_CONCURRENCY.
+    """
+    items, max_workers = _batch_items(request_data, DEFAULT_MAX_CONCURRENCY)
+    return _batch_summary(await run_concurrently_async(handler, items, max_workers))
+
+def _batch_items(request_data: Dict, default_max_workers: int) -> Tuple[List[Dict], int]:
+    actions = request_data.get('actions')
+    if not isinstance(actions, list):
+        raise ValueError("'actions' must be a list for batch action")
+    max_workers = int(request_data.get('max_workers', default_max_workers))
+    defaults = {k: v for k, v in request_data.items()
+                if k not in ('action', 'actions', 'max_workers', IDEMPOTENCY_KEY)}
+
+    items = []
+    for index, item in enumerate(actions):
+        if not isinstance(item, dict):
+            raise ValueError(f"Batch item {index} must be an object, got {type(item).__name__}")
+        if item.get('action') == BATCH_ACTION:
+            raise ValueError("Nested batch actions are not supported")
+        if request_data.get(IDEMPOTENCY_KEY) and item.get(IDEMPOTENCY_KEY) == request_data[IDEMPOTENCY_KEY]:
+            # The batch holds its key's lock until every item has run
+            raise ValueError("Batch items cannot reuse the batch's idempotency key")
+        items.append({**defaults, **item})
+    return items, max_workers
+
+def _batch_summary(outcomes: List[Tuple[Any, Optional[Exception]]]) -> Dict[str, Any]:
+    results = []
+    failed = 0
+    for index, (result, error) in enumerate(outcomes):
+        if error is None:
+            results.append({"index": index, "result": result})
+        else:
+            failed += 1
+            results.append({"index": index, "error": str(error)})
+
+    return {"results": results, "succeeded": len(results) - failed, "failed": failed}
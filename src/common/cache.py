@@ -0,0 +1,221 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+DEFAULT_TTL = float(os.environ.get('CACHE_TTL_SECONDS', 30))
+DEFAULT_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', 1024))
+
+class CacheBackend(ABC):
+    """
+    Base class for read-through cache backends.
+
+    Backends store JSON-serializable values with a TTL, evict the least recently used
+    entries once `max_entries` is reached, and count hits and misses.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        """Return (True, value) for a live entry, or (False, None) if it is missing or expired."""
+        found, value = self._get(key)
+        with self._stats_lock:
+            if found:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return found, value
+
+    @abstractmethod
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        """Store `value` under `key` for `ttl` seconds."""
+
+    @abstractmethod
+    def invalidate(self, key: str) -> None:
+        """Drop `key` and every entry whose key starts with `key` followed by ':'."""
+
+    @abstractmethod
+    def clear(self) -> None:
+        """Drop every entry."""
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses}
+
+    @abstractmethod
+    def _get(self, key: str) -> Tuple[bool, Any]:
+        """Look `key` up without counting a hit or miss."""
+
+class NullCache(CacheBackend):
+    """A backend that never stores anything, used when caching is disabled."""
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        pass
+
+    def invalidate(self, key: str) -> None:
+        pass
+
+    def clear(self) -> None:
+        pass
+
+    def _get(self, key: str) -> Tuple[bool, Any]:
+        return False, None
+
+class MemoryCache(CacheBackend):
+    """An in-process LRU cache, shared by all requests served by the same worker."""
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        super().__init__(max_entries)
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key: str) -> None:
+        with self._lock:
+            for existing in [k for k in self._entries if k == key or k.startswith(key + ':')]:
+                del self._entries[existing]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def _get(self, key: str) -> Tuple[bool, Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            if entry[0] <= time.time():
+                del self._entries[key]
+                return False, None
+            self._entries.move_to_end(key)
+            return True, entry[1]
+
+class SQLiteCache(CacheBackend):
+    """A cache stored in a local SQLite file, so entries survive worker restarts on the same host."""
+
+    def __init__(self, path: str, max_entries: int = DEFAULT_MAX_ENTRIES):
+        super().__init__(max_entries)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires, accessed) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now + ttl, now),
+            )
+            self._conn.execute(
+                "DELETE FROM cache WHERE key IN ("
+                "SELECT key FROM cache ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self._conn.commit()
+
+    def invalidate(self, key: str) -> None:
+        prefix = key.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + ':%'
+        with self._lock:
+            self._conn.execute("DELETE FROM cache WHERE key = ? OR key LIKE ? ESCAPE '\\'", (key, prefix))
+            self._conn.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM cache")
+            self._conn.commit()
+
+    def _get(self, key: str) -> Tuple[bool, Any]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, expires FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return False, None
+            if row[1] <= now:
+                self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                self._conn.commit()
+                return False, None
+            self._conn.execute("UPDATE cache SET accessed = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            return True, json.loads(row[0])
+
+def _backend_from_env() -> CacheBackend:
+    backend = os.environ.get('CACHE_BACKEND', 'memory')
+    if backend == 'memory':
+        return MemoryCache()
+    if backend == 'sqlite':
+        return SQLiteCache(os.environ.get('CACHE_PATH', '/tmp/gcp_selfservice_cache.sqlite3'))
+    if backend == 'none':
+        return NullCache()
+    raise ValueError(f"Unknown cache backend: {backend}")
+
+_cache: Optional[CacheBackend] = None
+_cache_lock = threading.Lock()
+
+def get_cache() -> CacheBackend:
+    """Return the configured cache backend, creating it from CACHE_BACKEND on first use."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = _backend_from_env()
+        return _cache
+
+def set_cache(backend: CacheBackend) -> None:
+    """Replace the cache backend used by all handlers."""
+    global _cache
+    with _cache_lock:
+        _cache = backend
+
+def cached(key: str, loader: Callable[[], Any], ttl: float = DEFAULT_TTL, use_cache: bool = True) -> Any:
+    """
+    Return the cached value for `key`, calling `loader` and caching its result on a miss.
+
+    Args:
+        key (str): The cache key, e.g. 'iam.keys:<project>:<email>'.
+        loader (Callable[[], Any]): Fetches the value from the API.
+        ttl (float): How long the value stays fresh, in seconds.
+        use_cache (bool): Set to False to bypass the cache and refresh the entry.
+
+    Returns:
+        Any: The cached or freshly loaded value.
+    """
+    cache = get_cache()
+    if use_cache:
+        found, value = cache.get(key)
+        if found:
+            return value
+    value = loader()
+    cache.set(key, value, ttl)
+    return value
+
+async def cached_async(key: str, loader: Callable[[], Awaitable[Any]], ttl: float = DEFAULT_TTL,
+                       use_cache: bool = True) -> Any:
+    """The asyncio counterpart of `cached`, for loaders that are coroutine functions."""
+    cache = get_cache()
+    if use_cache:
+        found, value = cache.get(key)
+        if found:
+            return value
+    value = await loader()
+    cache.set(key, value, ttl)
+    return value
+
+def invalidate(key: str) -> None:
+    """Drop the cached entries for `key` after a mutating action."""
+    get_cache().invalidate(key)
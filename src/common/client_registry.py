@@ -0,0 +1,72 @@
+import asyncio
+import threading
+import weakref
+from typing import Any, Callable, Dict
+from common import instrumentation, rate_limit
+
+# Clients are created on first use and kept for the life of the worker, so warm
+# instances reuse the same gRPC channel and credentials across invocations. API
+# clients are wrapped so their calls share the per-project rate limits in rate_limit.
+_clients: Dict[str, Any] = {}
+# Async clients are bound to the event loop they were created on
+_async_clients: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, Any]]' = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+
+def get_client(name: str, factory: Callable[[], Any]) -> Any:
+    """
+    Return the shared client registered under `name`, creating it on first use.
+
+    Args:
+        name (str): The registry key for the client (e.g. 'compute.instances').
+        factory (Callable[[], Any]): A callable that builds the client.
+
+    Returns:
+        Any: The shared client instance.
+    """
+    client = _clients.get(name)
+    if client is not None:
+        return client
+    with _lock:
+        client = _clients.get(name)
+        if client is None:
+            if instrumentation.is_enabled():
+                factory = instrumentation.instrument_client(factory, name)
+            client = factory()
+            # Outermost, so each retry attempt is recorded as its own RPC
+            if rate_limit.is_limited(name):
+                client = rate_limit.RateLimitedClient(client, name)
+            _clients[name] = client
+    return client
+
+def get_async_client(name: str, factory: Callable[[], Any]) -> Any:
+    """
+    Return the shared async client registered under `name` for the running event loop.
+
+    Must be called from a coroutine. Async clients share the rate limits of the
+    synchronous client registered under the same name.
+
+    Args:
+        name (str): The registry key for the client (e.g. 'iam').
+        factory (Callable[[], Any]): A callable that builds the async client.
+
+    Returns:
+        Any: The shared async client instance.
+    """
+    loop = asyncio.get_running_loop()
+    with _lock:
+        clients = _async_clients.setdefault(loop, {})
+        client = clients.get(name)
+        if client is None:
+            if instrumentation.is_enabled():
+                factory = instrumentation.instrument_client(factory, name, asynchronous=True)
+            client = factory()
+            if rate_limit.is_limited(name):
+                client = rate_limit.AsyncRateLimitedClient(client, name)
+            clients[name] = client
+    return client
+
+def reset_clients() -> None:
+    """Drop all cached clients so the next call to `get_client` builds new ones."""
+    with _lock:
+        _clients.clear()
+        _async_clients.clear()
@@ -0,0 +1,89 @@
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Coroutine, Iterable, List, Optional, Tuple
+
+DEFAULT_MAX_WORKERS = 10
+# Coroutines are cheap, so async fan-outs keep far more calls in flight than thread pools
+DEFAULT_MAX_CONCURRENCY = 100
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+def run_concurrently(func: Callable[[Any], Any], items: Iterable[Any],
+                     max_workers: int = DEFAULT_MAX_WORKERS) -> List[Tuple[Any, Optional[Exception]]]:
+    """
+    Call `func` on every item using a bounded thread pool.
+
+    Args:
+        func (Callable[[Any], Any]): The function to call for each item.
+        items (Iterable[Any]): The items to process.
+        max_workers (int): The maximum number of calls in flight at once.
+
+    Returns:
+        List[Tuple[Any, Optional[Exception]]]: One (result, error) pair per item, in input order.
+            Exactly one of the two is set for each item.
+    """
+    items = list(items)
+    if not items:
+        return []
+    if max_workers < 1:
+        raise ValueError(f"max_workers must be at least 1, got {max_workers}")
+
+    # Worker threads run in a copy of the caller's context, so per-action state such as
+    # instrumentation counters follows the work into the pool
+    context = contextvars.copy_context()
+
+    def _call(item):
+        try:
+            return context.copy().run(func, item), None
+        except Exception as e:
+            return None, e
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as executor:
+        return list(executor.map(_call, items))
+
+async def run_concurrently_async(func: Callable[[Any], Awaitable[Any]], items: Iterable[Any],
+                                 max_concurrency: int = DEFAULT_MAX_CONCURRENCY) -> List[Tuple[Any, Optional[Exception]]]:
+    """
+    Await `func` on every item with at most `max_concurrency` calls in flight.
+
+    Args:
+        func (Callable[[Any], Awaitable[Any]]): The coroutine function to call for each item.
+        items (Iterable[Any]): The items to process.
+        max_concurrency (int): The maximum number of calls in flight at once.
+
+    Returns:
+        List[Tuple[Any, Optional[Exception]]]: One (result, error) pair per item, in input order.
+            Exactly one of the two is set for each item.
+    """
+    items = list(items)
+    if not items:
+        return []
+    if max_concurrency < 1:
+        raise ValueError(f"max_concurrency must be at least 1, got {max_concurrency}")
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def _call(item):
+        async with semaphore:
+            try:
+                return await func(item), None
+            except Exception as e:
+                return None, e
+
+    return list(await asyncio.gather(*(_call(item) for item in items)))
+
+def run_async(coroutine: Coroutine) -> Any:
+    """
+    Run a coroutine to completion on the shared background event loop.
+
+    The loop lives for the life of the worker, so async clients (and their channels)
+    created on it are reused across invocations like the synchronous ones.
+    """
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name='async-handlers', daemon=True).start()
+    return asyncio.run_coroutine_threadsafe(coroutine, _loop).result()
@@ -0,0 +1,23 @@
+import asyncio
+import inspect
+from typing import Any, Callable, Dict, Tuple
+from common.jobs import JOB_ACTIONS, run_job_action
+
+async def run_on_sync_dispatcher(handler: Callable[[Dict], Any], request_data: Dict,
+                                 secret_actions: Tuple[str, ...] = ()) -> Any:
+    """
+    Run an action that an async dispatcher hands over to its synchronous `handler`, in a worker thread.
+
+    Job actions go through `run_job_action`, which saves each item's progress from the
+    worker threads that run it, exactly as it does for the sync dispatcher. Any other
+    action calls `handler` unwrapped: the calling async dispatcher has already recorded
+    and deduplicated the request, so it must not be counted or checked a second time.
+
+    Args:
+        handler (Callable[[Dict], Any]): The synchronous dispatcher, as decorated.
+        request_data (Dict): The request.
+        secret_actions (Tuple[str, ...], optional): Passed on to `run_job_action`.
+    """
+    if request_data.get('action') in JOB_ACTIONS:
+        return await asyncio.to_thread(run_job_action, handler, request_data, secret_actions)
+    return await asyncio.to_thread(inspect.unwrap(handler), request_data)
@@ -0,0 +1,187 @@
+import asyncio
+import base64
+import contextlib
+import functools
+import hashlib
+import inspect
+import json
+import logging
+import os
+import threading
+import weakref
+from typing import Any, Callable, Dict, List, Optional
+from common.cache import CacheBackend, MemoryCache, SQLiteCache
+
+IDEMPOTENCY_KEY = 'idempotency_key'
+DEFAULT_IDEMPOTENCY_TTL = float(os.environ.get('IDEMPOTENCY_TTL_SECONDS', 3600))
+# Results holding one of these fields (e.g. a newly created key) are kept for at most
+# DEFAULT_SECRET_TTL seconds: long enough for a retry after a lost response to get the
+# secret back, short enough that it does not linger in the store
+SECRET_FIELDS = ('private_key',)
+DEFAULT_SECRET_TTL = float(os.environ.get('IDEMPOTENCY_SECRET_TTL_SECONDS', 600))
+_BYTES_TAG = '__bytes__'
+
+_store: Optional[CacheBackend] = None
+_store_lock = threading.Lock()
+# Concurrent retries of the same key are serialized on a lock of their own, as [lock, users],
+# dropped once nobody holds or waits for it. Keys never share a lock: a keyed batch holds
+# its lock while its keyed items, running in other workers, take theirs.
+_key_locks: Dict[str, List] = {}
+_key_locks_guard = threading.Lock()
+_async_key_locks: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, List]]' = weakref.WeakKeyDictionary()
+
+def get_store() -> CacheBackend:
+    """Return the idempotency result store, creating it from IDEMPOTENCY_BACKEND on first use."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            backend = os.environ.get('IDEMPOTENCY_BACKEND', 'memory')
+            if backend == 'memory':
+                _store = MemoryCache()
+            elif backend == 'sqlite':
+                path = os.environ.get('IDEMPOTENCY_PATH', '/tmp/gcp_selfservice_idempotency.sqlite3')
+                # Stored results can hold private keys, so the file is only readable by its owner
+                os.close(os.open(path, os.O_CREAT | os.O_WRONLY, 0o600))
+                os.chmod(path, 0o600)
+                _store = SQLiteCache(path)
+            else:
+                raise ValueError(f"Unknown idempotency backend: {backend}")
+        return _store
+
+def set_store(backend: CacheBackend) -> None:
+    """Replace the idempotency result store used by all dispatchers."""
+    global _store
+    with _store_lock:
+        _store = backend
+
+def _fingerprint(request_data: Dict) -> str:
+    # started_at is set per invocation by the entry point, so it differs between retries
+    payload = {k: v for k, v in request_data.items() if k not in (IDEMPOTENCY_KEY, 'started_at')}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+@contextlib.contextmanager
+def _key_lock(store_key: str):
+    with _key_locks_guard:
+        entry = _key_locks.setdefault(store_key, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _key_locks_guard:
+            entry[1] -= 1
+            if not entry[1]:
+                del _key_locks[store_key]
+
+@contextlib.asynccontextmanager
+async def _async_key_lock(store_key: str):
+    # asyncio locks belong to one event loop, so each loop keeps its own; the loop's
+    # single thread is the only one touching its dictionary
+    locks = _async_key_locks.setdefault(asyncio.get_running_loop(), {})
+    entry = locks.setdefault(store_key, [asyncio.Lock(), 0])
+    entry[1] += 1
+    try:
+        async with entry[0]:
+            yield
+    finally:
+        entry[1] -= 1
+        if not entry[1]:
+            del locks[store_key]
+
+def _encode(value: Any) -> Any:
+    """Make a result JSON-safe for the store, tagging bytes (e.g. private key data) as base64."""
+    if isinstance(value, bytes):
+        return {_BYTES_TAG: base64.b64encode(value).decode('ascii')}
+    if isinstance(value, dict):
+        return {k: _encode(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_encode(v) for v in value]
+    return value
+
+def _decode(value: Any) -> Any:
+    if isinstance(value, dict):
+        if set(value) == {_BYTES_TAG}:
+            return base64.b64decode(value[_BYTES_TAG])
+        return {k: _decode(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_decode(v) for v in value]
+    return value
+
+def _has_secret(value: Any) -> bool:
+    if isinstance(value, dict):
+        return any(k in SECRET_FIELDS or _has_secret(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return any(_has_secret(v) for v in value)
+    return False
+
+def _lookup(store: CacheBackend, store_key: str, fingerprint: str, key: str):
+    found, entry = store.get(store_key)
+    if found and entry["fingerprint"] != fingerprint:
+        raise ValueError(f"Idempotency key {key} was already used for a different request")
+    return found, _decode(entry["result"]) if found else None
+
+def _remember(store: CacheBackend, store_key: str, fingerprint: str, key: str, result: Any) -> Any:
+    """Store a successful result and return it, flagged with 'idempotency_stored': False if it could not be stored."""
+    if isinstance(result, dict) and 'error' in result:
+        return result
+    ttl = min(DEFAULT_IDEMPOTENCY_TTL, DEFAULT_SECRET_TTL) if _has_secret(result) else DEFAULT_IDEMPOTENCY_TTL
+    try:
+        store.set(store_key, {"fingerprint": fingerprint, "result": _encode(result)}, ttl)
+    except (TypeError, ValueError) as e:
+        logging.error(f"Could not store result for idempotency key {key}, so a retry will run again: {e}")
+        if isinstance(result, dict):
+            return {**result, "idempotency_stored": False}
+    return result
+
+def idempotent(handler: Callable[[Dict], Any]) -> Callable[[Dict], Any]:
+    """
+    Deduplicate dispatcher calls that carry the same 'idempotency_key'.
+
+    The first successful result for a key is stored for DEFAULT_IDEMPOTENCY_TTL seconds
+    and returned to every retry without calling the API again. Results that raised or
+    carry an 'error' are not stored, so a retry can still succeed. Reusing a key with a
+    different request is rejected. Both plain and async dispatchers can be decorated.
+
+    Bytes in results (such as a new key's private key data) are stored base64-encoded
+    and returned as bytes again. Results holding a SECRET_FIELDS field are kept, in
+    plaintext, for at most DEFAULT_SECRET_TTL seconds, so a caller whose response was
+    lost can still retrieve the key it created. A result that cannot be stored is
+    returned with 'idempotency_stored': False, and a retry will run the action again.
+
+    Raises:
+        ValueError: If the idempotency key was already used for a different request.
+    """
+    if inspect.iscoroutinefunction(handler):
+        @functools.wraps(handler)
+        async def async_wrapper(request_data: Dict) -> Any:
+            key = request_data.get(IDEMPOTENCY_KEY)
+            if not key:
+                return await handler(request_data)
+
+            store = get_store()
+            store_key = f"idempotency:{handler.__module__}.{handler.__name__}:{key}"
+            fingerprint = _fingerprint(request_data)
+            async with _async_key_lock(store_key):
+                found, result = _lookup(store, store_key, fingerprint, key)
+                if found:
+                    return result
+                return _remember(store, store_key, fingerprint, key, await handler(request_data))
+
+        return async_wrapper
+
+    @functools.wraps(handler)
+    def wrapper(request_data: Dict) -> Any:
+        key = request_data.get(IDEMPOTENCY_KEY)
+        if not key:
+            return handler(request_data)
+
+        store = get_store()
+        store_key = f"idempotency:{handler.__module__}.{handler.__name__}:{key}"
+        fingerprint = _fingerprint(request_data)
+        with _key_lock(store_key):
+            found, result = _lookup(store, store_key, fingerprint, key)
+            if found:
+                return result
+            return _remember(store, store_key, fingerprint, key, handler(request_data))
+
+    return wrapper
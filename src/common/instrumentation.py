@@ -0,0 +1,260 @@
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Tuple
+
+METRIC_PREFIX = 'gcp_selfservice'
+
+_enabled = os.environ.get('INSTRUMENTATION_ENABLED', '').lower() in ('1', 'true', 'yes')
+_metrics_lock = threading.Lock()
+# (kind, label) -> {"count", "errors", "seconds", "max_seconds", "rpcs", "retries", "payload_bytes"}
+_metrics: Dict[Tuple[str, str], Dict[str, float]] = {}
+_current_action: contextvars.ContextVar = contextvars.ContextVar('current_action', default=None)
+
+class _ActionStats:
+    """Counters for one dispatcher action, shared with the threads it fans out to."""
+
+    def __init__(self):
+        self.rpcs = 0
+        self.retries = 0
+        self._lock = threading.Lock()
+
+    def add(self, rpcs: int = 0, retries: int = 0) -> None:
+        with self._lock:
+            self.rpcs += rpcs
+            self.retries += retries
+
+def enable(enabled: bool = True) -> None:
+    """Turn instrumentation on or off. It is off unless INSTRUMENTATION_ENABLED is set."""
+    global _enabled
+    _enabled = enabled
+
+def is_enabled() -> bool:
+    return _enabled
+
+def reset_metrics() -> None:
+    with _metrics_lock:
+        _metrics.clear()
+
+def _observe(kind: str, label: str, seconds: float, error: bool, **counters: int) -> None:
+    with _metrics_lock:
+        metric = _metrics.setdefault((kind, label), {
+            "count": 0, "errors": 0, "seconds": 0.0, "max_seconds": 0.0, "rpcs": 0, "retries": 0, "payload_bytes": 0,
+        })
+        metric["count"] += 1
+        metric["errors"] += int(error)
+        metric["seconds"] += seconds
+        metric["max_seconds"] = max(metric["max_seconds"], seconds)
+        for name, value in counters.items():
+            metric[name] += value
+
+def record_retry() -> None:
+    """Count a retry against the action currently being handled."""
+    stats = _current_action.get()
+    if stats is not None:
+        stats.add(retries=1)
+
+def _finish_action(label: str, parent, stats: _ActionStats, seconds: float, error: bool, result: Any) -> None:
+    if parent is not None:
+        parent.add(stats.rpcs, stats.retries)
+    payload_bytes = len(json.dumps(result, default=str)) if result is not None else 0
+    error = error or (isinstance(result, dict) and 'error' in result)
+    _observe('action', label, seconds, error, rpcs=stats.rpcs, retries=stats.retries, payload_bytes=payload_bytes)
+    logging.info(json.dumps({
+        "event": "action", "action": label, "seconds": round(seconds, 4), "error": error,
+        "rpcs": stats.rpcs, "retries": stats.retries, "payload_bytes": payload_bytes,
+    }))
+
+def instrumented(service: str) -> Callable[[Callable[[Dict], Any]], Callable[[Dict], Any]]:
+    """
+    Record wall time, RPC count, retries and response size for every action of a dispatcher.
+
+    Each action is logged as one structured JSON line and added to the metrics exported
+    by `render_prometheus`. When instrumentation is disabled the dispatcher is called
+    directly. Both plain and async dispatchers can be decorated.
+    """
+    def decorator(handler: Callable[[Dict], Any]) -> Callable[[Dict], Any]:
+        if inspect.iscoroutinefunction(handler):
+            @functools.wraps(handler)
+            async def async_wrapper(request_data: Dict) -> Any:
+                if not _enabled:
+                    return await handler(request_data)
+
+                label = f"{service}.{request_data.get('action')}"
+                parent = _current_action.get()
+                stats = _ActionStats()
+                token = _current_action.set(stats)
+                started = time.perf_counter()
+                error = False
+                result = None
+                try:
+                    result = await handler(request_data)
+                    return result
+                except Exception:
+                    error = True
+                    raise
+                finally:
+                    _current_action.reset(token)
+                    _finish_action(label, parent, stats, time.perf_counter() - started, error, result)
+            return async_wrapper
+
+        @functools.wraps(handler)
+        def wrapper(request_data: Dict) -> Any:
+            if not _enabled:
+                return handler(request_data)
+
+            label = f"{service}.{request_data.get('action')}"
+            parent = _current_action.get()
+            stats = _ActionStats()
+            token = _current_action.set(stats)
+            started = time.perf_counter()
+            error = False
+            result = None
+            try:
+                result = handler(request_data)
+                return result
+            except Exception:
+                error = True
+                raise
+            finally:
+                _current_action.reset(token)
+                _finish_action(label, parent, stats, time.perf_counter() - started, error, result)
+        return wrapper
+    return decorator
+
+class _InstrumentedOperation:
+    """Wraps a long-running operation so the time spent waiting on it is recorded."""
+
+    def __init__(self, operation: Any, label: str):
+        self._operation = operation
+        self._label = label
+
+    def result(self, *args, **kwargs):
+        started = time.perf_counter()
+        error = False
+        try:
+            return self._operation.result(*args, **kwargs)
+        except Exception:
+            error = True
+            raise
+        finally:
+            _observe('lro_wait', self._label, time.perf_counter() - started, error)
+
+    def __getattr__(self, name):
+        return getattr(self._operation, name)
+
+class InstrumentedClient:
+    """Wraps an SDK client so each RPC and each long-running operation wait is recorded."""
+
+    def __init__(self, client: Any, name: str):
+        self._client = client
+        self._name = name
+
+    def __getattr__(self, attr):
+        value = getattr(self._client, attr)
+        if not callable(value) or attr.startswith('_'):
+            return value
+        label = f"{self._name}.{attr}"
+
+        @functools.wraps(value)
+        def call(*args, **kwargs):
+            stats = _current_action.get()
+            if stats is not None:
+                stats.add(rpcs=1)
+            started = time.perf_counter()
+            error = False
+            try:
+                result = value(*args, **kwargs)
+            except Exception:
+                error = True
+                raise
+            finally:
+                _observe('rpc', label, time.perf_counter() - started, error)
+            if hasattr(result, 'result') and hasattr(result, 'done'):
+                return _InstrumentedOperation(result, label)
+            return result
+        return call
+
+class _InstrumentedAsyncOperation(_InstrumentedOperation):
+    """Wraps an async long-running operation so the time spent awaiting it is recorded."""
+
+    async def result(self, *args, **kwargs):
+        started = time.perf_counter()
+        error = False
+        try:
+            return await self._operation.result(*args, **kwargs)
+        except Exception:
+            error = True
+            raise
+        finally:
+            _observe('lro_wait', self._label, time.perf_counter() - started, error)
+
+class InstrumentedAsyncClient(InstrumentedClient):
+    """Wraps an SDK async client so each awaited RPC and long-running operation wait is recorded."""
+
+    def __getattr__(self, attr):
+        value = getattr(self._client, attr)
+        if not callable(value) or attr.startswith('_'):
+            return value
+        label = f"{self._name}.{attr}"
+
+        @functools.wraps(value)
+        async def call(*args, **kwargs):
+            stats = _current_action.get()
+            if stats is not None:
+                stats.add(rpcs=1)
+            started = time.perf_counter()
+            error = False
+            try:
+                result = await value(*args, **kwargs)
+            except Exception:
+                error = True
+                raise
+            finally:
+                _observe('rpc', label, time.perf_counter() - started, error)
+            if hasattr(result, 'result') and hasattr(result, 'done'):
+                return _InstrumentedAsyncOperation(result, label)
+            return result
+        return call
+
+def instrument_client(factory: Callable[[], Any], name: str, asynchronous: bool = False) -> Callable[[], Any]:
+    """Wrap a client factory so client creation (credentials and channel setup) is timed."""
+    def build():
+        started = time.perf_counter()
+        client = factory()
+        _observe('client_init', name, time.perf_counter() - started, False)
+        return InstrumentedAsyncClient(client, name) if asynchronous else InstrumentedClient(client, name)
+    return build
+
+def snapshot() -> Dict[str, Dict[str, Dict[str, float]]]:
+    """Return a copy of all recorded metrics, grouped by kind."""
+    with _metrics_lock:
+        grouped: Dict[str, Dict[str, Dict[str, float]]] = {}
+        for (kind, label), metric in _metrics.items():
+            grouped.setdefault(kind, {})[label] = dict(metric)
+        return grouped
+
+def render_prometheus() -> str:
+    """Render the recorded metrics in the Prometheus text exposition format."""
+    label_names = {'action': 'action', 'rpc': 'method', 'lro_wait': 'method', 'client_init': 'client'}
+    lines = []
+    for kind, metrics in sorted(snapshot().items()):
+        base = f"{METRIC_PREFIX}_{kind}"
+        label_name = label_names[kind]
+        lines.append(f"# TYPE {base}_seconds summary")
+        for label, metric in sorted(metrics.items()):
+            labels = f'{{{label_name}="{label}"}}'
+            lines.append(f"{base}_seconds_count{labels} {metric['count']}")
+            lines.append(f"{base}_seconds_sum{labels} {metric['seconds']:.6f}")
+        for counter in ('errors', 'rpcs', 'retries', 'payload_bytes'):
+            if kind != 'action' and counter != 'errors':
+                continue
+            lines.append(f"# TYPE {base}_{counter}_total counter")
+            for label, metric in sorted(metrics.items()):
+                lines.append(f'{base}_{counter}_total{{{label_name}="{label}"}} {metric[counter]}')
+    return '\n'.join(lines) + '\n'
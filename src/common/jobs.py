@@ -0,0 +1,334 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from common.batch import BATCH_ACTION, _batch_items
+from common.concurrency import DEFAULT_MAX_WORKERS, run_concurrently
+
+JOB_SUBMIT_ACTION = 'job_submit'
+JOB_RESUME_ACTION = 'job_resume'
+JOB_STATUS_ACTION = 'job_status'
+JOB_ACTIONS = (JOB_SUBMIT_ACTION, JOB_RESUME_ACTION, JOB_STATUS_ACTION)
+DEFAULT_CHUNK_SIZE = 25
+# The work budget of one invocation, kept below the 10 minute Cloud Function limit
+DEFAULT_TIME_BUDGET = float(os.environ.get('JOB_TIME_BUDGET_SECONDS', 540))
+# Time left unused at the end of an invocation for saving progress and responding
+HANDOFF_MARGIN = 15.0
+# Job-level fields of a submit request that are not passed on to the items
+JOB_FIELDS = ('job_id', 'chunk_size', 'timeout', 'started_at')
+# Result fields that are never written to the job store
+SENSITIVE_FIELDS = ('private_key',)
+
+class JobStore(ABC):
+    """
+    Base class for job stores.
+
+    A job is a list of single-action requests split into fixed-size chunks. Invocations
+    lease whole chunks, and record each item's outcome as soon as it finishes, so a
+    chunk that is picked up again after its lease expired only runs the items that
+    have not finished yet.
+    """
+
+    @abstractmethod
+    def create(self, job_id: str, handler: str, items: List[Dict], chunk_size: int, max_workers: int) -> None:
+        """Store a new job. Raises ValueError if `job_id` already exists."""
+
+    @abstractmethod
+    def get_job(self, job_id: str) -> Dict[str, Any]:
+        """Return the job's 'handler' and 'max_workers'. Raises ValueError for an unknown job."""
+
+    @abstractmethod
+    def claim_chunk(self, job_id: str, lease_seconds: float) -> Optional[int]:
+        """Lease the next unfinished chunk that is not leased by another invocation, or return None."""
+
+    @abstractmethod
+    def pending_items(self, job_id: str, chunk: int) -> List[Tuple[int, Dict]]:
+        """Return the (index, request) of each item in `chunk` that has not finished."""
+
+    @abstractmethod
+    def record_item(self, job_id: str, index: int, result: Any = None, error: Optional[str] = None) -> None:
+        """Record an item's result, or its error, and mark it finished."""
+
+    @abstractmethod
+    def complete_chunk(self, job_id: str, chunk: int) -> None:
+        """Mark `chunk` as done and release its lease."""
+
+    @abstractmethod
+    def retry_failed(self, job_id: str) -> int:
+        """Mark failed items as pending again and reopen their chunks. Returns the number of items."""
+
+    @abstractmethod
+    def status(self, job_id: str, include_results: bool = False) -> Dict[str, Any]:
+        """Return the job's progress counts, and each finished item's outcome with `include_results`."""
+
+class SQLiteJobStore(JobStore):
+    """A job store in a local SQLite file, for tests and single-host deployments."""
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "job_id TEXT PRIMARY KEY, handler TEXT NOT NULL, max_workers INTEGER NOT NULL, "
+            "created_at REAL NOT NULL, updated_at REAL NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS job_chunks ("
+            "job_id TEXT NOT NULL, chunk INTEGER NOT NULL, done INTEGER NOT NULL DEFAULT 0, "
+            "lease_expires REAL NOT NULL DEFAULT 0, PRIMARY KEY (job_id, chunk));"
+            "CREATE TABLE IF NOT EXISTS job_items ("
+            "job_id TEXT NOT NULL, idx INTEGER NOT NULL, chunk INTEGER NOT NULL, request TEXT NOT NULL, "
+            "status TEXT NOT NULL DEFAULT 'pending', result TEXT, error TEXT, PRIMARY KEY (job_id, idx));"
+        )
+        self._conn.commit()
+
+    def create(self, job_id: str, handler: str, items: List[Dict], chunk_size: int, max_workers: int) -> None:
+        now = time.time()
+        chunks = range((len(items) + chunk_size - 1) // chunk_size)
+        with self._lock:
+            try:
+                self._conn.execute(
+                    "INSERT INTO jobs (job_id, handler, max_workers, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                    (job_id, handler, max_workers, now, now),
+                )
+            except sqlite3.IntegrityError:
+                raise ValueError(f"Job {job_id} already exists")
+            self._conn.executemany("INSERT INTO job_chunks (job_id, chunk) VALUES (?, ?)",
+                                   [(job_id, chunk) for chunk in chunks])
+            self._conn.executemany(
+                "INSERT INTO job_items (job_id, idx, chunk, request) VALUES (?, ?, ?, ?)",
+                [(job_id, index, index // chunk_size, json.dumps(item)) for index, item in enumerate(items)],
+            )
+            self._conn.commit()
+
+    def get_job(self, job_id: str) -> Dict[str, Any]:
+        with self._lock:
+            row = self._conn.execute("SELECT handler, max_workers FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None:
+            raise ValueError(f"Unknown job: {job_id}")
+        return {"handler": row[0], "max_workers": row[1]}
+
+    def claim_chunk(self, job_id: str, lease_seconds: float) -> Optional[int]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT chunk FROM job_chunks WHERE job_id = ? AND done = 0 AND lease_expires <= ? ORDER BY chunk LIMIT 1",
+                (job_id, now),
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE job_chunks SET lease_expires = ? WHERE job_id = ? AND chunk = ?",
+                               (now + lease_seconds, job_id, row[0]))
+            self._conn.commit()
+        return row[0]
+
+    def pending_items(self, job_id: str, chunk: int) -> List[Tuple[int, Dict]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT idx, request FROM job_items WHERE job_id = ? AND chunk = ? AND status = 'pending' ORDER BY idx",
+                (job_id, chunk),
+            ).fetchall()
+        return [(index, json.loads(request)) for index, request in rows]
+
+    def record_item(self, job_id: str, index: int, result: Any = None, error: Optional[str] = None) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE job_items SET status = ?, result = ?, error = ? WHERE job_id = ? AND idx = ?",
+                ('failed' if error is not None else 'done', json.dumps(result, default=str), error, job_id, index),
+            )
+            self._conn.execute("UPDATE jobs SET updated_at = ? WHERE job_id = ?", (time.time(), job_id))
+            self._conn.commit()
+
+    def complete_chunk(self, job_id: str, chunk: int) -> None:
+        with self._lock:
+            self._conn.execute("UPDATE job_chunks SET done = 1, lease_expires = 0 WHERE job_id = ? AND chunk = ?",
+                               (job_id, chunk))
+            self._conn.commit()
+
+    def retry_failed(self, job_id: str) -> int:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE job_chunks SET done = 0 WHERE job_id = ? AND chunk IN ("
+                "SELECT chunk FROM job_items WHERE job_id = ? AND status = 'failed')",
+                (job_id, job_id),
+            )
+            count = self._conn.execute(
+                "UPDATE job_items SET status = 'pending', result = NULL, error = NULL "
+                "WHERE job_id = ? AND status = 'failed'", (job_id,),
+            ).rowcount
+            self._conn.commit()
+        return count
+
+    def status(self, job_id: str, include_results: bool = False) -> Dict[str, Any]:
+        with self._lock:
+            job = self._conn.execute("SELECT created_at, updated_at FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            if job is None:
+                raise ValueError(f"Unknown job: {job_id}")
+            counts = dict(self._conn.execute(
+                "SELECT status, COUNT(*) FROM job_items WHERE job_id = ? GROUP BY status", (job_id,)).fetchall())
+            chunks_total, chunks_done = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(done), 0) FROM job_chunks WHERE job_id = ?", (job_id,)).fetchone()
+            rows = self._conn.execute(
+                "SELECT idx, status, result, error FROM job_items WHERE job_id = ? AND status != 'pending' ORDER BY idx",
+                (job_id,),
+            ).fetchall() if include_results else []
+
+        pending = counts.get('pending', 0)
+        status = {
+            "job_id": job_id,
+            "status": 'running' if pending else 'done',
+            "total": sum(counts.values()),
+            "done": counts.get('done', 0),
+            "failed": counts.get('failed', 0),
+            "pending": pending,
+            "chunks_total": chunks_total,
+            "chunks_done": chunks_done,
+            "created_at": job[0],
+            "updated_at": job[1],
+        }
+        if include_results:
+            status["results"] = [
+                {"index": index, "error": error} if item_status == 'failed' else {"index": index, "result": json.loads(result)}
+                for index, item_status, result, error in rows
+            ]
+        return status
+
+_store: Optional[JobStore] = None
+_store_lock = threading.Lock()
+
+def get_job_store() -> JobStore:
+    """
+    Return the job store, creating it from JOB_STORE_BACKEND on first use.
+
+    The SQLite store lives at JOB_STORE_PATH, by default in the instance's /tmp, so a
+    job can only be resumed or reported on by the function instance that submitted it.
+    For 'job_resume' to work from any instance, point JOB_STORE_PATH at storage every
+    instance mounts (e.g. a Filestore share).
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            backend = os.environ.get('JOB_STORE_BACKEND', 'sqlite')
+            if backend == 'sqlite':
+                _store = SQLiteJobStore(os.environ.get('JOB_STORE_PATH', '/tmp/gcp_selfservice_jobs.sqlite3'))
+            else:
+                raise ValueError(f"Unknown job store backend: {backend}")
+        return _store
+
+def set_job_store(store: JobStore) -> None:
+    """Replace the job store used by all dispatchers."""
+    global _store
+    with _store_lock:
+        _store = store
+
+def _handler_name(handler: Callable) -> str:
+    return f"{handler.__module__}.{handler.__name__}"
+
+def _scrub(result: Any) -> Any:
+    if isinstance(result, dict):
+        return {k: _scrub(v) for k, v in result.items() if k not in SENSITIVE_FIELDS}
+    if isinstance(result, (list, tuple)):
+        return [_scrub(v) for v in result]
+    return result
+
+def run_job_action(handler: Callable[[Dict], Any], request_data: Dict,
+                   secret_actions: Tuple[str, ...] = ()) -> Dict[str, Any]:
+    """
+    Submit, resume or report on a chunked job run through a single-action dispatcher.
+
+    'job_submit' takes the same request as a batch ('actions' and shared defaults), plus
+    'chunk_size' and an optional 'job_id'. It stores the job and starts working on it.
+    Each invocation of 'job_submit' or 'job_resume' claims chunks one after another. It
+    stops claiming once the time left in its budget ('timeout' seconds from 'started_at')
+    is less than the slowest chunk so far plus HANDOFF_MARGIN. It then returns with
+    'complete' False, and the caller hands off by sending 'job_resume' with the 'job_id'.
+    Items that finished in an earlier invocation are never run again. Set 'retry_failed'
+    on 'job_resume' to re-run the ones that failed. 'job_status' reports progress, with
+    each item's outcome when 'include_results' is set.
+
+    Item results are stored without their SENSITIVE_FIELDS, at any depth. Since a job's
+    results are only ever read back from the store, actions in `secret_actions` (whose
+    secrets would be lost, e.g. new private keys) are rejected at submission.
+
+    Args:
+        handler (Callable[[Dict], Any]): The dispatcher that handles one action.
+        request_data (Dict): The job request.
+        secret_actions (Tuple[str, ...], optional): Actions of `handler` that return secrets.
+
+    Returns:
+        Dict[str, Any]: The job status ('job_id', 'status', 'total', 'done', 'failed',
+            'pending', 'chunks_total', 'chunks_done', ...). 'job_submit' and 'job_resume' also
+            return how many items they 'processed' and whether the job is 'complete'.
+
+    Raises:
+        ValueError: If the request is invalid, the job is unknown, or it belongs to another dispatcher.
+    """
+    action = request_data.get('action')
+    store = get_job_store()
+    if action == JOB_STATUS_ACTION:
+        store.get_job(request_data['job_id'])
+        return store.status(request_data['job_id'], request_data.get('include_results', False) is True)
+
+    started_at = time.time() if request_data.get('started_at') is None else float(request_data['started_at'])
+    deadline = started_at + float(request_data.get('timeout', DEFAULT_TIME_BUDGET))
+
+    if action == JOB_SUBMIT_ACTION:
+        items, max_workers = _batch_items({k: v for k, v in request_data.items() if k not in JOB_FIELDS},
+                                          DEFAULT_MAX_WORKERS)
+        if any(item.get('action') in JOB_ACTIONS for item in items):
+            raise ValueError("Nested job actions are not supported")
+        rejected = sorted({item.get('action') for item in items if item.get('action') in secret_actions})
+        if rejected:
+            raise ValueError(f"Actions {', '.join(rejected)} return secrets and cannot run as a job; "
+                             f"use '{BATCH_ACTION}' instead")
+        chunk_size = int(request_data.get('chunk_size', DEFAULT_CHUNK_SIZE))
+        if chunk_size < 1:
+            raise ValueError(f"chunk_size must be at least 1, got {chunk_size}")
+        job_id = request_data.get('job_id') or uuid.uuid4().hex
+        store.create(job_id, _handler_name(handler), items, chunk_size, max_workers)
+    else:
+        job_id = request_data['job_id']
+
+    job = store.get_job(job_id)
+    if job["handler"] != _handler_name(handler):
+        raise ValueError(f"Job {job_id} belongs to {job['handler']}")
+    if action == JOB_RESUME_ACTION and request_data.get('retry_failed'):
+        store.retry_failed(job_id)
+
+    def _run(entry):
+        index, item = entry
+        try:
+            result = handler(item)
+        except Exception as e:
+            store.record_item(job_id, index, error=str(e))
+            raise
+        if isinstance(result, dict) and 'error' in result:
+            store.record_item(job_id, index, error=str(result['error']))
+        else:
+            store.record_item(job_id, index, result=_scrub(result))
+        return result
+
+    processed = 0
+    slowest_chunk = 0.0
+    while True:
+        remaining = deadline - time.time()
+        if remaining < slowest_chunk + HANDOFF_MARGIN:
+            break
+        chunk = store.claim_chunk(job_id, lease_seconds=remaining)
+        if chunk is None:
+            break
+        chunk_started = time.time()
+        pending = store.pending_items(job_id, chunk)
+        run_concurrently(_run, pending, job["max_workers"])
+        store.complete_chunk(job_id, chunk)
+        processed += len(pending)
+        slowest_chunk = max(slowest_chunk, time.time() - chunk_started)
+
+    status = store.status(job_id)
+    complete = status["pending"] == 0
+    message = f"Job {job_id}: {status['done']} of {status['total']} items done, {status['failed']} failed"
+    if not complete:
+        message += f"; send '{JOB_RESUME_ACTION}' with this job_id to continue"
+    return {**status, "message": message, "processed": processed, "complete": complete}
@@ -0,0 +1,270 @@
+import asyncio
+import functools
+import logging
+import os
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+from google.api_core import exceptions as google_exceptions
+from common import instrumentation
+
+# Requests per second allowed per project, keyed by client registry name. Override with
+# RATE_LIMITS, e.g. "compute.instances=20,iam=5". A rate of 0 disables throttling for
+# that API but keeps the retries. Clients not listed here (local indexes) are not wrapped.
+DEFAULT_RATE_LIMITS: Dict[str, float] = {
+    'compute.instances': 20.0,
+    'iam': 10.0,
+    'certificate_manager': 10.0,
+}
+MAX_RETRIES = int(os.environ.get('RATE_LIMIT_MAX_RETRIES', 5))
+RETRY_INITIAL_DELAY = 0.5
+RETRY_MAX_DELAY = 32.0
+# After a quota error the rate is halved, but never below this fraction of the configured rate
+MIN_RATE_FRACTION = 0.05
+# Each successful call wins back this fraction of the configured rate
+RECOVERY_FRACTION = 0.01
+
+# The API rejected the call over quota without acting on it, so it is always safe to send
+# again (ResourceExhausted is a TooManyRequests)
+QUOTA_ERRORS = (google_exceptions.TooManyRequests,)
+# The call may have been applied before the deadline hit or the service became unavailable,
+# so only idempotent calls are retried
+AMBIGUOUS_ERRORS = (google_exceptions.DeadlineExceeded, google_exceptions.ServiceUnavailable)
+# A second create could leave a duplicate behind (e.g. an extra service account key)
+NON_IDEMPOTENT_PREFIXES = ('create', 'insert', 'upload')
+
+def _parse_rate_limits(value: str) -> Dict[str, float]:
+    limits = dict(DEFAULT_RATE_LIMITS)
+    for item in filter(None, (part.strip() for part in value.split(','))):
+        name, _, rate = item.partition('=')
+        limits[name.strip()] = float(rate)
+    return limits
+
+_enabled = os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+_rate_limits = _parse_rate_limits(os.environ.get('RATE_LIMITS', ''))
+_buckets: Dict[Tuple[str, str], 'TokenBucket'] = {}
+_buckets_lock = threading.Lock()
+
+class TokenBucket:
+    """
+    A thread-safe token bucket whose rate adapts to quota errors.
+
+    The bucket starts at the configured rate, halves it whenever the API reports quota
+    exhaustion and climbs back a little with every successful call, so a large fan-out
+    settles just below the quota instead of repeatedly tripping it.
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst if burst is not None else max(rate, 1.0)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _take(self) -> float:
+        """Take a token if one is available. Returns 0, or the seconds until the next token."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self) -> float:
+        """Block until a token is available. Returns the seconds spent waiting."""
+        waited = 0.0
+        while True:
+            delay = self._take()
+            if not delay:
+                return waited
+            time.sleep(delay)
+            waited += delay
+
+    async def acquire_async(self) -> float:
+        """Wait for a token without blocking the event loop. Returns the seconds spent waiting."""
+        waited = 0.0
+        while True:
+            delay = self._take()
+            if not delay:
+                return waited
+            await asyncio.sleep(delay)
+            waited += delay
+
+    def penalize(self) -> None:
+        with self._lock:
+            self.rate = max(self.max_rate * MIN_RATE_FRACTION, self.rate / 2)
+
+    def reward(self) -> None:
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate * RECOVERY_FRACTION)
+
+def enable(enabled: bool = True) -> None:
+    """Turn rate limiting on or off for clients built from now on. It is on unless RATE_LIMIT_ENABLED is false."""
+    global _enabled
+    _enabled = enabled
+
+def is_enabled() -> bool:
+    return _enabled
+
+def is_limited(api: str) -> bool:
+    """Return whether clients registered under `api` should go through the limiter."""
+    return _enabled and api in _rate_limits
+
+def set_rate_limit(api: str, rate: float) -> None:
+    """Set the per-project requests per second for an API and drop its existing buckets."""
+    with _buckets_lock:
+        _rate_limits[api] = rate
+        for key in [key for key in _buckets if key[0] == api]:
+            del _buckets[key]
+
+def reset_buckets() -> None:
+    with _buckets_lock:
+        _buckets.clear()
+
+def get_bucket(api: str, project: str) -> Optional[TokenBucket]:
+    """Return the bucket shared by every call to `api` for `project`, or None if the API is not throttled."""
+    rate = _rate_limits.get(api)
+    if not rate:
+        return None
+    key = (api, project)
+    with _buckets_lock:
+        bucket = _buckets.get(key)
+        if bucket is None:
+            bucket = _buckets[key] = TokenBucket(rate)
+        return bucket
+
+def is_retryable(error: Exception, method: str = '') -> bool:
+    """
+    Classify an API error as transient or permanent.
+
+    Args:
+        error (Exception): The error raised by the client.
+        method (str): The client method that raised it.
+
+    Returns:
+        bool: True for quota errors, and for deadline and availability errors on idempotent methods.
+    """
+    if isinstance(error, QUOTA_ERRORS):
+        return True
+    if isinstance(error, AMBIGUOUS_ERRORS):
+        return not method.startswith(NON_IDEMPOTENT_PREFIXES)
+    return False
+
+def backoff_delay(attempt: int) -> float:
+    """Full-jitter exponential backoff for the given retry attempt (starting at 0)."""
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_INITIAL_DELAY * 2 ** attempt))
+
+def _project_of(args: tuple, kwargs: Dict[str, Any]) -> str:
+    # Compute takes project=...; IAM and Certificate Manager take resource names or a request object
+    if isinstance(kwargs.get('project'), str) and kwargs['project']:
+        return kwargs['project']
+    request = kwargs.get('request')
+    if isinstance(getattr(request, 'project', None), str) and request.project:
+        return request.project
+    candidates = [kwargs.get('name'), kwargs.get('parent'), kwargs.get('resource')]
+    for source in [request, kwargs.get('certificate')] + list(args):
+        if source is not None:
+            candidates += [source] + [getattr(source, attr, None) for attr in ('name', 'parent')]
+    for candidate in candidates:
+        if isinstance(candidate, str) and candidate.startswith('projects/'):
+            return candidate.split('/')[1]
+    return '-'
+
+def _should_retry(error: Exception, api: str, method: str, attempt: int, bucket: Optional[TokenBucket]) -> Optional[float]:
+    """Return the backoff before retrying `error`, or None if it should be raised."""
+    if not is_retryable(error, method) or attempt >= MAX_RETRIES:
+        return None
+    if bucket is not None and isinstance(error, google_exceptions.TooManyRequests):
+        bucket.penalize()
+    delay = backoff_delay(attempt)
+    logging.warning(f"{api}.{method} failed with {type(error).__name__}, retrying in {delay:.2f}s")
+    instrumentation.record_retry()
+    return delay
+
+def call_with_retry(func: Callable[..., Any], api: str, method: str, *args, **kwargs) -> Any:
+    """
+    Call an API method under the project's rate limit, retrying transient errors.
+
+    Args:
+        func (Callable[..., Any]): The bound client method.
+        api (str): The client registry name of the API.
+        method (str): The method name, used to decide whether timeouts can be retried.
+
+    Returns:
+        Any: Whatever the method returns.
+
+    Raises:
+        google.api_core.exceptions.GoogleAPICallError: Permanent errors immediately, and
+            transient errors once MAX_RETRIES retries are used up.
+    """
+    bucket = get_bucket(api, _project_of(args, kwargs))
+    attempt = 0
+    while True:
+        if bucket is not None:
+            bucket.acquire()
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            delay = _should_retry(e, api, method, attempt, bucket)
+            if delay is None:
+                raise
+            time.sleep(delay)
+            attempt += 1
+            continue
+        if bucket is not None:
+            bucket.reward()
+        return result
+
+async def call_with_retry_async(func: Callable[..., Any], api: str, method: str, *args, **kwargs) -> Any:
+    """The asyncio counterpart of `call_with_retry`, for methods of the SDKs' async clients."""
+    bucket = get_bucket(api, _project_of(args, kwargs))
+    attempt = 0
+    while True:
+        if bucket is not None:
+            await bucket.acquire_async()
+        try:
+            result = await func(*args, **kwargs)
+        except Exception as e:
+            delay = _should_retry(e, api, method, attempt, bucket)
+            if delay is None:
+                raise
+            await asyncio.sleep(delay)
+            attempt += 1
+            continue
+        if bucket is not None:
+            bucket.reward()
+        return result
+
+class RateLimitedClient:
+    """Wraps an SDK client so every RPC goes through the per-project limiter and retry policy."""
+
+    def __init__(self, client: Any, name: str):
+        self._client = client
+        self._name = name
+
+    def __getattr__(self, attr):
+        value = getattr(self._client, attr)
+        if not callable(value) or attr.startswith('_'):
+            return value
+
+        @functools.wraps(value)
+        def call(*args, **kwargs):
+            return call_with_retry(value, self._name, attr, *args, **kwargs)
+        return call
+
+class AsyncRateLimitedClient(RateLimitedClient):
+    """Wraps an SDK async client; the limiter waits with asyncio.sleep instead of blocking."""
+
+    def __getattr__(self, attr):
+        value = getattr(self._client, attr)
+        if not callable(value) or attr.startswith('_'):
+            return value
+
+        @functools.wraps(value)
+        async def call(*args, **kwargs):
+            return await call_with_retry_async(value, self._name, attr, *args, **kwargs)
+        return call
@@ -1,9 +1,56 @@
 from google.cloud import compute_v1
-from typing import Dict
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import os
+import threading
 import time
+from common.batch import BATCH_ACTION, run_batch
+from common.cache import cached, invalidate
+from common.client_registry import get_client
+from common.concurrency import DEFAULT_MAX_WORKERS, run_concurrently
+from common.idempotency import idempotent
+from common.instrumentation import instrumented
+from common.jobs import JOB_ACTIONS, run_job_action
+from compute_instance_management.instance_inventory import DEFAULT_INVENTORY_DIR, InstanceInventory
 
-# Initialize clients
-compute_client = compute_v1.InstancesClient()
+# Total restart budget in seconds (considering max Cloud Function time of 10 minutes)
+DEFAULT_RESTART_TIMEOUT = float(os.environ.get('RESTART_TIMEOUT_SECONDS', 540))
+# Backoff between operation checks in the async handler
+POLL_INITIAL_DELAY = 1.0
+POLL_MAX_DELAY = 15.0
+AGGREGATED_LIST_PAGE_SIZE = 500
+SELECTOR_ACTIONS = ('start', 'stop', 'reset')
+# For each desired power state, the action that reaches it from each current state.
+# States already at or heading to the target need nothing; states missing from a row
+# (e.g. SUSPENDED, REPAIRING) cannot be reconciled with start and stop.
+RECONCILE_TRANSITIONS = {
+    'RUNNING': {'RUNNING': None, 'PROVISIONING': None, 'STAGING': None, 'TERMINATED': 'start', 'STOPPED': 'start'},
+    'TERMINATED': {'TERMINATED': None, 'STOPPED': None, 'STOPPING': None,
+                   'RUNNING': 'stop', 'PROVISIONING': 'stop', 'STAGING': 'stop'},
+}
+
+_inventory: Optional[InstanceInventory] = None
+_inventory_lock = threading.Lock()
+
+def get_compute_client() -> compute_v1.InstancesClient:
+    """Return the shared Compute instances client, creating it on first use."""
+    return get_client('compute.instances', compute_v1.InstancesClient)
+
+def get_inventory() -> InstanceInventory:
+    """
+    Return the shared inventory state, opening it on first use.
+
+    The inventory is a local file rather than an API client, so it is kept out of the
+    client registry and its reads and writes are not counted as RPCs.
+    """
+    global _inventory
+    with _inventory_lock:
+        if _inventory is None:
+            _inventory = InstanceInventory()
+        return _inventory
+
+def _status_cache_key(project: str, zone: str, instance: str) -> str:
+    return f"compute.status:{project}:{zone}:{instance}"
 
 def start_vm(project: str, zone: str, instance: str) -> Dict[str, str]:
     """
@@ -21,7 +68,8 @@ def start_vm(project: str, zone: str, instance: str) -> Dict[str, str]:
         RuntimeError: If there's an error starting the VM.
     """
     try:
-        compute_client.start(project=project, zone=zone, instance=instance)
+        get_compute_client().start(project=project, zone=zone, instance=instance)
+        invalidate(_status_cache_key(project, zone, instance))
         return {"message": f"VM {instance} start initiated"}
     except Exception as e:
         raise RuntimeError(f"Error starting VM: {e}")
@@ -42,47 +90,107 @@ def stop_vm(project: str, zone: str, instance: str) -> Dict[str, str]:
         RuntimeError: If there's an error stopping the VM.
     """
     try:
-        compute_client.stop(project=project, zone=zone, instance=instance)
+        get_compute_client().stop(project=project, zone=zone, instance=instance)
+        invalidate(_status_cache_key(project, zone, instance))
         return {"message": f"VM {instance} stop initiated"}
     except Exception as e:
         raise RuntimeError(f"Error stopping VM: {e}")
 
-def restart_vm(project: str, zone: str, instance: str) -> Dict[str, str]:
+def _wait_for_operation(operation, deadline: float) -> bool:
+    """
+    Wait for a Compute operation to finish, up to the deadline.
+
+    Returns:
+        bool: True if the operation finished before the deadline, False otherwise.
+    """
+    try:
+        operation.result(timeout=max(deadline - time.time(), 0))
+        return True
+    except TimeoutError:
+        return False
+
+def restart_vm(project: str, zone: str, instance: str, timeout: Optional[float] = None,
+               started_at: Optional[float] = None) -> Dict[str, Any]:
     """
     Restart a VM instance by stopping and then starting it.
+
+    The handler waits on the stop and start operations themselves rather than
+    polling the instance on a fixed interval.
     
     Args:
         project (str): The GCP project ID.
         zone (str): The zone where the instance is located.
         instance (str): The name of the instance to restart.
+        timeout (float, optional): The total time budget in seconds. Defaults to DEFAULT_RESTART_TIMEOUT.
+        started_at (float, optional): Epoch time the budget started counting from, so time
+            already spent in the function is taken into account. Defaults to now.
     
     Returns:
-        Dict[str, str]: A dictionary containing a success message.
+        Dict[str, Any]: A dictionary containing a message and the measured 'stop_seconds'
+            and 'start_seconds'.
     
     Raises:
         RuntimeError: If there's an error restarting the VM.
     """
+    timeout = DEFAULT_RESTART_TIMEOUT if timeout is None else float(timeout)
+    started_at = time.time() if started_at is None else float(started_at)
+    deadline = started_at + timeout
+    invalidate(_status_cache_key(project, zone, instance))
     try:
-        stop_vm(project, zone, instance)
-        
-        # Wait for the VM to fully stop
-        start_time = time.time()
-        timeout = 540  # 9 minutes (considering max Cloud Function time of 10 minutes)
-        while True:
-            if time.time() - start_time > timeout:
-                return {"message": f"Timeout waiting for VM {instance} to stop"}
-            
-            vm_info = compute_client.get(project=project, zone=zone, instance=instance)
-            if vm_info.status == 'TERMINATED':
-                break
-            time.sleep(5)  # Wait for 5 seconds before checking again
-            print(vm_info.status)
-        
-        start_vm(project, zone, instance)
-        return {"message": f"VM {instance} restart initiated"}
+        stop_started = time.time()
+        operation = get_compute_client().stop(project=project, zone=zone, instance=instance)
+        stopped = _wait_for_operation(operation, deadline)
+        stop_seconds = round(time.time() - stop_started, 3)
+        if not stopped:
+            return {"message": f"Timeout waiting for VM {instance} to stop", "stop_seconds": stop_seconds}
+
+        start_started = time.time()
+        operation = get_compute_client().start(project=project, zone=zone, instance=instance)
+        started = _wait_for_operation(operation, deadline)
+        start_seconds = round(time.time() - start_started, 3)
+        invalidate(_status_cache_key(project, zone, instance))
+        if not started:
+            return {
+                "message": f"VM {instance} start initiated, timeout waiting for it to run",
+                "stop_seconds": stop_seconds,
+                "start_seconds": start_seconds,
+            }
+        return {
+            "message": f"VM {instance} restarted",
+            "stop_seconds": stop_seconds,
+            "start_seconds": start_seconds,
+        }
     except Exception as e:
         raise RuntimeError(f"Error restarting VM: {e}")
 
+def get_vm_status(project: str, zone: str, instance: str, use_cache: bool = True) -> Dict[str, str]:
+    """
+    Get the status of a VM instance.
+
+    Results are served from the read-through cache while fresh; start, stop, restart
+    and reset on the same instance invalidate them.
+
+    Args:
+        project (str): The GCP project ID.
+        zone (str): The zone where the instance is located.
+        instance (str): The name of the instance.
+        use_cache (bool): Set to False to bypass the cache and fetch from the API.
+
+    Returns:
+        Dict[str, str]: A dictionary containing the instance name and its status.
+
+    Raises:
+        RuntimeError: If there's an error getting the VM.
+    """
+    def _load():
+        vm_info = get_compute_client().get(project=project, zone=zone, instance=instance)
+        return {"instance": instance, "status": vm_info.status}
+
+    try:
+        return cached(_status_cache_key(project, zone, instance), _load, use_cache=use_cache)
+    except Exception as e:
+        raise RuntimeError(f"Error getting VM status: {e}")
+
 def reset_vm(project: str, zone: str, instance: str) -> Dict[str, str]:
     """
     Reset a VM instance (hard reset).
@@ -99,11 +207,294 @@ def reset_vm(project: str, zone: str, instance: str) -> Dict[str, str]:
         RuntimeError: If there's an error resetting the VM.
     """
     try:
-        compute_client.reset(project=project, zone=zone, instance=instance)
+        get_compute_client().reset(project=project, zone=zone, instance=instance)
+        invalidate(_status_cache_key(project, zone, instance))
         return {"message": f"VM {instance} reset initiated"}
     except Exception as e:
         raise RuntimeError(f"Error resetting VM: {e}")
 
+def build_instance_filter(selector: Dict[str, Any]) -> str:
+    """
+    Build an aggregated-list filter expression from a selector.
+
+    Args:
+        selector (Dict[str, Any]): A dictionary with optional keys:
+            - labels (Dict[str, str]): Labels every instance must carry.
+            - filter (str): A raw Compute filter expression, combined with the labels.
+
+    Returns:
+        str: The filter expression, or an empty string to match every instance.
+    """
+    expressions = [f'(labels.{key} = "{value}")' for key, value in sorted(selector.get('labels', {}).items())]
+    if selector.get('filter'):
+        expressions.append(f"({selector['filter']})")
+    return ' '.join(expressions)
+
+def list_instances_by_selector(project: str, selector: Dict[str, Any],
+                               unreachable: Optional[List[str]] = None) -> Iterator[Tuple[str, compute_v1.Instance]]:
+    """
+    List the instances matching a selector across all zones of a project.
+
+    Zones are enumerated with the aggregated-list API, so the whole project is
+    covered by a single paged call. The call asks for partial success, so zones that
+    cannot be reached are skipped rather than failing the listing; pass `unreachable`
+    to find out which.
+
+    Args:
+        project (str): The GCP project ID.
+        selector (Dict[str, Any]): The selector (see `build_instance_filter`), with an
+            optional 'zones' list restricting the zones that are returned.
+        unreachable (List[str], optional): Receives the name of every zone that could not be listed.
+
+    Yields:
+        Tuple[str, compute_v1.Instance]: The zone name and the instance.
+    """
+    zones = set(selector.get('zones') or [])
+    request = compute_v1.AggregatedListInstancesRequest(
+        project=project,
+        filter=build_instance_filter(selector),
+        max_results=AGGREGATED_LIST_PAGE_SIZE,
+        return_partial_success=True,
+    )
+    for scope, scoped_list in get_compute_client().aggregated_list(request=request):
+        zone = scope.split('/')[-1]
+        if zones and zone not in zones:
+            continue
+        if scoped_list.warning.code == compute_v1.Warning.Code.UNREACHABLE.name and unreachable is not None:
+            unreachable.append(zone)
+        for instance in scoped_list.instances:
+            yield zone, instance
+
+def handle_vm_selector_action(request_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Run a start, stop or reset action on every instance matching a selector.
+
+    Args:
+        request_data (Dict[str, Any]): A dictionary containing:
+            - action (str): One of 'start', 'stop' or 'reset'.
+            - project (str): The GCP project ID.
+            - selector (Dict[str, Any]): 'labels', 'filter' and/or 'zones' (see `list_instances_by_selector`).
+            - max_workers (int, optional): The maximum number of concurrent calls.
+
+    Returns:
+        Dict[str, Any]: A dictionary containing:
+            - message (str): A summary of the operation.
+            - zones (Dict[str, Dict]): Per zone, the 'succeeded' and 'failed' counts and the
+              per-instance 'result' or 'error'.
+            - unreachable (List[str]): Zones that could not be listed, so were not acted on.
+
+    Raises:
+        ValueError: If the action is not supported in selector mode.
+    """
+    action = request_data.get('action')
+    if action not in SELECTOR_ACTIONS:
+        raise ValueError(f"Action {action} is not supported with a selector")
+    project = request_data.get('project')
+    max_workers = int(request_data.get('max_workers', DEFAULT_MAX_WORKERS))
+    vm_action = {'start': start_vm, 'stop': stop_vm, 'reset': reset_vm}[action]
+
+    unreachable = []
+    targets = [(zone, instance.name)
+               for zone, instance in list_instances_by_selector(project, request_data['selector'], unreachable)]
+    outcomes = run_concurrently(lambda target: vm_action(project, target[0], target[1]), targets, max_workers)
+    return summarize_selector_outcomes(action, targets, outcomes, unreachable)
+
+def summarize_selector_outcomes(action: str, targets: List[Tuple[str, str]],
+                                outcomes: List[Tuple[Any, Optional[Exception]]],
+                                unreachable: List[str]) -> Dict[str, Any]:
+    """Group the (result, error) outcomes of a selector action by zone; see `handle_vm_selector_action`."""
+    zones = {}
+    for (zone, instance), (result, error) in zip(targets, outcomes):
+        summary = zones.setdefault(zone, {"succeeded": 0, "failed": 0, "instances": {}})
+        if error is None:
+            summary["succeeded"] += 1
+            summary["instances"][instance] = {"result": result}
+        else:
+            summary["failed"] += 1
+            summary["instances"][instance] = {"error": str(error)}
+
+    failed = sum(summary["failed"] for summary in zones.values())
+    message = f"VM {action} ran on {len(targets) - failed} of {len(targets)} instances in {len(zones)} zones"
+    if unreachable:
+        message += f", {len(unreachable)} zones unreachable"
+    return {"message": message, "zones": zones, "unreachable": unreachable}
+
+def take_inventory(project: str, output_dir: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Write a snapshot of every instance in a project and its diff against the previous one.
+
+    Instances are streamed from the aggregated-list API page by page straight into
+    two JSON Lines files, so memory use does not grow with the fleet:
+    - the snapshot, with one record per instance ('id', 'name', 'zone', 'status',
+      'machine_type', 'labels', 'creation_timestamp')
+    - the diff, with one line per instance that was 'added', 'removed' or 'changed'
+      since the previous snapshot ('changes' maps each changed field to [old, new])
+    The first snapshot of a project reports every instance as added.
+
+    Args:
+        project (str): The GCP project ID.
+        output_dir (str, optional): Where to write the files. Defaults to DEFAULT_INVENTORY_DIR.
+
+    Returns:
+        Dict[str, Any]: A dictionary containing a message, the 'snapshot' and 'diff' file paths,
+            whether this was the 'baseline' (first) snapshot, and the 'instances', 'added',
+            'removed' and 'changed' counts.
+
+    Raises:
+        RuntimeError: If the instances could not be listed, or some zones were unreachable;
+            the previous snapshot is kept.
+    """
+    output_dir = output_dir or DEFAULT_INVENTORY_DIR
+    os.makedirs(output_dir, exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%fZ')
+    snapshot_path = os.path.join(output_dir, f"{project}-{stamp}.jsonl")
+    diff_path = os.path.join(output_dir, f"{project}-{stamp}-diff.jsonl")
+    inventory = get_inventory()
+    baseline = not inventory.has_snapshot(project)
+
+    def _instances():
+        unreachable = []
+        yield from list_instances_by_selector(project, {}, unreachable)
+        if unreachable:
+            # Instances in these zones would otherwise show up as removed
+            raise RuntimeError(f"Zones could not be listed: {', '.join(unreachable)}")
+
+    try:
+        with open(snapshot_path + '.tmp', 'w') as snapshot_file, open(diff_path + '.tmp', 'w') as diff_file:
+            counts = inventory.snapshot(project, _instances(), snapshot_file, diff_file)
+        os.replace(snapshot_path + '.tmp', snapshot_path)
+        os.replace(diff_path + '.tmp', diff_path)
+    except Exception as e:
+        for path in (snapshot_path + '.tmp', diff_path + '.tmp'):
+            if os.path.exists(path):
+                os.remove(path)
+        raise RuntimeError(f"Error taking inventory: {e}")
+
+    return {
+        "message": (f"Inventoried {counts['instances']} instances in {project}: {counts['added']} added, "
+                    f"{counts['removed']} removed, {counts['changed']} changed"),
+        "snapshot": snapshot_path,
+        "diff": diff_path,
+        "baseline": baseline,
+        **counts,
+    }
+
+def plan_reconciliation(project: str, request_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Work out which instances need a start or stop to reach their desired power state.
+
+    Current states are read with one aggregated listing rather than one call per instance.
+
+    Args:
+        project (str): The GCP project ID.
+        request_data (Dict[str, Any]): Either 'desired', mapping 'zone/instance' to 'RUNNING' or
+            'TERMINATED', or a 'selector' (see `list_instances_by_selector`) and the 'state'
+            every matching instance should be in.
+
+    Returns:
+        Dict[str, Any]: A dictionary containing:
+            - transitions (List[Dict]): 'zone', 'instance', 'from', 'to' and 'action' for each instance to change.
+            - skipped (int): The number of instances already in (or heading to) their desired state.
+            - unsupported (Dict[str, str]): Instances whose current state start and stop cannot change, with that state.
+            - missing (List[str]): Entries of 'desired' that do not exist.
+            - unreachable (List[str]): Zones that could not be listed; their instances are not
+              planned, nor reported as missing.
+
+    Raises:
+        ValueError: If neither 'desired' nor 'selector' and 'state' are given, or a state is not supported.
+    """
+    if 'desired' in request_data:
+        desired = dict(request_data['desired'])
+        selector = {'zones': sorted({key.split('/')[0] for key in desired})}
+    elif 'selector' in request_data and 'state' in request_data:
+        desired = None
+        selector = request_data['selector']
+    else:
+        raise ValueError("reconcile needs 'desired', or 'selector' and 'state'")
+    for state in (desired.values() if desired is not None else [request_data['state']]):
+        if state not in RECONCILE_TRANSITIONS:
+            raise ValueError(f"Unsupported desired state: {state}")
+
+    transitions = []
+    unsupported = {}
+    skipped = 0
+    unreachable = []
+    for zone, instance in list_instances_by_selector(project, selector, unreachable):
+        key = f"{zone}/{instance.name}"
+        if desired is None:
+            target = request_data['state']
+        elif key in desired:
+            target = desired.pop(key)
+        else:
+            continue
+        moves = RECONCILE_TRANSITIONS[target]
+        if instance.status not in moves:
+            unsupported[key] = instance.status
+        elif moves[instance.status] is None:
+            skipped += 1
+        else:
+            transitions.append({"zone": zone, "instance": instance.name, "from": instance.status, "to": target,
+                                "action": moves[instance.status]})
+
+    return {"transitions": transitions, "skipped": skipped, "unsupported": unsupported,
+            "missing": sorted(key for key in desired or {} if key.split('/')[0] not in unreachable),
+            "unreachable": unreachable}
+
+def summarize_reconciliation(plan: Dict[str, Any], outcomes: List[Tuple[Any, Optional[Exception]]]) -> Dict[str, Any]:
+    """Merge the outcome of each transition into the plan; see `reconcile_vms`."""
+    transitions = {}
+    failed = 0
+    for transition, (result, error) in zip(plan["transitions"], outcomes):
+        entry = {k: transition[k] for k in ('from', 'to', 'action')}
+        if error is None:
+            entry["result"] = result
+        else:
+            failed += 1
+            entry["error"] = str(error)
+        transitions[f"{transition['zone']}/{transition['instance']}"] = entry
+
+    run = len(transitions)
+    return {
+        "message": f"Reconciled {run - failed} of {run} instances, {plan['skipped']} already in their desired state",
+        "run": run,
+        "failed": failed,
+        "skipped": plan["skipped"],
+        "unsupported": plan["unsupported"],
+        "missing": plan["missing"],
+        "unreachable": plan["unreachable"],
+        "transitions": transitions,
+    }
+
+def reconcile_vms(project: str, request_data: Dict[str, Any],
+                  max_workers: int = DEFAULT_MAX_WORKERS) -> Dict[str, Any]:
+    """
+    Bring instances to their desired power state, touching only those that are not there yet.
+
+    Args:
+        project (str): The GCP project ID.
+        request_data (Dict[str, Any]): The desired states; see `plan_reconciliation`.
+        max_workers (int): The maximum number of concurrent start and stop calls.
+
+    Returns:
+        Dict[str, Any]: A dictionary containing:
+            - message (str): A summary of the reconciliation.
+            - run (int): The number of transitions attempted, of which 'failed' raised an error.
+            - skipped (int): The number of instances that needed no change.
+            - unsupported (Dict[str, str]), missing (List[str]) and unreachable (List[str]):
+              See `plan_reconciliation`.
+            - transitions (Dict[str, Dict]): Per 'zone/instance', the 'from' and 'to' states, the
+              'action' and its 'result' or 'error'.
+    """
+    plan = plan_reconciliation(project, request_data)
+    vm_actions = {'start': start_vm, 'stop': stop_vm}
+    outcomes = run_concurrently(
+        lambda transition: vm_actions[transition["action"]](project, transition["zone"], transition["instance"]),
+        plan["transitions"], max_workers,
+    )
+    return summarize_reconciliation(plan, outcomes)
+
+@instrumented('compute')
+@idempotent
 def handle_vm_action(request_data: Dict[str, str]) -> Dict[str, str]:
     """
     Handle VM actions based on the provided request data.
@@ -111,6 +502,14 @@ def handle_vm_action(request_data: Dict[str, str]) -> Dict[str, str]:
     Args:
         request_data (Dict[str, str]): A dictionary containing the action details.
             Expected keys: 'action', 'project', 'zone', 'instance'
+            For action 'restart': 'timeout' and 'started_at' (optional)
+            For action 'status': 'cache' (optional, set to False to bypass the cache)
+            For action 'inventory': 'project' and 'output_dir' (optional); see `take_inventory`
+            For action 'reconcile': 'project', 'desired' or 'selector' and 'state', 'max_workers' (optional);
+            see `plan_reconciliation`
+            For fleet-wide 'start', 'stop' or 'reset': 'selector' in place of 'zone' and 'instance'
+            For action 'batch': 'actions' (list of requests), 'max_workers' (optional)
+            For actions 'job_submit', 'job_resume' and 'job_status': see `common.jobs.run_job_action`
     
     Returns:
         Dict[str, str]: A dictionary with the result of the VM action.
@@ -119,6 +518,18 @@ def handle_vm_action(request_data: Dict[str, str]) -> Dict[str, str]:
         ValueError: If an unknown action is provided.
     """
     action = request_data.get('action')
+    if action == BATCH_ACTION:
+        return run_batch(handle_vm_action, request_data)
+    if action in JOB_ACTIONS:
+        return run_job_action(handle_vm_action, request_data)
+    if action == 'reconcile':
+        max_workers = int(request_data.get('max_workers', DEFAULT_MAX_WORKERS))
+        return reconcile_vms(request_data['project'], request_data, max_workers)
+    if 'selector' in request_data:
+        return handle_vm_selector_action(request_data)
+    if action == 'inventory':
+        return take_inventory(request_data['project'], request_data.get('output_dir'))
+
     project = request_data.get('project')
     zone = request_data.get('zone')
     instance = request_data.get('instance')
@@ -127,12 +538,18 @@ def handle_vm_action(request_data: Dict[str, str]) -> Dict[str, str]:
         'start': start_vm,
         'stop': stop_vm,
         'restart': restart_vm,
-        'reset': reset_vm  # Add the new reset action
+        'reset': reset_vm,  # Add the new reset action
+        'status': get_vm_status
     }
     
     if action not in action_map:
         raise ValueError(f"Unknown action: {action}")
     
+    if action == 'restart':
+        return restart_vm(project, zone, instance, request_data.get('timeout'), request_data.get('started_at'))
+    if action == 'status':
+        return get_vm_status(project, zone, instance, request_data.get('cache', True) is not False)
+
     result = action_map[action](project, zone, instance)
     return result
 
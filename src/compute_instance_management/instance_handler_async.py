@@ -0,0 +1,189 @@
+import asyncio
+import random
+import time
+from typing import Any, Dict, Optional
+from common.batch import BATCH_ACTION, run_batch_async
+from common.cache import cached_async, invalidate
+from common.concurrency import DEFAULT_MAX_CONCURRENCY, run_concurrently_async
+from common.dispatch import run_on_sync_dispatcher
+from common.idempotency import idempotent
+from common.instrumentation import instrumented
+from common.jobs import JOB_ACTIONS
+from compute_instance_management.instance_handler import (
+    DEFAULT_RESTART_TIMEOUT, POLL_INITIAL_DELAY, POLL_MAX_DELAY, SELECTOR_ACTIONS,
+    _status_cache_key, get_compute_client, handle_vm_action, list_instances_by_selector, plan_reconciliation,
+    summarize_reconciliation, summarize_selector_outcomes, take_inventory
+)
+
+# The Compute SDK has no async client, so each RPC runs on a worker thread. Waits
+# between polls happen on the event loop, so a thread is only held for the RPC itself.
+
+async def _call(method: str, **kwargs) -> Any:
+    return await asyncio.to_thread(getattr(get_compute_client(), method), **kwargs)
+
+async def start_vm(project: str, zone: str, instance: str) -> Dict[str, str]:
+    """Start a VM instance; see `instance_handler.start_vm`."""
+    try:
+        await _call('start', project=project, zone=zone, instance=instance)
+        invalidate(_status_cache_key(project, zone, instance))
+        return {"message": f"VM {instance} start initiated"}
+    except Exception as e:
+        raise RuntimeError(f"Error starting VM: {e}")
+
+async def stop_vm(project: str, zone: str, instance: str) -> Dict[str, str]:
+    """Stop a VM instance; see `instance_handler.stop_vm`."""
+    try:
+        await _call('stop', project=project, zone=zone, instance=instance)
+        invalidate(_status_cache_key(project, zone, instance))
+        return {"message": f"VM {instance} stop initiated"}
+    except Exception as e:
+        raise RuntimeError(f"Error stopping VM: {e}")
+
+async def reset_vm(project: str, zone: str, instance: str) -> Dict[str, str]:
+    """Reset a VM instance; see `instance_handler.reset_vm`."""
+    try:
+        await _call('reset', project=project, zone=zone, instance=instance)
+        invalidate(_status_cache_key(project, zone, instance))
+        return {"message": f"VM {instance} reset initiated"}
+    except Exception as e:
+        raise RuntimeError(f"Error resetting VM: {e}")
+
+async def get_vm_status(project: str, zone: str, instance: str, use_cache: bool = True) -> Dict[str, str]:
+    """Get the status of a VM instance; see `instance_handler.get_vm_status`."""
+    async def _load():
+        vm_info = await _call('get', project=project, zone=zone, instance=instance)
+        return {"instance": instance, "status": vm_info.status}
+
+    try:
+        return await cached_async(_status_cache_key(project, zone, instance), _load, use_cache=use_cache)
+    except Exception as e:
+        raise RuntimeError(f"Error getting VM status: {e}")
+
+async def _wait_for_operation(operation, deadline: float) -> bool:
+    """
+    Poll a Compute operation until it is done, backing off exponentially with jitter between checks.
+
+    Returns:
+        bool: True if the operation finished before the deadline, False otherwise.
+    """
+    delay = POLL_INITIAL_DELAY
+    while True:
+        if await asyncio.to_thread(operation.done):
+            # Already finished, so this returns at once (or raises the operation's error)
+            operation.result()
+            return True
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            return False
+        await asyncio.sleep(min(remaining, random.uniform(delay / 2, delay)))
+        delay = min(delay * 2, POLL_MAX_DELAY)
+
+async def restart_vm(project: str, zone: str, instance: str, timeout: Optional[float] = None,
+                     started_at: Optional[float] = None) -> Dict[str, Any]:
+    """Restart a VM instance by stopping and then starting it; see `instance_handler.restart_vm`."""
+    timeout = DEFAULT_RESTART_TIMEOUT if timeout is None else float(timeout)
+    started_at = time.time() if started_at is None else float(started_at)
+    deadline = started_at + timeout
+    invalidate(_status_cache_key(project, zone, instance))
+    try:
+        stop_started = time.time()
+        operation = await _call('stop', project=project, zone=zone, instance=instance)
+        stopped = await _wait_for_operation(operation, deadline)
+        stop_seconds = round(time.time() - stop_started, 3)
+        if not stopped:
+            return {"message": f"Timeout waiting for VM {instance} to stop", "stop_seconds": stop_seconds}
+
+        start_started = time.time()
+        operation = await _call('start', project=project, zone=zone, instance=instance)
+        started = await _wait_for_operation(operation, deadline)
+        start_seconds = round(time.time() - start_started, 3)
+        invalidate(_status_cache_key(project, zone, instance))
+        if not started:
+            return {
+                "message": f"VM {instance} start initiated, timeout waiting for it to run",
+                "stop_seconds": stop_seconds,
+                "start_seconds": start_seconds,
+            }
+        return {
+            "message": f"VM {instance} restarted",
+            "stop_seconds": stop_seconds,
+            "start_seconds": start_seconds,
+        }
+    except Exception as e:
+        raise RuntimeError(f"Error restarting VM: {e}")
+
+async def handle_vm_selector_action(request_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Run a start, stop or reset action on every instance matching a selector; see `instance_handler.handle_vm_selector_action`."""
+    action = request_data.get('action')
+    if action not in SELECTOR_ACTIONS:
+        raise ValueError(f"Action {action} is not supported with a selector")
+    project = request_data.get('project')
+    max_concurrency = int(request_data.get('max_workers', DEFAULT_MAX_CONCURRENCY))
+    vm_action = {'start': start_vm, 'stop': stop_vm, 'reset': reset_vm}[action]
+
+    unreachable = []
+    instances = await asyncio.to_thread(
+        lambda: list(list_instances_by_selector(project, request_data['selector'], unreachable)))
+    targets = [(zone, instance.name) for zone, instance in instances]
+    outcomes = await run_concurrently_async(lambda target: vm_action(project, target[0], target[1]),
+                                            targets, max_concurrency)
+    return summarize_selector_outcomes(action, targets, outcomes, unreachable)
+
+async def reconcile_vms(project: str, request_data: Dict[str, Any],
+                        max_concurrency: int = DEFAULT_MAX_CONCURRENCY) -> Dict[str, Any]:
+    """Bring instances to their desired power state; see `instance_handler.reconcile_vms`."""
+    plan = await asyncio.to_thread(plan_reconciliation, project, request_data)
+    vm_actions = {'start': start_vm, 'stop': stop_vm}
+    outcomes = await run_concurrently_async(
+        lambda transition: vm_actions[transition["action"]](project, transition["zone"], transition["instance"]),
+        plan["transitions"], max_concurrency,
+    )
+    return summarize_reconciliation(plan, outcomes)
+
+@instrumented('compute')
+@idempotent
+async def handle_vm_action_async(request_data: Dict[str, str]) -> Dict[str, str]:
+    """
+    Handle VM actions on the event loop.
+
+    Takes the same requests and returns the same results as `instance_handler.handle_vm_action`.
+    In 'batch' and selector mode 'max_workers' is the number of actions in flight and
+    defaults to DEFAULT_MAX_CONCURRENCY.
+
+    Raises:
+        ValueError: If an unknown action is provided.
+    """
+    action = request_data.get('action')
+    if action == BATCH_ACTION:
+        return await run_batch_async(handle_vm_action_async, request_data)
+    if action in JOB_ACTIONS:
+        return await run_on_sync_dispatcher(handle_vm_action, request_data)
+    if action == 'reconcile':
+        max_concurrency = int(request_data.get('max_workers', DEFAULT_MAX_CONCURRENCY))
+        return await reconcile_vms(request_data['project'], request_data, max_concurrency)
+    if 'selector' in request_data:
+        return await handle_vm_selector_action(request_data)
+    if action == 'inventory':
+        # Streams pages to disk, so it keeps one worker thread for the whole listing
+        return await asyncio.to_thread(take_inventory, request_data['project'], request_data.get('output_dir'))
+
+    project = request_data.get('project')
+    zone = request_data.get('zone')
+    instance = request_data.get('instance')
+
+    action_map = {
+        'start': start_vm,
+        'stop': stop_vm,
+        'restart': restart_vm,
+        'reset': reset_vm,
+        'status': get_vm_status
+    }
+
+    if action not in action_map:
+        raise ValueError(f"Unknown action: {action}")
+
+    if action == 'restart':
+        return await restart_vm(project, zone, instance, request_data.get('timeout'), request_data.get('started_at'))
+    if action == 'status':
+        return await get_vm_status(project, zone, instance, request_data.get('cache', True) is not False)
+    return await action_map[action](project, zone, instance)
@@ -0,0 +1,113 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional, TextIO, Tuple
+from google.cloud import compute_v1
+
+DEFAULT_STATE_PATH = os.environ.get('INVENTORY_STATE_PATH', '/tmp/compute_instance_inventory.sqlite3')
+DEFAULT_INVENTORY_DIR = os.environ.get('INVENTORY_DIR', '/tmp/compute_inventory')
+# Fields compared between snapshots; a difference in any of them is reported as a change
+TRACKED_FIELDS = ('id', 'status', 'machine_type', 'labels')
+
+def instance_record(zone: str, instance: compute_v1.Instance) -> Dict[str, Any]:
+    """Return the compact, JSON-native inventory record for one instance."""
+    return {
+        "id": str(instance.id),
+        "name": instance.name,
+        "zone": zone,
+        "status": instance.status,
+        "machine_type": instance.machine_type.split('/')[-1],
+        "labels": dict(instance.labels),
+        "creation_timestamp": instance.creation_timestamp,
+    }
+
+def _dumps(record: Dict[str, Any]) -> str:
+    return json.dumps(record, sort_keys=True, separators=(',', ':'))
+
+class InstanceInventory:
+    """
+    The last inventory snapshot of every project, kept on disk for diffing.
+
+    Each snapshot streams the instances through once: every record is written out and
+    compared with the stored one as it arrives, and whatever was not seen afterwards
+    is reported as removed. Only the stored state grows with the fleet; memory does not.
+    """
+
+    def __init__(self, path: str = DEFAULT_STATE_PATH):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS instances ("
+            "project TEXT NOT NULL, key TEXT NOT NULL, record TEXT NOT NULL, generation INTEGER NOT NULL, "
+            "PRIMARY KEY (project, key));"
+        )
+        self._conn.commit()
+
+    def has_snapshot(self, project: str) -> bool:
+        """Return whether a snapshot of `project` was taken before."""
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM instances WHERE project = ? LIMIT 1", (project,)).fetchone() is not None
+
+    def snapshot(self, project: str, instances: Iterable[Tuple[str, compute_v1.Instance]],
+                 snapshot_file: TextIO, diff_file: TextIO) -> Dict[str, int]:
+        """
+        Record a new snapshot of a project and write it, and its diff, as JSON lines.
+
+        The stored state is only replaced once every instance was read, so a listing that
+        fails part-way leaves the previous snapshot in place for the next diff.
+
+        Args:
+            project (str): The GCP project ID.
+            instances (Iterable[Tuple[str, compute_v1.Instance]]): The (zone, instance) pairs, e.g. as
+                streamed by `instance_handler.list_instances_by_selector`.
+            snapshot_file (TextIO): Receives one record per instance.
+            diff_file (TextIO): Receives one line per 'added', 'removed' or 'changed' instance.
+
+        Returns:
+            Dict[str, int]: The number of 'instances', and how many were 'added', 'removed' and 'changed'.
+        """
+        generation = time.time_ns()
+        counts = {"instances": 0, "added": 0, "removed": 0, "changed": 0}
+        with self._lock:
+            try:
+                for zone, instance in instances:
+                    record = instance_record(zone, instance)
+                    line = _dumps(record)
+                    snapshot_file.write(line + '\n')
+                    counts["instances"] += 1
+
+                    key = f"{zone}/{record['name']}"
+                    row = self._conn.execute(
+                        "SELECT record FROM instances WHERE project = ? AND key = ?", (project, key)).fetchone()
+                    change = self._compare(row[0] if row else None, record)
+                    if change is not None:
+                        diff_file.write(_dumps(change) + '\n')
+                        counts[change["change"]] += 1
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO instances (project, key, record, generation) VALUES (?, ?, ?, ?)",
+                        (project, key, line, generation),
+                    )
+
+                for (previous,) in self._conn.execute(
+                        "SELECT record FROM instances WHERE project = ? AND generation != ?", (project, generation)):
+                    diff_file.write(_dumps({"change": "removed", "instance": json.loads(previous)}) + '\n')
+                    counts["removed"] += 1
+                self._conn.execute("DELETE FROM instances WHERE project = ? AND generation != ?", (project, generation))
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+        return counts
+
+    @staticmethod
+    def _compare(previous: Optional[str], record: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        if previous is None:
+            return {"change": "added", "instance": record}
+        previous = json.loads(previous)
+        changes = {field: [previous.get(field), record[field]]
+                   for field in TRACKED_FIELDS if previous.get(field) != record[field]}
+        if not changes:
+            return None
+        return {"change": "changed", "instance": record, "changes": changes}
@@ -0,0 +1,94 @@
+import json
+import os
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Set, Tuple
+
+DEFAULT_MAX_KEY_AGE_DAYS = 90
+DEFAULT_BATCH_SIZE = 50
+
+def key_age_days(valid_after_time: Optional[str], now: Optional[datetime] = None) -> Optional[float]:
+    """
+    Return the age of a key in days from its RFC 3339 'valid_after_time'.
+
+    Args:
+        valid_after_time (str, optional): When the key became valid, e.g. '2024-01-31T12:00:00Z'.
+        now (datetime, optional): The reference time. Defaults to the current UTC time.
+
+    Returns:
+        Optional[float]: The age in days, or None if the creation time is unknown.
+    """
+    if not valid_after_time:
+        return None
+    created = datetime.strptime(valid_after_time, '%Y-%m-%dT%H:%M:%SZ').replace(tzinfo=timezone.utc)
+    now = now or datetime.now(timezone.utc)
+    return (now - created).total_seconds() / 86400
+
+def write_key_file(directory: str, key: Dict[str, Any]) -> str:
+    """
+    Write a newly created key's private key data to '<directory>/<email>-<key_id>.json'.
+
+    The file is created exclusively with owner-only permissions and synced to disk
+    before returning, so the key is safe to rely on once this returns.
+
+    Returns:
+        str: The path of the key file.
+    """
+    path = os.path.join(directory, f"{key['service_account_email']}-{key['key_id']}.json")
+    data = key["private_key"]
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data if isinstance(data, bytes) else data.encode())
+        f.flush()
+        os.fsync(f.fileno())
+    return path
+
+def _key_ref(record: Dict[str, Any]) -> Tuple[str, str, str]:
+    return record["project_id"], record["service_account_email"], record["key_id"]
+
+class KeyCheckpoint:
+    """
+    An append-only JSONL log of the keys a sweep has already processed.
+
+    Each finished key is written and flushed as soon as its action completes, so a
+    sweep that is cut off by a function timeout can be re-run with the same file and
+    only picks up keys that have not succeeded yet. Private key material is never
+    written to the file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._done: Set[Tuple[str, str, str]] = set()
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    record = json.loads(line)
+                    if record.get("status") == "done":
+                        self._done.add(_key_ref(record))
+
+    def is_done(self, key: Dict[str, Any]) -> bool:
+        return _key_ref(key) in self._done
+
+    def record(self, key: Dict[str, Any], action: str, error: Optional[str] = None,
+               new_key_id: Optional[str] = None) -> None:
+        """Append the outcome of `action` on `key` to the checkpoint file."""
+        entry = {
+            "project_id": key["project_id"],
+            "service_account_email": key["service_account_email"],
+            "key_id": key["key_id"],
+            "action": action,
+            "status": "failed" if error else "done",
+        }
+        if error:
+            entry["error"] = error
+        if new_key_id:
+            entry["new_key_id"] = new_key_id
+        with self._lock:
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(entry) + '\n')
+            if not error:
+                self._done.add(_key_ref(key))
@@ -1,6 +1,34 @@
 from google.cloud import iam_admin_v1
-from typing import Dict, List
+from typing import Any, Dict, List, Optional
 from google.api_core import exceptions as google_exceptions
+from common.batch import BATCH_ACTION, run_batch
+from common.cache import cached, invalidate
+from common.client_registry import get_client
+from common.concurrency import DEFAULT_MAX_WORKERS, run_concurrently
+from common.idempotency import idempotent
+from common.instrumentation import instrumented
+from common.jobs import JOB_ACTIONS, run_job_action
+from iam_service_account_key_management.key_audit import (
+    DEFAULT_BATCH_SIZE, DEFAULT_MAX_KEY_AGE_DAYS, KeyCheckpoint, key_age_days, write_key_file
+)
+import threading
+import time
+
+# IAM allows at most 10 user-managed keys per service account
+MAX_KEYS_PER_SERVICE_ACCOUNT = 10
+AUDIT_POLICY_ACTIONS = ('rotate', 'disable', 'delete', 'none')
+# Actions that return a new private key, which a job would not hand back
+SECRET_ACTIONS = ('create', 'rotate')
+
+def get_iam_client() -> iam_admin_v1.IAMClient:
+    """Return the shared IAM client, creating it on first use."""
+    return get_client('iam', iam_admin_v1.IAMClient)
+
+_account_locks: Dict[tuple, threading.Lock] = {}
+_account_locks_guard = threading.Lock()
+
+def _keys_cache_key(project_id: str, service_account_email: str) -> str:
+    return f"iam.keys:{project_id}:{service_account_email}"
 
 def create_service_account_key(project_id, service_account_email):
     """
@@ -14,9 +42,10 @@ def create_service_account_key(project_id, service_account_email):
         dict: A dictionary containing the new key's private key, key ID, and service account email.
     """
     try:
-        client = iam_admin_v1.IAMClient()
+        client = get_iam_client()
         name = f"projects/{project_id}/serviceAccounts/{service_account_email}"
         response = client.create_service_account_key(name=name)
+        invalidate(_keys_cache_key(project_id, service_account_email))
         
         return {
             "private_key": response.private_key_data,
@@ -40,30 +69,88 @@ def delete_service_account_key(project_id, service_account_email, key_id):
         dict: A dictionary containing a message about the operation result.
     """
     try:
-        client = iam_admin_v1.IAMClient()
+        client = get_iam_client()
         name = f"projects/{project_id}/serviceAccounts/{service_account_email}/keys/{key_id}"
         client.delete_service_account_key(name=name)
+        invalidate(_keys_cache_key(project_id, service_account_email))
         return {"message": f"Successfully deleted key {key_id}"}
     except google_exceptions.FailedPrecondition as e:
         return {"message": f"Failed to delete key {key_id}. The key may not exist: {str(e)}"}
     except Exception as e:
         return {"message": f"Error deleting service account key {key_id}: {str(e)}"}
 
-def rotate_service_account_key(project_id, service_account_email, key_id):
+def _delete_key_or_raise(project_id, service_account_email, key_id):
+    """Delete a service account key, raising instead of returning an error message."""
+    client = get_iam_client()
+    client.delete_service_account_key(name=f"projects/{project_id}/serviceAccounts/{service_account_email}/keys/{key_id}")
+    invalidate(_keys_cache_key(project_id, service_account_email))
+    return {"message": f"Successfully deleted key {key_id}"}
+
+def _account_lock(project_id: str, service_account_email: str) -> threading.Lock:
+    """Return the lock that serializes rotations on one service account."""
+    with _account_locks_guard:
+        return _account_locks.setdefault((project_id, service_account_email), threading.Lock())
+
+def rotate_service_account_key(project_id, service_account_email, key_id, retire='delete', verify=False,
+                               on_created=None):
     """
-    Rotate a service account key by deleting the old one and creating a new one.
+    Rotate a service account key by creating a new one and then retiring the old one.
+
+    The service account must have a free key slot and still hold the old key before
+    anything is created. If verification or retiring the old key fails, the new key
+    is deleted again so the account is left as it was. Rotations on the same service
+    account run one at a time; rotations on different accounts run concurrently.
     
     Args:
         project_id (str): The GCP project ID.
         service_account_email (str): The service account email.
         key_id (str): The ID of the key to rotate.
+        retire (str): 'delete' (default) or 'disable' the old key.
+        verify (bool): Read the new key back and check it is enabled before retiring the old one.
+        on_created (Callable, optional): Called with the new key before the old one is retired,
+            e.g. to store it; the rotation is rolled back if it raises.
     
     Returns:
-        dict: The newly created service account key, or None if rotation failed.
+        dict: The newly created service account key, with the 'retired_key_id'.
+
+    Raises:
+        ValueError: If an unknown retire action is provided.
+        RuntimeError: If the rotation could not be completed.
     """
-    if delete_service_account_key(project_id, service_account_email, key_id):
-        return create_service_account_key(project_id, service_account_email)
-    return None
+    if retire not in ('delete', 'disable'):
+        raise ValueError(f"Unknown retire action: {retire}")
+
+    with _account_lock(project_id, service_account_email):
+        key_ids = list_service_account_keys(project_id, service_account_email, use_cache=False)
+        if key_id not in key_ids:
+            raise RuntimeError(f"Error rotating service account key: key {key_id} not found")
+        if len(key_ids) >= MAX_KEYS_PER_SERVICE_ACCOUNT:
+            raise RuntimeError(
+                f"Error rotating service account key: {service_account_email} already has "
+                f"{len(key_ids)} of {MAX_KEYS_PER_SERVICE_ACCOUNT} keys"
+            )
+
+        new_key = create_service_account_key(project_id, service_account_email)
+        try:
+            if verify:
+                name = f"projects/{project_id}/serviceAccounts/{service_account_email}/keys/{new_key['key_id']}"
+                if get_iam_client().get_service_account_key(name=name).disabled:
+                    raise RuntimeError(f"new key {new_key['key_id']} is disabled")
+            if on_created is not None:
+                on_created(new_key)
+            if retire == 'delete':
+                _delete_key_or_raise(project_id, service_account_email, key_id)
+            else:
+                disable_service_account_key(project_id, service_account_email, key_id)
+        except Exception as e:
+            rollback = delete_service_account_key(project_id, service_account_email, new_key['key_id'])
+            raise RuntimeError(f"Error rotating service account key: {e}; rolled back new key: {rollback['message']}")
+
+    return {
+        **new_key,
+        "retired_key_id": key_id,
+        "message": f"Rotated key {key_id} to {new_key['key_id']} ({retire}d old key)",
+    }
 
 def enable_service_account_key(project_id, service_account_email, key_id):
     """
@@ -78,9 +165,10 @@ def enable_service_account_key(project_id, service_account_email, key_id):
         dict: A dictionary containing a message about the operation result.
     """
     try:
-        client = iam_admin_v1.IAMClient()
+        client = get_iam_client()
         name = f"projects/{project_id}/serviceAccounts/{service_account_email}/keys/{key_id}"
         client.enable_service_account_key(name=name)
+        invalidate(_keys_cache_key(project_id, service_account_email))
         return {"message": f"Successfully enabled key {key_id}"}
     except Exception as e:
         raise RuntimeError(f"Error enabling service account key: {e}")
@@ -98,65 +186,283 @@ def disable_service_account_key(project_id, service_account_email, key_id):
         dict: A dictionary containing a message about the operation result.
     """
     try:
-        client = iam_admin_v1.IAMClient()
+        client = get_iam_client()
         name = f"projects/{project_id}/serviceAccounts/{service_account_email}/keys/{key_id}"
         client.disable_service_account_key(name=name)
+        invalidate(_keys_cache_key(project_id, service_account_email))
         return {"message": f"Successfully disabled key {key_id}"}
     except Exception as e:
         raise RuntimeError(f"Error disabling service account key: {e}")
 
-def list_service_account_keys(project_id: str, service_account_email: str) -> List[str]:
+def _timestamp(value) -> Optional[str]:
+    return value.strftime('%Y-%m-%dT%H:%M:%SZ') if value is not None else None
+
+def describe_service_account_keys(project_id: str, service_account_email: str,
+                                  use_cache: bool = True) -> List[Dict[str, Any]]:
     """
-    List all keys for a given service account.
+    Describe all user-managed keys for a given service account.
+
+    Results are served from the read-through cache while fresh; mutating actions on
+    the service account's keys invalidate them.
 
     Args:
         project_id (str): The GCP project ID.
         service_account_email (str): The service account email.
+        use_cache (bool): Set to False to bypass the cache and fetch from the API.
 
     Returns:
-        List[str]: A list of key IDs for the service account.
+        List[Dict[str, Any]]: One dictionary per key with 'key_id', 'valid_after_time',
+            'valid_before_time', 'key_origin' and 'disabled'.
     """
+    def _load():
+        client = get_iam_client()
+        request = iam_admin_v1.ListServiceAccountKeysRequest(
+            name=f"projects/{project_id}/serviceAccounts/{service_account_email}",
+            key_types=[iam_admin_v1.ListServiceAccountKeysRequest.KeyType.USER_MANAGED],
+        )
+        response = client.list_service_account_keys(request=request)
+        return [
+            {
+                "key_id": key.name.split('/')[-1],
+                "valid_after_time": _timestamp(key.valid_after_time),
+                "valid_before_time": _timestamp(key.valid_before_time),
+                "key_origin": key.key_origin.name,
+                "disabled": key.disabled,
+            }
+            for key in response.keys
+        ]
+
     try:
-        client = iam_admin_v1.IAMClient()
-        name = f"projects/{project_id}/serviceAccounts/{service_account_email}"
-        response = client.list_service_account_keys(name=name)
-        key_ids = []
-        for key in response.keys:
-            if str(key.key_type) != "KeyType.SYSTEM_MANAGED":
-                key_id = key.name.split('/')[-1]
-                key_ids.append(key_id)
-        
-        return key_ids
-    
+        return cached(_keys_cache_key(project_id, service_account_email), _load, use_cache=use_cache)
     except Exception as e:
         raise RuntimeError(f"Error listing service account keys: {e}")
 
-def delete_all_service_account_keys(project_id: str, service_account_email: str) -> Dict[str, List[str]]:
+def list_service_account_keys(project_id: str, service_account_email: str, use_cache: bool = True) -> List[str]:
     """
-    Delete all keys for a given service account.
+    List all user-managed keys for a given service account.
 
     Args:
         project_id (str): The GCP project ID.
         service_account_email (str): The service account email.
+        use_cache (bool): Set to False to bypass the cache and fetch from the API.
 
     Returns:
-        Dict[str, List[str]]: A dictionary with a "message" key containing a list of deleted key IDs.
+        List[str]: A list of key IDs for the service account.
+    """
+    return [key["key_id"] for key in describe_service_account_keys(project_id, service_account_email, use_cache)]
+
+def list_service_accounts(project_id: str) -> List[str]:
     """
-    key_ids = list_service_account_keys(project_id, service_account_email)
+    List the emails of all service accounts in a project.
+
+    Args:
+        project_id (str): The GCP project ID.
+
+    Returns:
+        List[str]: The service account emails.
+    """
+    try:
+        client = get_iam_client()
+        request = iam_admin_v1.ListServiceAccountsRequest(name=f"projects/{project_id}", page_size=100)
+        return [account.email for account in client.list_service_accounts(request=request)]
+    except Exception as e:
+        raise RuntimeError(f"Error listing service accounts: {e}")
+
+def delete_all_service_account_keys(project_id: str, service_account_email: str,
+                                    max_workers: int = DEFAULT_MAX_WORKERS) -> Dict[str, Any]:
+    """
+    Delete all user-managed keys for a given service account.
+
+    Keys are deleted concurrently through the shared IAM client, with at most
+    `max_workers` deletions in flight at once.
+
+    Args:
+        project_id (str): The GCP project ID.
+        service_account_email (str): The service account email.
+        max_workers (int): The maximum number of concurrent delete calls.
+
+    Returns:
+        Dict[str, Any]: A dictionary containing:
+            - message (str): A summary of the operation.
+            - deleted_keys (List[str]): The IDs of the keys that were deleted.
+            - failed_keys (Dict[str, str]): The IDs of the keys that could not be deleted, mapped to the error.
+    """
+    key_ids = list_service_account_keys(project_id, service_account_email, use_cache=False)
+    client = get_iam_client()
+
+    def _delete(key_id):
+        name = f"projects/{project_id}/serviceAccounts/{service_account_email}/keys/{key_id}"
+        client.delete_service_account_key(name=name)
+
     deleted_keys = []
-    for key_id in key_ids:
-        result = delete_service_account_key(project_id, service_account_email, key_id)
-        if result.get("message", "").startswith("Successfully deleted"):
+    failed_keys = {}
+    for key_id, (_, error) in zip(key_ids, run_concurrently(_delete, key_ids, max_workers)):
+        if error is None:
             deleted_keys.append(key_id)
-    return {"message": f"deleted_keys: {deleted_keys}"}
+        else:
+            failed_keys[key_id] = str(error)
+    invalidate(_keys_cache_key(project_id, service_account_email))
+
+    return {
+        "message": f"Deleted {len(deleted_keys)} of {len(key_ids)} keys for {service_account_email}",
+        "deleted_keys": deleted_keys,
+        "failed_keys": failed_keys,
+    }
+
+def audit_service_account_keys(request_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Audit key age across many service accounts and apply a policy to keys that are too old.
+
+    Service accounts and their keys are listed concurrently. Keys older than
+    'max_age_days' are then rotated, disabled or deleted in batches of 'batch_size',
+    with at most 'max_workers' actions in flight. When a 'checkpoint' file is given,
+    every finished key is recorded in it and skipped on the next run. No new batch is
+    started once the time budget is spent, so a sweep cut off by a timeout can be re-run
+    to continue where it stopped.
+
+    Rotation needs a 'key_output_dir': each new key is written there (see
+    `key_audit.write_key_file`) before the old key is retired, and the results only
+    carry the file path, so no key material is lost if the sweep is cut off. Old keys
+    are disabled rather than deleted unless 'retire' says otherwise, and disabled keys
+    are never rotated, so later sweeps leave the retired keys alone.
+
+    Args:
+        request_data (Dict[str, Any]): A dictionary containing:
+            - projects (list, optional): Project IDs whose service accounts are all audited.
+            - service_accounts (list, optional): {'project_id', 'service_account_email'} entries to audit.
+            - max_age_days (float, optional): The age threshold in days. Defaults to 90.
+            - policy_action (str, optional): 'rotate', 'disable', 'delete' or 'none' (report only).
+            - key_output_dir (str): Where new keys are written; required to apply 'rotate'.
+            - retire (str, optional): 'disable' (default) or 'delete' the old key when rotating.
+            - dry_run (bool, optional): Defaults to True; set to False to apply the policy.
+            - checkpoint (str, optional): Path of the JSONL checkpoint file.
+            - batch_size (int, optional): The number of keys processed per batch.
+            - max_workers (int, optional): The maximum number of concurrent API calls.
+            - timeout, started_at (float, optional): The time budget in seconds and the epoch time it started.
+
+    Returns:
+        Dict[str, Any]: The audited 'keys', the 'over_age' keys still to process, the per-key
+            'results' of applied actions, 'listing_errors', and whether the sweep is 'complete'.
 
+    Raises:
+        ValueError: If an unknown policy action is provided, or 'rotate' is applied without a 'key_output_dir'.
+    """
+    policy_action = request_data.get('policy_action', 'none')
+    if policy_action not in AUDIT_POLICY_ACTIONS:
+        raise ValueError(f"Unknown policy action: {policy_action}")
+    max_age_days = float(request_data.get('max_age_days', DEFAULT_MAX_KEY_AGE_DAYS))
+    dry_run = request_data.get('dry_run', True) is not False
+    retire = request_data.get('retire', 'disable')
+    key_output_dir = request_data.get('key_output_dir')
+    if policy_action == 'rotate' and not dry_run and not key_output_dir:
+        raise ValueError("policy_action 'rotate' needs a 'key_output_dir' to store the new keys in")
+    max_workers = int(request_data.get('max_workers', DEFAULT_MAX_WORKERS))
+    batch_size = int(request_data.get('batch_size', DEFAULT_BATCH_SIZE))
+    deadline = None
+    if 'timeout' in request_data:
+        started_at = request_data.get('started_at')
+        deadline = (time.time() if started_at is None else float(started_at)) + float(request_data['timeout'])
+    checkpoint = KeyCheckpoint(request_data['checkpoint']) if request_data.get('checkpoint') else None
+    listing_errors = {}
+
+    accounts = [(a['project_id'], a['service_account_email']) for a in request_data.get('service_accounts', [])]
+    projects = request_data.get('projects', [])
+    for project_id, (emails, error) in zip(projects, run_concurrently(list_service_accounts, projects, max_workers)):
+        if error is None:
+            accounts.extend((project_id, email) for email in emails)
+        else:
+            listing_errors[project_id] = str(error)
+
+    keys = []
+    outcomes = run_concurrently(lambda account: describe_service_account_keys(*account, use_cache=False),
+                                accounts, max_workers)
+    for (project_id, email), (described, error) in zip(accounts, outcomes):
+        if error is not None:
+            listing_errors[f"{project_id}/{email}"] = str(error)
+            continue
+        for key in described:
+            age = key_age_days(key["valid_after_time"])
+            keys.append({"project_id": project_id, "service_account_email": email, **key,
+                         "age_days": round(age, 1) if age is not None else None})
+
+    # Disabled keys are already retired (by an operator, or by an earlier rotation), so
+    # rotating them would only mint another live key; only 'delete' still applies to them
+    over_age = [k for k in keys if k["age_days"] is not None and k["age_days"] >= max_age_days
+                and not (policy_action in ('rotate', 'disable') and k["disabled"])]
+    pending = [k for k in over_age if checkpoint is None or not checkpoint.is_done(k)]
+    response = {
+        "audited_accounts": len(accounts),
+        "keys": keys,
+        "over_age": pending,
+        "skipped_from_checkpoint": len(over_age) - len(pending),
+        "listing_errors": listing_errors,
+        "dry_run": dry_run or policy_action == 'none',
+    }
+    if response["dry_run"]:
+        response["complete"] = policy_action == 'none' or not pending
+        return response
+
+    def _rotate(project_id, service_account_email, key_id):
+        key_files = []
+        result = rotate_service_account_key(
+            project_id, service_account_email, key_id, retire=retire,
+            on_created=lambda new_key: key_files.append(write_key_file(key_output_dir, new_key)),
+        )
+        result = {k: v for k, v in result.items() if k != 'private_key'}
+        return {**result, "key_file": key_files[0]}
+
+    action = {'rotate': _rotate, 'disable': disable_service_account_key,
+              'delete': _delete_key_or_raise}[policy_action]
+
+    def _apply(key):
+        # Recorded from the worker as soon as the key is done, so a timeout later in the
+        # batch cannot lose it and have the next run act on the key again
+        try:
+            result = action(key["project_id"], key["service_account_email"], key["key_id"])
+        except Exception as e:
+            if checkpoint is not None:
+                checkpoint.record(key, policy_action, str(e))
+            raise
+        if checkpoint is not None:
+            checkpoint.record(key, policy_action, new_key_id=result.get("key_id") if isinstance(result, dict) else None)
+        return result
+
+    results = []
+    processed = 0
+    while processed < len(pending):
+        if deadline is not None and time.time() >= deadline:
+            break
+        batch = pending[processed:processed + batch_size]
+        for key, (result, error) in zip(batch, run_concurrently(_apply, batch, max_workers)):
+            entry = {"project_id": key["project_id"], "service_account_email": key["service_account_email"],
+                     "key_id": key["key_id"], "action": policy_action}
+            if error is None:
+                entry["result"] = result
+            else:
+                entry["error"] = str(error)
+            results.append(entry)
+        processed += len(batch)
+
+    response["over_age"] = pending[processed:]
+    response["results"] = results
+    response["complete"] = processed == len(pending)
+    return response
+
+@instrumented('iam')
+@idempotent
 def handle_iam_key_action(request_data: Dict[str, str]) -> Dict[str, str]:
     """
     Handle IAM key actions based on the provided request data.
     
     Args:
         request_data (Dict[str, str]): A dictionary containing the action details.
-            Expected keys: 'action', 'project_id', 'service_account_email', 'key_id' (optional)
+            Expected keys: 'action', 'project_id', 'service_account_email', 'key_id' (optional),
+            'max_workers' (optional, for 'delete_all'), 'cache' (optional, set to False to bypass the cache for 'list')
+            For action 'batch': 'actions' (list of requests), 'max_workers' (optional)
+            For actions 'job_submit', 'job_resume' and 'job_status': see `common.jobs.run_job_action`;
+                jobs cannot run SECRET_ACTIONS
+            For action 'rotate': 'retire' ('delete' or 'disable') and 'verify' (optional)
+            For action 'audit': see `audit_service_account_keys`
     
     Returns:
         Dict[str, Any]: A dictionary with the result of the IAM key action.
@@ -165,6 +471,13 @@ def handle_iam_key_action(request_data: Dict[str, str]) -> Dict[str, str]:
         ValueError: If an unknown action is provided.
     """
     action = request_data.get('action')
+    if action == BATCH_ACTION:
+        return run_batch(handle_iam_key_action, request_data)
+    if action in JOB_ACTIONS:
+        return run_job_action(handle_iam_key_action, request_data, SECRET_ACTIONS)
+    if action == 'audit':
+        return audit_service_account_keys(request_data)
+
     project_id = request_data.get('project_id')
     service_account_email = request_data.get('service_account_email')
     key_id = request_data.get('key_id')
@@ -175,7 +488,8 @@ def handle_iam_key_action(request_data: Dict[str, str]) -> Dict[str, str]:
         'rotate': rotate_service_account_key,
         'enable': enable_service_account_key,
         'disable': disable_service_account_key,
-        'delete_all': delete_all_service_account_keys
+        'delete_all': delete_all_service_account_keys,
+        'list': list_service_account_keys
     }
     
     if action not in action_map:
@@ -183,12 +497,17 @@ def handle_iam_key_action(request_data: Dict[str, str]) -> Dict[str, str]:
     
     if action == 'create':
         result = action_map[action](project_id, service_account_email)
+    elif action == 'list':
+        use_cache = request_data.get('cache', True) is not False
+        result = {"key_ids": action_map[action](project_id, service_account_email, use_cache)}
     elif action == 'delete_all':
-        result = action_map[action](project_id, service_account_email)
+        max_workers = int(request_data.get('max_workers', DEFAULT_MAX_WORKERS))
+        result = action_map[action](project_id, service_account_email, max_workers)
     elif action in ['delete', 'rotate', 'enable', 'disable']:
         if not key_id:
             raise ValueError(f"Key ID is required for {action} action")
-        result = action_map[action](project_id, service_account_email, key_id)
+        options = {k: request_data[k] for k in ('retire', 'verify') if action == 'rotate' and k in request_data}
+        result = action_map[action](project_id, service_account_email, key_id, **options)
     else:
         raise ValueError(f"Unexpected action: {action}")
     return result
@@ -0,0 +1,172 @@
+import asyncio
+from google.cloud import iam_admin_v1
+from typing import Any, Dict, List
+from google.api_core import exceptions as google_exceptions
+from common.batch import BATCH_ACTION, run_batch_async
+from common.cache import cached_async, invalidate
+from common.client_registry import get_async_client
+from common.concurrency import DEFAULT_MAX_CONCURRENCY, run_concurrently_async
+from common.dispatch import run_on_sync_dispatcher
+from common.idempotency import idempotent
+from common.instrumentation import instrumented
+from common.jobs import JOB_ACTIONS
+from iam_service_account_key_management.service_account_key_handler import (
+    SECRET_ACTIONS, _keys_cache_key, _timestamp, handle_iam_key_action
+)
+
+# Actions that hold per-account locks or walk whole projects keep running on the
+# synchronous handler, in a worker thread
+THREADED_ACTIONS = ('rotate', 'audit')
+
+def get_iam_async_client() -> iam_admin_v1.IAMAsyncClient:
+    """Return the shared IAM async client for the running event loop, creating it on first use."""
+    return get_async_client('iam', iam_admin_v1.IAMAsyncClient)
+
+async def create_service_account_key(project_id, service_account_email):
+    """Create a new service account key; see `service_account_key_handler.create_service_account_key`."""
+    try:
+        name = f"projects/{project_id}/serviceAccounts/{service_account_email}"
+        response = await get_iam_async_client().create_service_account_key(name=name)
+        invalidate(_keys_cache_key(project_id, service_account_email))
+        return {
+            "private_key": response.private_key_data,
+            "key_id": response.name.split('/')[-1],
+            "service_account_email": service_account_email,
+            "message": f"Access key for {name} created successfully"
+        }
+    except Exception as e:
+        raise RuntimeError(f"Error creating service account key: {e}")
+
+async def delete_service_account_key(project_id, service_account_email, key_id):
+    """Delete a service account key; see `service_account_key_handler.delete_service_account_key`."""
+    try:
+        name = f"projects/{project_id}/serviceAccounts/{service_account_email}/keys/{key_id}"
+        await get_iam_async_client().delete_service_account_key(name=name)
+        invalidate(_keys_cache_key(project_id, service_account_email))
+        return {"message": f"Successfully deleted key {key_id}"}
+    except google_exceptions.FailedPrecondition as e:
+        return {"message": f"Failed to delete key {key_id}. The key may not exist: {str(e)}"}
+    except Exception as e:
+        return {"message": f"Error deleting service account key {key_id}: {str(e)}"}
+
+async def enable_service_account_key(project_id, service_account_email, key_id):
+    """Enable a service account key; see `service_account_key_handler.enable_service_account_key`."""
+    try:
+        name = f"projects/{project_id}/serviceAccounts/{service_account_email}/keys/{key_id}"
+        await get_iam_async_client().enable_service_account_key(name=name)
+        invalidate(_keys_cache_key(project_id, service_account_email))
+        return {"message": f"Successfully enabled key {key_id}"}
+    except Exception as e:
+        raise RuntimeError(f"Error enabling service account key: {e}")
+
+async def disable_service_account_key(project_id, service_account_email, key_id):
+    """Disable a service account key; see `service_account_key_handler.disable_service_account_key`."""
+    try:
+        name = f"projects/{project_id}/serviceAccounts/{service_account_email}/keys/{key_id}"
+        await get_iam_async_client().disable_service_account_key(name=name)
+        invalidate(_keys_cache_key(project_id, service_account_email))
+        return {"message": f"Successfully disabled key {key_id}"}
+    except Exception as e:
+        raise RuntimeError(f"Error disabling service account key: {e}")
+
+async def describe_service_account_keys(project_id: str, service_account_email: str,
+                                        use_cache: bool = True) -> List[Dict[str, Any]]:
+    """Describe all user-managed keys for a service account; see `service_account_key_handler.describe_service_account_keys`."""
+    async def _load():
+        request = iam_admin_v1.ListServiceAccountKeysRequest(
+            name=f"projects/{project_id}/serviceAccounts/{service_account_email}",
+            key_types=[iam_admin_v1.ListServiceAccountKeysRequest.KeyType.USER_MANAGED],
+        )
+        response = await get_iam_async_client().list_service_account_keys(request=request)
+        return [
+            {
+                "key_id": key.name.split('/')[-1],
+                "valid_after_time": _timestamp(key.valid_after_time),
+                "valid_before_time": _timestamp(key.valid_before_time),
+                "key_origin": key.key_origin.name,
+                "disabled": key.disabled,
+            }
+            for key in response.keys
+        ]
+
+    try:
+        return await cached_async(_keys_cache_key(project_id, service_account_email), _load, use_cache=use_cache)
+    except Exception as e:
+        raise RuntimeError(f"Error listing service account keys: {e}")
+
+async def list_service_account_keys(project_id: str, service_account_email: str, use_cache: bool = True) -> List[str]:
+    """List the IDs of all user-managed keys for a service account."""
+    return [key["key_id"] for key in await describe_service_account_keys(project_id, service_account_email, use_cache)]
+
+async def delete_all_service_account_keys(project_id: str, service_account_email: str,
+                                          max_concurrency: int = DEFAULT_MAX_CONCURRENCY) -> Dict[str, Any]:
+    """
+    Delete all user-managed keys for a given service account.
+
+    Returns the same result as `service_account_key_handler.delete_all_service_account_keys`,
+    with up to `max_concurrency` deletions in flight at once.
+    """
+    key_ids = await list_service_account_keys(project_id, service_account_email, use_cache=False)
+    client = get_iam_async_client()
+
+    async def _delete(key_id):
+        name = f"projects/{project_id}/serviceAccounts/{service_account_email}/keys/{key_id}"
+        await client.delete_service_account_key(name=name)
+
+    deleted_keys = []
+    failed_keys = {}
+    for key_id, (_, error) in zip(key_ids, await run_concurrently_async(_delete, key_ids, max_concurrency)):
+        if error is None:
+            deleted_keys.append(key_id)
+        else:
+            failed_keys[key_id] = str(error)
+    invalidate(_keys_cache_key(project_id, service_account_email))
+
+    return {
+        "message": f"Deleted {len(deleted_keys)} of {len(key_ids)} keys for {service_account_email}",
+        "deleted_keys": deleted_keys,
+        "failed_keys": failed_keys,
+    }
+
+@instrumented('iam')
+@idempotent
+async def handle_iam_key_action_async(request_data: Dict[str, str]) -> Dict[str, str]:
+    """
+    Handle IAM key actions on the event loop.
+
+    Takes the same requests and returns the same results as
+    `service_account_key_handler.handle_iam_key_action`. 'rotate' and 'audit' run on the
+    synchronous handler in a worker thread.
+
+    Raises:
+        ValueError: If an unknown action is provided.
+    """
+    action = request_data.get('action')
+    if action == BATCH_ACTION:
+        return await run_batch_async(handle_iam_key_action_async, request_data)
+    if action in JOB_ACTIONS or action in THREADED_ACTIONS:
+        return await run_on_sync_dispatcher(handle_iam_key_action, request_data, SECRET_ACTIONS)
+
+    project_id = request_data.get('project_id')
+    service_account_email = request_data.get('service_account_email')
+    key_id = request_data.get('key_id')
+
+    if action == 'create':
+        return await create_service_account_key(project_id, service_account_email)
+    if action == 'list':
+        use_cache = request_data.get('cache', True) is not False
+        return {"key_ids": await list_service_account_keys(project_id, service_account_email, use_cache)}
+    if action == 'delete_all':
+        max_concurrency = int(request_data.get('max_workers', DEFAULT_MAX_CONCURRENCY))
+        return await delete_all_service_account_keys(project_id, service_account_email, max_concurrency)
+
+    action_map = {
+        'delete': delete_service_account_key,
+        'enable': enable_service_account_key,
+        'disable': disable_service_account_key,
+    }
+    if action not in action_map:
+        raise ValueError(f"Unknown action: {action}")
+    if not key_id:
+        raise ValueError(f"Key ID is required for {action} action")
+    return await action_map[action](project_id, service_account_email, key_id)
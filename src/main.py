@@ -0,0 +1,117 @@
+import base64
+import importlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Tuple
+from common import instrumentation
+from common.concurrency import run_async
+
+# Each service maps to the module and dispatcher that handle it. Modules are only
+# imported when their service is first requested, so an invocation only loads the
+# SDK it actually needs.
+ROUTES: Dict[str, Tuple[str, str]] = {
+    'compute': ('compute_instance_management.instance_handler', 'handle_vm_action'),
+    'iam': ('iam_service_account_key_management.service_account_key_handler', 'handle_iam_key_action'),
+    'certificate': ('certificate_manager_certificate_operations.certificate_handler',
+                    'certificate_manager_certificate_handle_action'),
+}
+# The asyncio-native dispatchers, used instead of ROUTES when ASYNC_HANDLERS is set.
+# They take the same requests and return the same results.
+ASYNC_ROUTES: Dict[str, Tuple[str, str]] = {
+    'compute': ('compute_instance_management.instance_handler_async', 'handle_vm_action_async'),
+    'iam': ('iam_service_account_key_management.service_account_key_handler_async', 'handle_iam_key_action_async'),
+    'certificate': ('certificate_manager_certificate_operations.certificate_handler_async',
+                    'certificate_manager_certificate_handle_action_async'),
+}
+USE_ASYNC_HANDLERS = os.environ.get('ASYNC_HANDLERS', '').lower() in ('1', 'true', 'yes')
+
+_dispatchers: Dict[str, Callable[[Dict], Any]] = {}
+_load_seconds: Dict[str, float] = {}
+_lock = threading.Lock()
+
+def get_dispatcher(service: str, use_async: bool = False) -> Callable[[Dict], Any]:
+    """
+    Return the dispatcher for a service, importing its module on first use.
+
+    Args:
+        service (str): One of the keys of ROUTES.
+        use_async (bool): Return the service's async dispatcher from ASYNC_ROUTES instead.
+
+    Returns:
+        Callable[[Dict], Any]: The service's action dispatcher.
+
+    Raises:
+        ValueError: If the service is unknown.
+    """
+    routes = ASYNC_ROUTES if use_async else ROUTES
+    if service not in routes:
+        raise ValueError(f"Unknown service: {service}")
+    route = f"{service}.async" if use_async else service
+    dispatcher = _dispatchers.get(route)
+    if dispatcher is not None:
+        return dispatcher
+    with _lock:
+        if route not in _dispatchers:
+            module_name, function_name = routes[service]
+            started = time.perf_counter()
+            module = importlib.import_module(module_name)
+            _load_seconds[route] = round(time.perf_counter() - started, 4)
+            logging.info(f"Loaded route {route} in {_load_seconds[route]}s")
+            _dispatchers[route] = getattr(module, function_name)
+        return _dispatchers[route]
+
+def route_stats() -> Dict[str, Any]:
+    """Return which routes are loaded and how long each took to import."""
+    return {"loaded": sorted(_dispatchers), "load_seconds": dict(_load_seconds)}
+
+def _json_default(value: Any) -> Any:
+    # Private key material comes back from the IAM API as bytes
+    if isinstance(value, bytes):
+        return base64.b64encode(value).decode()
+    return str(value)
+
+def _response(body: Any, status: int) -> Tuple[str, int, Dict[str, str]]:
+    return json.dumps(body, default=_json_default), status, {'Content-Type': 'application/json'}
+
+def main(request) -> Tuple[str, int, Dict[str, str]]:
+    """
+    HTTP entry point for the Cloud Function.
+
+    POST a JSON body with a 'service' ('compute', 'iam' or 'certificate') and the
+    fields expected by that service's dispatcher. A GET returns the route stats, or
+    the Prometheus metrics when the path ends in /metrics (see INSTRUMENTATION_ENABLED).
+    With ASYNC_HANDLERS set, requests run on the asyncio dispatchers on a shared event loop.
+
+    Args:
+        request: The incoming HTTP request (a Flask request in Cloud Functions).
+
+    Returns:
+        Tuple[str, int, Dict[str, str]]: The JSON response body, status code and headers.
+    """
+    started_at = time.time()
+    if request.method == 'GET':
+        if getattr(request, 'path', '').rstrip('/').endswith('/metrics'):
+            return instrumentation.render_prometheus(), 200, {'Content-Type': 'text/plain; version=0.0.4'}
+        return _response(route_stats(), 200)
+
+    request_data = request.get_json(silent=True)
+    if not isinstance(request_data, dict):
+        return _response({"error": "Request body must be a JSON object"}, 400)
+
+    try:
+        dispatcher = get_dispatcher(request_data.get('service'), USE_ASYNC_HANDLERS)
+        request_data = {k: v for k, v in request_data.items() if k != 'service'}
+        request_data.setdefault('started_at', started_at)
+        if USE_ASYNC_HANDLERS:
+            return _response(run_async(dispatcher(request_data)), 200)
+        return _response(dispatcher(request_data), 200)
+    except KeyError as e:
+        return _response({"error": f"Missing field: {e}"}, 400)
+    except (ValueError, NotImplementedError) as e:
+        return _response({"error": str(e)}, 400)
+    except Exception as e:
+        logging.exception("Unhandled error")
+        return _response({"error": str(e)}, 500)
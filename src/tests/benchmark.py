@@ -0,0 +1,191 @@
+"""
+Offline benchmark of every handler against the in-process fake GCP backend.
+
+Each service is driven in three modes:
+- single: one action per dispatcher call, one call after another
+- batch: the same actions sent as 'batch' requests
+- concurrent: one action per dispatcher call, with calls running in parallel
+
+Usage (from src):
+    python tests/benchmark.py --iterations 200 --latency 0.02 --output bench.json
+    python tests/benchmark.py --baseline bench.json --tolerance 0.2
+
+With --baseline the script exits non-zero when any scenario's throughput falls more
+than the tolerance below the baseline, so it can gate CI.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Callable, Dict, List
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from common import rate_limit
+from common.cache import NullCache, set_cache
+from common.concurrency import run_concurrently
+from compute_instance_management.instance_handler import handle_vm_action
+from iam_service_account_key_management.service_account_key_handler import handle_iam_key_action
+from certificate_manager_certificate_operations.certificate_handler import certificate_manager_certificate_handle_action
+from util.fake_gcp import FakeBackendConfig, install_fake_clients
+
+MODES = ('single', 'batch', 'concurrent')
+
+def _percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(int(round(pct / 100.0 * (len(ordered) - 1))), len(ordered) - 1)]
+
+def _build_requests(fakes: Dict[str, object], iterations: int) -> Dict[str, tuple]:
+    """Seed the fakes and return, per service, the dispatcher and one request per iteration."""
+    compute = fakes['compute.instances']
+    for i in range(iterations):
+        compute.instances[('bench', 'zone-a', f'vm{i}')] = {"status": 'TERMINATED', "labels": {"env": "bench"}}
+
+    iam = fakes['iam']
+    keys = []
+    for i in range(iterations):
+        email = f'sa{i}@bench.iam.gserviceaccount.com'
+        iam.add_service_account('bench', email, key_count=1)
+        keys.append((email, next(iter(iam.keys[f'projects/bench/serviceAccounts/{email}']))))
+
+    certificates = fakes['certificate_manager']
+    for i in range(iterations):
+        certificates.add_certificate('bench', f'cert{i}', description='bench')
+
+    return {
+        'compute': (handle_vm_action, [
+            {'action': 'start', 'project': 'bench', 'zone': 'zone-a', 'instance': f'vm{i}'} for i in range(iterations)
+        ]),
+        'iam': (handle_iam_key_action, [
+            {'action': 'disable', 'project_id': 'bench', 'service_account_email': email, 'key_id': key_id}
+            for email, key_id in keys
+        ]),
+        'certificate': (certificate_manager_certificate_handle_action, [
+            {'action': 'update', 'project_id': 'bench', 'name': f'cert{i}', 'description': f'bench {i}'}
+            for i in range(iterations)
+        ]),
+    }
+
+def _is_error(result) -> bool:
+    # The certificate handlers report failures as {"error": ...} instead of raising
+    return isinstance(result, dict) and 'error' in result
+
+def _run_mode(dispatcher: Callable, requests: List[Dict], mode: str, concurrency: int, batch_size: int) -> Dict:
+    samples: List[float] = []
+    errors = 0
+
+    def _timed(request):
+        started = time.perf_counter()
+        try:
+            result = dispatcher(request)
+        finally:
+            samples.append(time.perf_counter() - started)
+        if _is_error(result):
+            raise RuntimeError(result['error'])
+        return result
+
+    started = time.perf_counter()
+    if mode == 'single':
+        for request in requests:
+            try:
+                _timed(request)
+            except Exception:
+                errors += 1
+    elif mode == 'concurrent':
+        errors = sum(1 for _, error in run_concurrently(_timed, requests, concurrency) if error is not None)
+    else:
+        for offset in range(0, len(requests), batch_size):
+            result = _timed({'action': 'batch', 'max_workers': concurrency,
+                             'actions': requests[offset:offset + batch_size]})
+            errors += sum(1 for item in result['results'] if 'error' in item or _is_error(item['result']))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "operations": len(requests),
+        "errors": errors,
+        "elapsed_seconds": round(elapsed, 4),
+        "throughput_per_second": round(len(requests) / elapsed, 2) if elapsed else None,
+        "p50_ms": round(_percentile(samples, 50) * 1000, 2) if samples else None,
+        "p99_ms": round(_percentile(samples, 99) * 1000, 2) if samples else None,
+    }
+
+def run_benchmark(iterations: int = 50, latency: float = 0.005, jitter: float = 0.0, error_rate: float = 0.0,
+                  lro_seconds: float = 0.0, concurrency: int = 10, batch_size: int = 25,
+                  seed: int = 0, rate_limited: bool = False) -> Dict[str, Dict[str, Dict]]:
+    """
+    Run every service in every mode against a fresh fake backend.
+
+    The fakes have no quotas, so the client-side rate limiter is off unless
+    `rate_limited` is set.
+
+    Returns:
+        Dict[str, Dict[str, Dict]]: Results keyed by service, then mode.
+    """
+    set_cache(NullCache())
+    was_enabled = rate_limit.is_enabled()
+    rate_limit.enable(rate_limited)
+    rate_limit.reset_buckets()
+    results: Dict[str, Dict[str, Dict]] = {}
+    try:
+        for mode in MODES:
+            config = FakeBackendConfig(latency, jitter, error_rate, lro_seconds, seed)
+            fakes = install_fake_clients(config)
+            for service, (dispatcher, requests) in _build_requests(fakes, iterations).items():
+                results.setdefault(service, {})[mode] = _run_mode(dispatcher, requests, mode, concurrency, batch_size)
+    finally:
+        rate_limit.enable(was_enabled)
+    return results
+
+def compare_to_baseline(results: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """Return a message for every scenario whose throughput regressed beyond `tolerance`."""
+    regressions = []
+    for service, modes in baseline.items():
+        for mode, expected in modes.items():
+            actual = results.get(service, {}).get(mode)
+            if not actual or not expected.get("throughput_per_second"):
+                continue
+            floor = expected["throughput_per_second"] * (1 - tolerance)
+            if actual["throughput_per_second"] < floor:
+                regressions.append(f"{service}/{mode}: {actual['throughput_per_second']}/s "
+                                   f"< {floor:.2f}/s (baseline {expected['throughput_per_second']}/s)")
+    return regressions
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the handlers against a fake GCP backend.")
+    parser.add_argument('--iterations', type=int, default=50, help="Actions per service and mode")
+    parser.add_argument('--latency', type=float, default=0.005, help="Fake RPC latency in seconds")
+    parser.add_argument('--jitter', type=float, default=0.0, help="Extra random RPC latency in seconds")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of RPCs that fail")
+    parser.add_argument('--lro-seconds', type=float, default=0.0, help="Long-running operation duration")
+    parser.add_argument('--concurrency', type=int, default=10, help="Parallelism for batch and concurrent modes")
+    parser.add_argument('--batch-size', type=int, default=25, help="Actions per batch request")
+    parser.add_argument('--rate-limited', action='store_true', help="Keep the client-side rate limiter on")
+    parser.add_argument('--output', help="Write the results as JSON to this file")
+    parser.add_argument('--baseline', help="Compare against results previously written with --output")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="Allowed throughput drop against the baseline")
+    args = parser.parse_args(argv)
+
+    results = run_benchmark(args.iterations, args.latency, args.jitter, args.error_rate, args.lro_seconds,
+                            args.concurrency, args.batch_size, rate_limited=args.rate_limited)
+
+    print(f"{'service':<12} {'mode':<11} {'ops/s':>10} {'p50 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for service, modes in results.items():
+        for mode, result in modes.items():
+            print(f"{service:<12} {mode:<11} {result['throughput_per_second']:>10} "
+                  f"{result['p50_ms']:>9} {result['p99_ms']:>9} {result['errors']:>7}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare_to_baseline(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
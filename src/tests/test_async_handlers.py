@@ -0,0 +1,163 @@
+import unittest
+from unittest.mock import patch, AsyncMock, MagicMock
+import asyncio
+import json
+import sys
+import os
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+from common.cache import MemoryCache, set_cache
+from common.concurrency import run_async
+from common.idempotency import set_store
+from compute_instance_management.instance_handler_async import handle_vm_action_async
+from iam_service_account_key_management.service_account_key_handler_async import handle_iam_key_action_async
+from certificate_manager_certificate_operations.certificate_handler_async import (
+    certificate_manager_certificate_handle_action_async
+)
+
+def _key(name):
+    key = MagicMock()
+    key.name = name
+    return key
+
+class TestAsyncHandlers(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        set_cache(MemoryCache())
+        set_store(MemoryCache())
+
+    @patch('iam_service_account_key_management.service_account_key_handler_async.get_iam_async_client')
+    async def test_delete_all_keeps_deletes_in_flight_together(self, mock_get_client):
+        client = mock_get_client.return_value
+        client.list_service_account_keys = AsyncMock(return_value=MagicMock(keys=[
+            _key(f'projects/p/serviceAccounts/sa@p.iam.gserviceaccount.com/keys/k{i}') for i in range(20)
+        ]))
+        in_flight = []
+        peak = []
+
+        async def _delete(name):
+            in_flight.append(name)
+            peak.append(len(in_flight))
+            await asyncio.sleep(0.01)
+            in_flight.remove(name)
+            if name.endswith('/k3'):
+                raise RuntimeError('denied')
+
+        client.delete_service_account_key = AsyncMock(side_effect=_delete)
+
+        result = await handle_iam_key_action_async({
+            'action': 'delete_all', 'project_id': 'p', 'service_account_email': 'sa@p.iam.gserviceaccount.com',
+            'max_workers': 5,
+        })
+
+        self.assertEqual(len(result['deleted_keys']), 19)
+        self.assertEqual(result['failed_keys'], {'k3': 'denied'})
+        self.assertEqual(max(peak), 5)
+
+    @patch('iam_service_account_key_management.service_account_key_handler_async.get_iam_async_client')
+    async def test_batch_and_idempotency(self, mock_get_client):
+        client = mock_get_client.return_value
+        client.disable_service_account_key = AsyncMock()
+        request = {
+            'action': 'batch', 'project_id': 'p', 'service_account_email': 'sa@p.iam.gserviceaccount.com',
+            'actions': [{'action': 'disable', 'key_id': 'k1'}, {'action': 'disable'}],
+            'idempotency_key': 'req-1',
+        }
+
+        first = await handle_iam_key_action_async(request)
+        second = await handle_iam_key_action_async(request)
+
+        self.assertEqual(first, second)
+        self.assertEqual(first['succeeded'], 1)
+        self.assertEqual(first['results'][1]['error'], 'Key ID is required for disable action')
+        client.disable_service_account_key.assert_awaited_once_with(
+            name='projects/p/serviceAccounts/sa@p.iam.gserviceaccount.com/keys/k1')
+
+    @patch('iam_service_account_key_management.service_account_key_handler_async.get_iam_async_client')
+    async def test_keyed_batch_of_keyed_items_does_not_deadlock(self, mock_get_client):
+        mock_get_client.return_value.disable_service_account_key = AsyncMock()
+        request = {
+            'action': 'batch', 'project_id': 'p', 'service_account_email': 'sa@p.iam.gserviceaccount.com',
+            'idempotency_key': 'batch-1',
+            # One of these keys shared the batch's lock when keys were spread over 64 stripes
+            'actions': [{'action': 'disable', 'key_id': f'k{i}', 'idempotency_key': f'item-{i}'} for i in range(65)],
+        }
+
+        result = await asyncio.wait_for(handle_iam_key_action_async(request), timeout=10)
+
+        self.assertEqual(result['succeeded'], 65)
+
+    @patch('certificate_manager_certificate_operations.certificate_handler_async.get_certificate_manager_async_client')
+    async def test_create_awaits_operation(self, mock_get_client):
+        client = mock_get_client.return_value
+        operation = MagicMock()
+        operation.result = AsyncMock(return_value=MagicMock())
+        operation.result.return_value.name = 'projects/p/locations/global/certificates/cert1'
+        client.create_certificate = AsyncMock(return_value=operation)
+
+        result = await certificate_manager_certificate_handle_action_async({
+            'action': 'create', 'project_id': 'p', 'name': 'cert1', 'description': 'd', 'scope': 'DEFAULT',
+            'domains': ['example.com'],
+        })
+
+        self.assertEqual(result, {
+            "message": "Managed certificate projects/p/locations/global/certificates/cert1 created successfully"
+        })
+        self.assertEqual(client.create_certificate.await_args.kwargs['parent'], 'projects/p/locations/global')
+        operation.result.assert_awaited_once()
+
+    @patch('certificate_manager_certificate_operations.certificate_handler_async.get_certificate_manager_async_client')
+    async def test_unknown_certificate_action(self, mock_get_client):
+        with self.assertRaises(NotImplementedError):
+            await certificate_manager_certificate_handle_action_async({'action': 'renew'})
+
+    @patch('compute_instance_management.instance_handler_async.asyncio.sleep', new_callable=AsyncMock)
+    @patch('compute_instance_management.instance_handler_async.get_compute_client')
+    async def test_restart_polls_operations_without_blocking(self, mock_get_client, mock_sleep):
+        client = mock_get_client.return_value
+        stop_operation = MagicMock(spec=['result', 'done'])
+        stop_operation.done.side_effect = [False, True]
+        start_operation = MagicMock(spec=['result', 'done'])
+        start_operation.done.return_value = True
+        client.stop.return_value = stop_operation
+        client.start.return_value = start_operation
+
+        result = await handle_vm_action_async({
+            'action': 'restart', 'project': 'p', 'zone': 'z', 'instance': 'vm1', 'timeout': 60,
+        })
+
+        self.assertEqual(result['message'], 'VM vm1 restarted')
+        self.assertEqual(stop_operation.done.call_count, 2)
+        mock_sleep.assert_awaited_once()
+        stop_operation.result.assert_called_once_with()
+        start_operation.result.assert_called_once_with()
+
+class TestAsyncRoutes(unittest.TestCase):
+
+    @patch('main.USE_ASYNC_HANDLERS', True)
+    @patch('compute_instance_management.instance_handler_async.get_compute_client')
+    def test_main_runs_async_dispatcher(self, mock_get_client):
+        set_cache(MemoryCache())
+        mock_get_client.return_value.get.return_value.status = 'RUNNING'
+        request = MagicMock(method='POST')
+        request.get_json.return_value = {
+            'service': 'compute', 'action': 'status', 'project': 'p', 'zone': 'z', 'instance': 'vm1',
+        }
+
+        body, status, _ = main.main(request)
+
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(body), {'instance': 'vm1', 'status': 'RUNNING'})
+        self.assertIn('compute.async', main.route_stats()['loaded'])
+
+    def test_run_async_reuses_one_loop(self):
+        async def _loop():
+            return asyncio.get_running_loop()
+
+        self.assertIs(run_async(_loop()), run_async(_loop()))
+
+if __name__ == '__main__':
+    unittest.main()
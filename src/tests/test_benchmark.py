@@ -0,0 +1,41 @@
+import unittest
+import sys
+import os
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common import client_registry
+from common.cache import MemoryCache, set_cache
+import benchmark
+
+class TestBenchmark(unittest.TestCase):
+
+    def tearDown(self):
+        client_registry.reset_clients()
+        set_cache(MemoryCache())
+
+    def test_every_handler_runs_offline_in_every_mode(self):
+        results = benchmark.run_benchmark(iterations=20, latency=0.01, concurrency=10, batch_size=10)
+
+        self.assertEqual(set(results), {'compute', 'iam', 'certificate'})
+        for service, modes in results.items():
+            self.assertEqual(set(modes), set(benchmark.MODES))
+            for mode, result in modes.items():
+                self.assertEqual(result['errors'], 0, f"{service}/{mode}")
+                self.assertEqual(result['operations'], 20)
+            # Fan-out must actually overlap the fake RPC latency
+            self.assertGreater(modes['concurrent']['throughput_per_second'],
+                               2 * modes['single']['throughput_per_second'], service)
+            self.assertGreater(modes['batch']['throughput_per_second'],
+                               2 * modes['single']['throughput_per_second'], service)
+
+    def test_compare_to_baseline_flags_regressions(self):
+        baseline = {'iam': {'single': {'throughput_per_second': 100.0}}}
+        self.assertEqual(benchmark.compare_to_baseline({'iam': {'single': {'throughput_per_second': 90.0}}},
+                                                       baseline, 0.2), [])
+        self.assertEqual(len(benchmark.compare_to_baseline({'iam': {'single': {'throughput_per_second': 70.0}}},
+                                                           baseline, 0.2)), 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import unittest
+from unittest.mock import MagicMock, patch
+import tempfile
+import sys
+import os
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common import cache
+
+class _CacheBackendTests:
+
+    def make_backend(self, max_entries):
+        raise NotImplementedError
+
+    def test_hit_and_miss_counters(self):
+        backend = self.make_backend(10)
+        self.assertEqual(backend.get('a'), (False, None))
+        backend.set('a', {'value': 1}, ttl=60)
+        self.assertEqual(backend.get('a'), (True, {'value': 1}))
+        self.assertEqual(backend.stats(), {'hits': 1, 'misses': 1})
+
+    def test_expired_entries_are_misses(self):
+        backend = self.make_backend(10)
+        backend.set('a', 1, ttl=0)
+        self.assertEqual(backend.get('a'), (False, None))
+
+    def test_least_recently_used_entry_is_evicted(self):
+        backend = self.make_backend(2)
+        with patch('common.cache.time.time', side_effect=range(100, 200)):
+            backend.set('a', 1, ttl=60)
+            backend.set('b', 2, ttl=60)
+            backend.get('a')
+            backend.set('c', 3, ttl=60)
+            self.assertEqual(backend.get('b'), (False, None))
+            self.assertEqual(backend.get('a'), (True, 1))
+            self.assertEqual(backend.get('c'), (True, 3))
+
+    def test_invalidate_drops_key_and_children(self):
+        backend = self.make_backend(10)
+        backend.set('iam.keys:p:sa', 1, ttl=60)
+        backend.set('iam.keys:p:sa:extra', 2, ttl=60)
+        backend.set('iam.keys:p:sa2', 3, ttl=60)
+        backend.invalidate('iam.keys:p:sa')
+        self.assertEqual(backend.get('iam.keys:p:sa'), (False, None))
+        self.assertEqual(backend.get('iam.keys:p:sa:extra'), (False, None))
+        self.assertEqual(backend.get('iam.keys:p:sa2'), (True, 3))
+
+class TestMemoryCache(_CacheBackendTests, unittest.TestCase):
+
+    def make_backend(self, max_entries):
+        return cache.MemoryCache(max_entries)
+
+class TestSQLiteCache(_CacheBackendTests, unittest.TestCase):
+
+    def make_backend(self, max_entries):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        return cache.SQLiteCache(os.path.join(directory.name, 'cache.sqlite3'), max_entries)
+
+class TestReadThrough(unittest.TestCase):
+
+    def setUp(self):
+        cache.set_cache(cache.MemoryCache())
+
+    def test_loader_runs_once_until_invalidated(self):
+        loader = MagicMock(return_value=['key1'])
+
+        self.assertEqual(cache.cached('iam.keys:p:sa', loader), ['key1'])
+        self.assertEqual(cache.cached('iam.keys:p:sa', loader), ['key1'])
+        loader.assert_called_once_with()
+
+        cache.invalidate('iam.keys:p:sa')
+        cache.cached('iam.keys:p:sa', loader)
+        self.assertEqual(loader.call_count, 2)
+
+    def test_use_cache_false_refreshes_entry(self):
+        loader = MagicMock(side_effect=[1, 2])
+        cache.cached('k', loader)
+        self.assertEqual(cache.cached('k', loader, use_cache=False), 2)
+        self.assertEqual(cache.cached('k', loader), 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,327 @@
+import unittest
+from unittest.mock import patch, MagicMock
+import datetime
+import tempfile
+import sys
+import os
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common import instrumentation
+from common.cache import MemoryCache, set_cache
+from google.cloud import certificate_manager_v1
+from google.longrunning import operations_pb2
+from certificate_manager_certificate_operations import certificate_handler
+from certificate_manager_certificate_operations.certificate_handler import certificate_manager_certificate_handle_action
+from certificate_manager_certificate_operations.certificate_expiry_index import CertificateExpiryIndex
+from certificate_manager_certificate_operations.certificate_validation import validate_certificate
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+
+def _make_certificate(common_name, dns_names=(), issuer=None, days=(-1, 90)):
+    """Return (pem_certificate, pem_private_key, (certificate, key)), signed by `issuer` or self-signed."""
+    key = ec.generate_private_key(ec.SECP256R1())
+    subject = x509.Name([x509.NameAttribute(x509.NameOID.COMMON_NAME, common_name)])
+    issuer_certificate, issuer_key = issuer or (None, key)
+    now = datetime.datetime.now(datetime.timezone.utc)
+    builder = (x509.CertificateBuilder()
+               .subject_name(subject)
+               .issuer_name(issuer_certificate.subject if issuer_certificate else subject)
+               .public_key(key.public_key())
+               .serial_number(x509.random_serial_number())
+               .not_valid_before(now + datetime.timedelta(days=days[0]))
+               .not_valid_after(now + datetime.timedelta(days=days[1])))
+    if dns_names:
+        builder = builder.add_extension(x509.SubjectAlternativeName([x509.DNSName(n) for n in dns_names]), critical=False)
+    certificate = builder.sign(issuer_key, hashes.SHA256())
+    pem_certificate = certificate.public_bytes(serialization.Encoding.PEM).decode()
+    pem_private_key = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                        serialization.NoEncryption()).decode()
+    return pem_certificate, pem_private_key, (certificate, key)
+
+class TestCertificateHandler(unittest.TestCase):
+
+    def setUp(self):
+        set_cache(MemoryCache())
+
+    @patch('certificate_manager_certificate_operations.certificate_handler.get_certificate_manager_client')
+    def test_delete_without_waiting(self, mock_get_client):
+        client = mock_get_client.return_value
+        client.delete_certificate.return_value.operation.name = 'projects/p/locations/global/operations/op1'
+
+        result = certificate_manager_certificate_handle_action({
+            'action': 'delete',
+            'project_id': 'p',
+            'name': 'cert1',
+            'wait': False
+        })
+
+        client.delete_certificate.return_value.result.assert_not_called()
+        self.assertEqual(result['operation'], 'projects/p/locations/global/operations/op1')
+        self.assertFalse(result['done'])
+
+    @patch('certificate_manager_certificate_operations.certificate_handler.get_certificate_manager_client')
+    def test_operation_status_done(self, mock_get_client):
+        client = mock_get_client.return_value
+        operation = operations_pb2.Operation(name='projects/p/locations/global/operations/op1', done=True)
+        certificate = certificate_manager_v1.Certificate(name='projects/p/locations/global/certificates/cert1')
+        operation.response.value = certificate_manager_v1.Certificate.serialize(certificate)
+        client.get_operation.return_value = operation
+
+        result = certificate_manager_certificate_handle_action({
+            'action': 'operation_status',
+            'operation': 'projects/p/locations/global/operations/op1'
+        })
+
+        self.assertEqual(result, {
+            'operation': 'projects/p/locations/global/operations/op1',
+            'done': True,
+            'certificate': 'projects/p/locations/global/certificates/cert1',
+        })
+
+    @patch('certificate_manager_certificate_operations.certificate_handler.get_expiry_index')
+    @patch('certificate_manager_certificate_operations.certificate_handler.get_certificate_manager_client')
+    def test_finished_delete_operation_leaves_expiry_index(self, mock_get_client, mock_get_index):
+        operation = operations_pb2.Operation(name='projects/p/locations/global/operations/op1', done=False)
+        metadata = certificate_manager_v1.OperationMetadata(verb='delete', target='projects/p/locations/global/certificates/cert1')
+        operation.metadata.value = certificate_manager_v1.OperationMetadata.serialize(metadata)
+        mock_get_client.return_value.get_operation.return_value = operation
+        request = {'action': 'operation_status', 'operation': 'projects/p/locations/global/operations/op1'}
+
+        certificate_manager_certificate_handle_action(request)
+        mock_get_index.return_value.remove.assert_not_called()
+
+        operation.done = True
+        certificate_manager_certificate_handle_action(request)
+        mock_get_index.return_value.remove.assert_called_once_with('projects/p/locations/global/certificates/cert1')
+
+    @patch('certificate_manager_certificate_operations.certificate_handler.CertificateExpiryIndex')
+    def test_expiry_index_is_not_instrumented_as_a_client(self, mock_index):
+        instrumentation.enable()
+        self.addCleanup(instrumentation.enable, False)
+        with patch.object(certificate_handler, '_expiry_index', None):
+            index = certificate_handler.get_expiry_index()
+            self.assertIs(certificate_handler.get_expiry_index(), index)
+
+        self.assertIs(index, mock_index.return_value)
+        mock_index.assert_called_once_with()
+
+    @patch('certificate_manager_certificate_operations.certificate_handler.get_certificate_manager_client')
+    def test_update_description_skips_get(self, mock_get_client):
+        client = mock_get_client.return_value
+        client.update_certificate.return_value.result.return_value.name = 'cert1'
+
+        result = certificate_manager_certificate_handle_action({
+            'action': 'update',
+            'project_id': 'p',
+            'name': 'cert1',
+            'description': 'new'
+        })
+
+        client.get_certificate.assert_not_called()
+        kwargs = client.update_certificate.call_args.kwargs
+        self.assertEqual(kwargs['certificate'].name, 'projects/p/locations/global/certificates/cert1')
+        self.assertEqual(kwargs['certificate'].description, 'new')
+        self.assertEqual(list(kwargs['update_mask'].paths), ['description'])
+        self.assertEqual(result, {'message': 'Certificate cert1 updated successfully'})
+
+    @patch('certificate_manager_certificate_operations.certificate_handler.get_certificate_manager_client')
+    def test_update_domains_on_self_managed_certificate_is_skipped(self, mock_get_client):
+        client = mock_get_client.return_value
+        client.get_certificate.return_value = certificate_manager_v1.Certificate(
+            self_managed=certificate_manager_v1.Certificate.SelfManagedCertificate(pem_certificate='pem')
+        )
+
+        result = certificate_manager_certificate_handle_action({
+            'action': 'update',
+            'project_id': 'p',
+            'name': 'cert1',
+            'domains': ['example.com']
+        })
+
+        client.update_certificate.assert_not_called()
+        self.assertEqual(result, {'message': 'No updates requested'})
+
+    @patch('certificate_manager_certificate_operations.certificate_handler.get_certificate_manager_client')
+    def test_update_many_certificates(self, mock_get_client):
+        client = mock_get_client.return_value
+        client.update_certificate.return_value.operation.name = 'op'
+
+        result = certificate_manager_certificate_handle_action({
+            'action': 'update',
+            'project_id': 'p',
+            'names': ['cert1', 'cert2'],
+            'description': 'new',
+            'wait': False
+        })
+
+        self.assertEqual(client.update_certificate.call_count, 2)
+        self.assertEqual(set(result['results']), {'cert1', 'cert2'})
+        self.assertEqual(result['message'], 'Updated 2 of 2 certificates')
+
+    @patch('certificate_manager_certificate_operations.certificate_handler.get_certificate_manager_client')
+    def test_get_returns_projected_dict(self, mock_get_client):
+        client = mock_get_client.return_value
+        client.get_certificate.return_value = certificate_manager_v1.Certificate(
+            name='projects/p/locations/global/certificates/cert1',
+            description='dummycert',
+            managed=certificate_manager_v1.Certificate.ManagedCertificate(
+                domains=['example.com'],
+                state=certificate_manager_v1.Certificate.ManagedCertificate.State.ACTIVE
+            )
+        )
+
+        full = certificate_manager_certificate_handle_action({'action': 'get', 'project_id': 'p', 'name': 'cert1'})
+        projected = certificate_manager_certificate_handle_action({
+            'action': 'get',
+            'project_id': 'p',
+            'name': 'cert1',
+            'fields': ['managed.state', 'expire_time', 'description']
+        })
+
+        self.assertEqual(full['managed'], {'domains': ['example.com'], 'state': 'ACTIVE'})
+        self.assertEqual(projected, {'managed': {'state': 'ACTIVE'}, 'description': 'dummycert'})
+
+    @patch('certificate_manager_certificate_operations.certificate_handler.get_certificate_manager_client')
+    def test_list_returns_one_page(self, mock_get_client):
+        client = mock_get_client.return_value
+        page = certificate_manager_v1.ListCertificatesResponse(
+            certificates=[certificate_manager_v1.Certificate(name='cert1', description='d')],
+            next_page_token='token2'
+        )
+        client.list_certificates.return_value.pages = iter([page])
+
+        result = certificate_manager_certificate_handle_action({
+            'action': 'list',
+            'project_id': 'p',
+            'filter': 'labels.env = prod',
+            'fields': ['name']
+        })
+
+        request = client.list_certificates.call_args.kwargs['request']
+        self.assertEqual(request.parent, 'projects/p/locations/global')
+        self.assertEqual(request.filter, 'labels.env = prod')
+        self.assertEqual(result, {'certificates': [{'name': 'cert1'}], 'next_page_token': 'token2'})
+
+    @patch('certificate_manager_certificate_operations.certificate_handler.get_expiry_index')
+    @patch('certificate_manager_certificate_operations.certificate_handler.get_certificate_manager_client')
+    def test_scan_expiring_refreshes_incrementally(self, mock_get_client, mock_get_index):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        mock_get_index.return_value = CertificateExpiryIndex(os.path.join(directory.name, 'index.sqlite3'))
+        client = mock_get_client.return_value
+        now = datetime.datetime.now(datetime.timezone.utc)
+
+        def certificate(name, expires_in_days, updated_days_ago):
+            return certificate_manager_v1.Certificate(
+                name=name,
+                expire_time=now + datetime.timedelta(days=expires_in_days),
+                update_time=now - datetime.timedelta(days=updated_days_ago),
+            )
+
+        client.list_certificates.side_effect = [
+            [certificate('p1/soon', 5, 10), certificate('p1/later', 90, 10)],
+            [certificate('p2/soonest', 1, 3)],
+            [certificate('p1/renewed', 10, 0)],
+            [],
+        ]
+
+        first = certificate_manager_certificate_handle_action({
+            'action': 'scan_expiring', 'projects': ['p1', 'p2'], 'days': 30, 'max_workers': 1
+        })
+        second = certificate_manager_certificate_handle_action({
+            'action': 'scan_expiring', 'projects': ['p1', 'p2'], 'days': 30, 'max_workers': 1
+        })
+
+        self.assertEqual([c['name'] for c in first['certificates']], ['p2/soonest', 'p1/soon'])
+        self.assertEqual([c['name'] for c in second['certificates']], ['p2/soonest', 'p1/soon', 'p1/renewed'])
+        incremental_request = client.list_certificates.call_args_list[2].kwargs['request']
+        self.assertTrue(incremental_request.filter.startswith('update_time > '))
+        self.assertEqual(second['refreshed'], {'p1': {'listed': 1, 'removed': 0}, 'p2': {'listed': 0, 'removed': 0}})
+
+    def test_invalid_action(self):
+        with self.assertRaises(NotImplementedError):
+            certificate_manager_certificate_handle_action({'action': 'invalid_action'})
+
+class TestCertificateValidation(unittest.TestCase):
+
+    def setUp(self):
+        set_cache(MemoryCache())
+        self.ca_pem, _, self.ca = _make_certificate('Test CA')
+        self.leaf_pem, self.leaf_key, _ = _make_certificate('example.com', ['example.com', '*.example.com'],
+                                                            issuer=self.ca)
+
+    def test_valid_chain(self):
+        report = validate_certificate(self.leaf_pem + self.ca_pem, self.leaf_key, domains=['www.example.com'])
+
+        self.assertTrue(report['valid'], report['errors'])
+        self.assertEqual(report['san'], ['example.com', '*.example.com'])
+        self.assertEqual(report['chain_length'], 2)
+
+    def test_detects_problems(self):
+        _, other_key, _ = _make_certificate('other.com')
+        expired_pem, expired_key, _ = _make_certificate('old.com', ['old.com'], days=(-90, -1))
+
+        self.assertIn('Private key does not match the certificate',
+                      validate_certificate(self.leaf_pem, other_key)['errors'])
+        self.assertTrue(validate_certificate(expired_pem, expired_key)['errors'][0].startswith('Certificate expired'))
+        self.assertEqual(validate_certificate(self.leaf_pem, self.leaf_key, domains=['a.b.example.com'])['errors'],
+                         ['Certificate is not valid for a.b.example.com'])
+        # The issuer must follow the certificate it signed
+        misordered = validate_certificate(self.ca_pem + self.leaf_pem, self.leaf_key)
+        self.assertFalse(misordered['valid'])
+        self.assertTrue(any(error.startswith('Chain certificate 1') for error in misordered['errors']))
+
+    @patch('certificate_manager_certificate_operations.certificate_handler.get_certificate_manager_client')
+    def test_create_self_uploaded_validates_before_calling_the_api(self, mock_get_client):
+        _, other_key, _ = _make_certificate('other.com')
+        request = {'action': 'create_self_uploaded', 'project_id': 'p', 'name': 'cert1', 'description': '',
+                   'scope': 'DEFAULT', 'certificate': self.leaf_pem, 'private_key': other_key}
+
+        result = certificate_manager_certificate_handle_action(request)
+
+        self.assertTrue(result['error'].startswith('Certificate failed validation'))
+        mock_get_client.return_value.create_certificate.assert_not_called()
+
+    @patch('certificate_manager_certificate_operations.certificate_handler.get_certificate_manager_client')
+    def test_bulk_upload_from_directory(self, mock_get_client):
+        client = mock_get_client.return_value
+        client.create_certificate.return_value.result.side_effect = lambda: MagicMock(name='created')
+        _, other_key, _ = _make_certificate('other.com')
+        pairs = {'Site_One': (self.leaf_pem, self.leaf_key), 'site-two': _make_certificate('two.com', ['two.com'])[:2],
+                 'broken': (self.leaf_pem, other_key)}
+
+        with tempfile.TemporaryDirectory() as directory:
+            for stem, (pem_certificate, pem_private_key) in pairs.items():
+                with open(os.path.join(directory, f'{stem}.crt'), 'w') as f:
+                    f.write(pem_certificate)
+                with open(os.path.join(directory, f'{stem}.key'), 'w') as f:
+                    f.write(pem_private_key)
+            result = certificate_manager_certificate_handle_action({
+                'action': 'create_self_uploaded_bulk', 'project_id': 'p', 'directory': directory,
+            })
+
+        self.assertEqual((result['uploaded'], result['invalid'], result['failed']), (2, 1, 0))
+        self.assertIn('error', result['results']['broken'])
+        created = sorted(call.kwargs['certificate_id'] for call in client.create_certificate.call_args_list)
+        self.assertEqual(created, ['site-one', 'site-two'])
+
+    @patch('certificate_manager_certificate_operations.certificate_handler.get_certificate_manager_client')
+    def test_bulk_dry_run_from_bundle(self, mock_get_client):
+        two_pem, two_key, _ = _make_certificate('two.com', ['two.com'])
+
+        with tempfile.NamedTemporaryFile('w', suffix='.pem', delete=False) as f:
+            f.write(self.leaf_key + self.leaf_pem + self.ca_pem + two_key + two_pem)
+        self.addCleanup(os.remove, f.name)
+        result = certificate_manager_certificate_handle_action({
+            'action': 'create_self_uploaded_bulk', 'project_id': 'p', 'bundle': f.name, 'dry_run': True,
+        })
+
+        self.assertEqual(sorted(result['results']), ['example-com', 'two-com'])
+        self.assertEqual(result['message'], '2 of 2 certificates are valid')
+        mock_get_client.return_value.create_certificate.assert_not_called()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import unittest
+from unittest.mock import MagicMock
+import threading
+import sys
+import os
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common import client_registry
+
+class TestClientRegistry(unittest.TestCase):
+
+    def setUp(self):
+        client_registry.reset_clients()
+
+    def tearDown(self):
+        client_registry.reset_clients()
+
+    def test_client_is_built_once_and_reused(self):
+        factory = MagicMock(side_effect=lambda: object())
+
+        first = client_registry.get_client('iam', factory)
+        second = client_registry.get_client('iam', factory)
+
+        self.assertIs(first, second)
+        factory.assert_called_once_with()
+
+    def test_clients_are_keyed_by_name(self):
+        iam = client_registry.get_client('iam', object)
+        compute = client_registry.get_client('compute.instances', object)
+
+        self.assertIsNot(iam, compute)
+
+    def test_concurrent_first_use_builds_a_single_client(self):
+        factory = MagicMock(side_effect=lambda: object())
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(client_registry.get_client('iam', factory)))
+            for _ in range(20)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        factory.assert_called_once_with()
+        self.assertEqual(len({id(client) for client in results}), 1)
+
+    def test_reset_clients_forces_rebuild(self):
+        first = client_registry.get_client('iam', object)
+        client_registry.reset_clients()
+        second = client_registry.get_client('iam', object)
+
+        self.assertIsNot(first, second)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,15 +1,35 @@
 import unittest
+import hashlib
+import itertools
 from unittest.mock import patch, MagicMock
+import datetime
+import json
+import tempfile
+import threading
 import sys
 import os
 
 # Add the parent directory to the Python path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from google.cloud import iam_admin_v1
+from common.cache import MemoryCache, SQLiteCache, set_cache
+from common.idempotency import set_store
 from iam_service_account_key_management.service_account_key_handler import handle_iam_key_action
 
+def _colliding_keys(handler_name, key, stripes=64):
+    """Return three item keys, one of which shares `key`'s lock in a table of `stripes` striped locks."""
+    def _stripe(item_key):
+        return int(hashlib.md5(f"idempotency:{handler_name}:{item_key}".encode()).hexdigest(), 16) % stripes
+    colliding = next(f'item-{i}' for i in itertools.count() if _stripe(f'item-{i}') == _stripe(key))
+    return ['other-1', colliding, 'other-2']
+
 class TestIAMKeyHandler(unittest.TestCase):
 
+    def setUp(self):
+        set_cache(MemoryCache())
+        set_store(MemoryCache())
+
     @patch('iam_service_account_key_management.service_account_key_handler.create_service_account_key')
     def test_create_service_account_key(self, mock_create):
         mock_create.return_value = {
@@ -83,6 +103,311 @@ class TestIAMKeyHandler(unittest.TestCase):
         mock_disable.assert_called_once_with('project_id', 'email@example.com', 'key_id')
         self.assertTrue(result)
 
+    @patch('iam_service_account_key_management.service_account_key_handler.get_iam_client')
+    @patch('iam_service_account_key_management.service_account_key_handler.list_service_account_keys')
+    def test_delete_all_service_account_keys(self, mock_list, mock_get_client):
+        mock_list.return_value = ['key1', 'key2', 'key3']
+        client = mock_get_client.return_value
+
+        def delete(name):
+            if name.endswith('/key2'):
+                raise RuntimeError('boom')
+        client.delete_service_account_key.side_effect = delete
+
+        result = handle_iam_key_action({
+            'action': 'delete_all',
+            'project_id': 'project_id',
+            'service_account_email': 'email@example.com',
+            'max_workers': 2
+        })
+
+        self.assertEqual(result['deleted_keys'], ['key1', 'key3'])
+        self.assertEqual(result['failed_keys'], {'key2': 'boom'})
+        self.assertEqual(client.delete_service_account_key.call_count, 3)
+        mock_get_client.assert_called_once_with()
+
+    @patch('iam_service_account_key_management.service_account_key_handler.disable_service_account_key')
+    def test_batch_action(self, mock_disable):
+        def disable(project_id, service_account_email, key_id):
+            if key_id == 'bad':
+                raise RuntimeError('boom')
+            return {'message': key_id}
+        mock_disable.side_effect = disable
+
+        result = handle_iam_key_action({
+            'action': 'batch',
+            'project_id': 'project_id',
+            'service_account_email': 'email@example.com',
+            'max_workers': 2,
+            'actions': [
+                {'action': 'disable', 'key_id': 'key1'},
+                {'action': 'disable', 'key_id': 'bad'},
+                {'action': 'disable', 'key_id': 'key3'},
+            ]
+        })
+
+        self.assertEqual(result['succeeded'], 2)
+        self.assertEqual(result['failed'], 1)
+        self.assertEqual(result['results'], [
+            {'index': 0, 'result': {'message': 'key1'}},
+            {'index': 1, 'error': 'boom'},
+            {'index': 2, 'result': {'message': 'key3'}},
+        ])
+        with self.assertRaisesRegex(ValueError, 'Batch item 1 must be an object'):
+            handle_iam_key_action({'action': 'batch', 'actions': [{'action': 'list'}, 'disable']})
+
+    def _describe(self, project_id, service_account_email, use_cache=True):
+        now = datetime.datetime.now(datetime.timezone.utc)
+        def key(key_id, days_old):
+            created = (now - datetime.timedelta(days=days_old)).strftime('%Y-%m-%dT%H:%M:%SZ')
+            return {'key_id': key_id, 'valid_after_time': created, 'valid_before_time': None,
+                    'key_origin': 'GOOGLE_PROVIDED', 'disabled': False}
+        return [key(f'{service_account_email}-old', 200), key(f'{service_account_email}-new', 10)]
+
+    @patch('iam_service_account_key_management.service_account_key_handler.disable_service_account_key')
+    @patch('iam_service_account_key_management.service_account_key_handler.describe_service_account_keys')
+    @patch('iam_service_account_key_management.service_account_key_handler.list_service_accounts')
+    def test_audit_dry_run(self, mock_accounts, mock_describe, mock_disable):
+        mock_accounts.return_value = ['sa1@p', 'sa2@p']
+        mock_describe.side_effect = self._describe
+
+        result = handle_iam_key_action({
+            'action': 'audit',
+            'projects': ['p'],
+            'max_age_days': 90,
+            'policy_action': 'disable'
+        })
+
+        mock_disable.assert_not_called()
+        self.assertTrue(result['dry_run'])
+        self.assertEqual(result['audited_accounts'], 2)
+        self.assertEqual(len(result['keys']), 4)
+        self.assertEqual([k['key_id'] for k in result['over_age']], ['sa1@p-old', 'sa2@p-old'])
+
+    @patch('iam_service_account_key_management.service_account_key_handler.time.time')
+    @patch('iam_service_account_key_management.service_account_key_handler.disable_service_account_key')
+    @patch('iam_service_account_key_management.service_account_key_handler.describe_service_account_keys')
+    def test_audit_resumes_from_checkpoint(self, mock_describe, mock_disable, mock_time):
+        mock_describe.side_effect = self._describe
+        mock_disable.return_value = {'message': 'disabled'}
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        checkpoint = os.path.join(directory.name, 'checkpoint.jsonl')
+        request = {
+            'action': 'audit',
+            'service_accounts': [{'project_id': 'p', 'service_account_email': f'sa{i}@p'} for i in range(3)],
+            'policy_action': 'disable',
+            'dry_run': False,
+            'checkpoint': checkpoint,
+            'batch_size': 2,
+            'timeout': 10,
+            'started_at': 0,
+        }
+
+        # The budget runs out after the first batch
+        mock_time.side_effect = [5, 20]
+        first = handle_iam_key_action(request)
+        mock_time.side_effect = None
+        mock_time.return_value = 5
+        second = handle_iam_key_action(request)
+
+        self.assertFalse(first['complete'])
+        self.assertEqual(len(first['results']), 2)
+        self.assertEqual([k['key_id'] for k in first['over_age']], ['sa2@p-old'])
+        self.assertTrue(second['complete'])
+        self.assertEqual(second['skipped_from_checkpoint'], 2)
+        self.assertEqual([r['key_id'] for r in second['results']], ['sa2@p-old'])
+        self.assertEqual(mock_disable.call_count, 3)
+        with open(checkpoint) as f:
+            self.assertEqual(len([json.loads(line) for line in f]), 3)
+
+    @patch('iam_service_account_key_management.service_account_key_handler.disable_service_account_key')
+    @patch('iam_service_account_key_management.service_account_key_handler.describe_service_account_keys')
+    def test_audit_checkpoints_each_key_as_it_finishes(self, mock_describe, mock_disable):
+        mock_describe.side_effect = self._describe
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        checkpoint = os.path.join(directory.name, 'checkpoint.jsonl')
+
+        def _disable(project_id, service_account_email, key_id):
+            if key_id == 'sa1@p-old':
+                # The function is killed while the batch's second key is in flight
+                with open(checkpoint) as f:
+                    self.assertEqual([json.loads(line)['key_id'] for line in f], ['sa0@p-old'])
+                raise SystemExit
+            return {'message': 'disabled'}
+        mock_disable.side_effect = _disable
+
+        with self.assertRaises(SystemExit):
+            handle_iam_key_action({
+                'action': 'audit',
+                'service_accounts': [{'project_id': 'p', 'service_account_email': f'sa{i}@p'} for i in range(2)],
+                'policy_action': 'disable',
+                'dry_run': False,
+                'checkpoint': checkpoint,
+                'max_workers': 1,
+            })
+
+    @patch('iam_service_account_key_management.service_account_key_handler.list_service_account_keys')
+    @patch('iam_service_account_key_management.service_account_key_handler.get_iam_client')
+    @patch('iam_service_account_key_management.service_account_key_handler.describe_service_account_keys')
+    def test_audit_rotation_stores_new_keys_before_retiring(self, mock_describe, mock_get_client, mock_list):
+        mock_describe.side_effect = self._describe
+        mock_list.return_value = ['sa0@p-old']
+        client = mock_get_client.return_value
+        client.create_service_account_key.return_value = iam_admin_v1.ServiceAccountKey(
+            private_key_data=b'{"type": "service_account"}', name='projects/p/serviceAccounts/sa0@p/keys/fresh')
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        request = {
+            'action': 'audit',
+            'service_accounts': [{'project_id': 'p', 'service_account_email': 'sa0@p'}],
+            'policy_action': 'rotate',
+            'dry_run': False,
+        }
+
+        with self.assertRaises(ValueError):
+            handle_iam_key_action(request)
+
+        def _disable(name):
+            # The new key is already on disk when the old one is retired
+            self.assertTrue(os.path.exists(os.path.join(directory.name, 'sa0@p-fresh.json')))
+        client.disable_service_account_key.side_effect = _disable
+        result = handle_iam_key_action({**request, 'key_output_dir': directory.name})
+
+        entry = result['results'][0]
+        self.assertNotIn('private_key', entry['result'])
+        self.assertEqual(entry['result']['key_file'], os.path.join(directory.name, 'sa0@p-fresh.json'))
+        client.disable_service_account_key.assert_called_once_with(name='projects/p/serviceAccounts/sa0@p/keys/sa0@p-old')
+        client.delete_service_account_key.assert_not_called()
+        with open(entry['result']['key_file'], 'rb') as f:
+            self.assertEqual(f.read(), b'{"type": "service_account"}')
+
+    @patch('iam_service_account_key_management.service_account_key_handler.rotate_service_account_key')
+    @patch('iam_service_account_key_management.service_account_key_handler.describe_service_account_keys')
+    def test_audit_does_not_rotate_disabled_keys(self, mock_describe, mock_rotate):
+        def _describe(project_id, service_account_email, use_cache=True):
+            keys = self._describe(project_id, service_account_email, use_cache)
+            # Retired by an earlier rotation sweep
+            keys[0]['disabled'] = True
+            return keys
+        mock_describe.side_effect = _describe
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+
+        result = handle_iam_key_action({
+            'action': 'audit',
+            'service_accounts': [{'project_id': 'p', 'service_account_email': 'sa0@p'}],
+            'policy_action': 'rotate',
+            'dry_run': False,
+            'key_output_dir': directory.name,
+        })
+
+        mock_rotate.assert_not_called()
+        self.assertEqual((result['over_age'], result['results']), ([], []))
+        self.assertTrue(result['complete'])
+
+    @patch('iam_service_account_key_management.service_account_key_handler.list_service_account_keys')
+    @patch('iam_service_account_key_management.service_account_key_handler.get_iam_client')
+    def test_rotate_creates_before_deleting(self, mock_get_client, mock_list):
+        mock_list.return_value = ['old']
+        client = mock_get_client.return_value
+        client.create_service_account_key.return_value.private_key_data = b'private'
+        client.create_service_account_key.return_value.name = 'projects/p/serviceAccounts/sa/keys/new'
+
+        result = handle_iam_key_action({
+            'action': 'rotate',
+            'project_id': 'p',
+            'service_account_email': 'sa',
+            'key_id': 'old'
+        })
+
+        calls = [c[0] for c in client.method_calls]
+        self.assertEqual(calls, ['create_service_account_key', 'delete_service_account_key'])
+        client.delete_service_account_key.assert_called_once_with(name='projects/p/serviceAccounts/sa/keys/old')
+        self.assertEqual(result['key_id'], 'new')
+        self.assertEqual(result['retired_key_id'], 'old')
+
+    @patch('iam_service_account_key_management.service_account_key_handler.list_service_account_keys')
+    @patch('iam_service_account_key_management.service_account_key_handler.get_iam_client')
+    def test_rotate_rolls_back_when_retiring_fails(self, mock_get_client, mock_list):
+        mock_list.return_value = ['old']
+        client = mock_get_client.return_value
+        client.create_service_account_key.return_value.private_key_data = b'private'
+        client.create_service_account_key.return_value.name = 'projects/p/serviceAccounts/sa/keys/new'
+        client.disable_service_account_key.side_effect = RuntimeError('denied')
+
+        with self.assertRaises(RuntimeError):
+            handle_iam_key_action({
+                'action': 'rotate',
+                'project_id': 'p',
+                'service_account_email': 'sa',
+                'key_id': 'old',
+                'retire': 'disable'
+            })
+
+        client.delete_service_account_key.assert_called_once_with(name='projects/p/serviceAccounts/sa/keys/new')
+
+    @patch('iam_service_account_key_management.service_account_key_handler.list_service_account_keys')
+    @patch('iam_service_account_key_management.service_account_key_handler.get_iam_client')
+    def test_rotate_checks_key_slots_first(self, mock_get_client, mock_list):
+        mock_list.return_value = ['old'] + [f'key{i}' for i in range(9)]
+
+        with self.assertRaises(RuntimeError):
+            handle_iam_key_action({
+                'action': 'rotate',
+                'project_id': 'p',
+                'service_account_email': 'sa',
+                'key_id': 'old'
+            })
+
+        mock_get_client.return_value.create_service_account_key.assert_not_called()
+
+    @patch('iam_service_account_key_management.service_account_key_handler.get_iam_client')
+    def test_keyed_batch_of_keyed_items_does_not_deadlock(self, mock_get_client):
+        request = {
+            'action': 'batch', 'project_id': 'p', 'service_account_email': 'sa@example.com', 'max_workers': 4,
+            'idempotency_key': 'batch-1',
+            'actions': [{'action': 'disable', 'key_id': f'k{i}', 'idempotency_key': key}
+                        for i, key in enumerate(_colliding_keys('iam_service_account_key_management.service_account_key_handler.handle_iam_key_action', 'batch-1'))],
+        }
+        outcome = []
+        worker = threading.Thread(target=lambda: outcome.append(handle_iam_key_action(request)), daemon=True)
+
+        worker.start()
+        worker.join(timeout=10)
+
+        self.assertFalse(worker.is_alive(), "keyed batch deadlocked")
+        self.assertEqual(outcome[0]['succeeded'], 3)
+        with self.assertRaises(ValueError):
+            handle_iam_key_action({**request, 'actions': [{'action': 'disable', 'key_id': 'k1', 'idempotency_key': 'batch-1'}]})
+
+    @patch('iam_service_account_key_management.service_account_key_handler.get_iam_client')
+    def test_idempotency_key_deduplicates_retries(self, mock_get_client):
+        set_store(SQLiteCache(':memory:'))
+        mock_get_client.return_value.create_service_account_key.side_effect = [
+            iam_admin_v1.ServiceAccountKey(name=f'projects/-/serviceAccounts/email@example.com/keys/{key_id}',
+                                           private_key_data=f'{{"private_key_id": "{key_id}"}}'.encode())
+            for key_id in ('key1', 'key2')
+        ]
+        request = {
+            'action': 'create',
+            'project_id': 'project_id',
+            'service_account_email': 'email@example.com',
+            'idempotency_key': 'retry-1'
+        }
+
+        first = handle_iam_key_action(request)
+        second = handle_iam_key_action(dict(request))
+
+        mock_get_client.return_value.create_service_account_key.assert_called_once()
+        self.assertEqual(first['key_id'], 'key1')
+        self.assertEqual(first['private_key'], b'{"private_key_id": "key1"}')
+        self.assertEqual(second, first)
+        self.assertNotIn('idempotency_stored', first)
+        with self.assertRaises(ValueError):
+            handle_iam_key_action({**request, 'service_account_email': 'other@example.com'})
+
     def test_invalid_action(self):
         with self.assertRaises(ValueError):
             handle_iam_key_action({
@@ -0,0 +1,221 @@
+import unittest
+from unittest.mock import patch, MagicMock
+import json
+import tempfile
+import sys
+import os
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common import instrumentation
+from common.cache import MemoryCache, set_cache
+from google.cloud import compute_v1
+from compute_instance_management import instance_handler
+from compute_instance_management.instance_handler import handle_vm_action
+from compute_instance_management.instance_inventory import InstanceInventory
+
+class TestInstanceHandler(unittest.TestCase):
+
+    def setUp(self):
+        set_cache(MemoryCache())
+
+    @patch('compute_instance_management.instance_handler.get_compute_client')
+    def test_restart_waits_on_operations(self, mock_get_client):
+        client = mock_get_client.return_value
+
+        result = handle_vm_action({
+            'action': 'restart',
+            'project': 'project',
+            'zone': 'zone',
+            'instance': 'vm1'
+        })
+
+        client.stop.return_value.result.assert_called_once()
+        client.start.return_value.result.assert_called_once()
+        client.get.assert_not_called()
+        self.assertEqual(result['message'], 'VM vm1 restarted')
+        self.assertIn('stop_seconds', result)
+        self.assertIn('start_seconds', result)
+
+    @patch('compute_instance_management.instance_handler.get_compute_client')
+    def test_restart_budget_already_spent(self, mock_get_client):
+        client = mock_get_client.return_value
+        client.stop.return_value.result.side_effect = TimeoutError()
+
+        result = handle_vm_action({
+            'action': 'restart',
+            'project': 'project',
+            'zone': 'zone',
+            'instance': 'vm1',
+            'timeout': 10,
+            'started_at': 0
+        })
+
+        client.stop.return_value.result.assert_called_once_with(timeout=0)
+        client.start.assert_not_called()
+        self.assertEqual(result['message'], 'Timeout waiting for VM vm1 to stop')
+
+    @patch('compute_instance_management.instance_handler.get_compute_client')
+    def test_stop_by_selector(self, mock_get_client):
+        client = mock_get_client.return_value
+        client.aggregated_list.return_value = [
+            ('zones/zone-a', MagicMock(instances=[MagicMock(), MagicMock()])),
+            ('zones/zone-b', MagicMock(instances=[MagicMock()])),
+            ('zones/zone-c', MagicMock(instances=[MagicMock()])),
+            ('zones/zone-b2', compute_v1.InstancesScopedList(warning=compute_v1.Warning(code='UNREACHABLE'))),
+        ]
+        for index, (_, scoped_list) in enumerate(client.aggregated_list.return_value[:3]):
+            for position, instance in enumerate(scoped_list.instances):
+                instance.name = f'vm{index}{position}'
+        client.stop.side_effect = lambda project, zone, instance: None if instance != 'vm01' else 1 / 0
+
+        result = handle_vm_action({
+            'action': 'stop',
+            'project': 'project',
+            'selector': {'labels': {'env': 'dev'}, 'zones': ['zone-a', 'zone-b', 'zone-b2']}
+        })
+
+        request = client.aggregated_list.call_args.kwargs['request']
+        self.assertEqual(request.filter, '(labels.env = "dev")')
+        self.assertEqual(client.stop.call_count, 3)
+        self.assertEqual(result['zones']['zone-a']['succeeded'], 1)
+        self.assertEqual(result['zones']['zone-a']['failed'], 1)
+        self.assertEqual(result['unreachable'], ['zone-b2'])
+        self.assertIn('error', result['zones']['zone-a']['instances']['vm01'])
+        self.assertEqual(result['zones']['zone-b']['succeeded'], 1)
+        self.assertNotIn('zone-c', result['zones'])
+
+    def test_restart_by_selector_is_rejected(self):
+        with self.assertRaises(ValueError):
+            handle_vm_action({'action': 'restart', 'project': 'project', 'selector': {}})
+
+    @patch('compute_instance_management.instance_handler.get_compute_client')
+    def test_status_is_cached_until_instance_changes(self, mock_get_client):
+        client = mock_get_client.return_value
+        client.get.return_value.status = 'RUNNING'
+        request = {'action': 'status', 'project': 'project', 'zone': 'zone', 'instance': 'vm1'}
+
+        self.assertEqual(handle_vm_action(request), {'instance': 'vm1', 'status': 'RUNNING'})
+        handle_vm_action(request)
+        self.assertEqual(client.get.call_count, 1)
+
+        handle_vm_action({'action': 'stop', 'project': 'project', 'zone': 'zone', 'instance': 'vm1'})
+        client.get.return_value.status = 'TERMINATED'
+        self.assertEqual(handle_vm_action(request), {'instance': 'vm1', 'status': 'TERMINATED'})
+        self.assertEqual(client.get.call_count, 2)
+
+    @patch('compute_instance_management.instance_handler.get_inventory')
+    @patch('compute_instance_management.instance_handler.get_compute_client')
+    def test_inventory_diffs_against_previous_snapshot(self, mock_get_client, mock_get_inventory):
+        def _instance(name, status, labels=None):
+            return compute_v1.Instance(name=name, id=hash(name) % 1000, status=status, labels=labels or {},
+                                       machine_type='zones/zone-a/machineTypes/e2-small')
+
+        def _read(path):
+            with open(path) as f:
+                return [json.loads(line) for line in f]
+
+        with tempfile.TemporaryDirectory() as output_dir:
+            mock_get_inventory.return_value = InstanceInventory(os.path.join(output_dir, 'state.sqlite3'))
+            client = mock_get_client.return_value
+            request = {'action': 'inventory', 'project': 'project', 'output_dir': output_dir}
+
+            client.aggregated_list.return_value = [
+                ('zones/zone-a', MagicMock(instances=[_instance('vm1', 'RUNNING'), _instance('vm2', 'RUNNING')])),
+                ('zones/zone-b', MagicMock(instances=[_instance('vm3', 'TERMINATED')])),
+            ]
+            first = handle_vm_action(request)
+            self.assertTrue(first['baseline'])
+            self.assertEqual((first['instances'], first['added']), (3, 3))
+            self.assertEqual(_read(first['snapshot'])[0]['machine_type'], 'e2-small')
+
+            client.aggregated_list.return_value = [
+                ('zones/zone-a', MagicMock(instances=[_instance('vm1', 'TERMINATED'), _instance('vm4', 'RUNNING')])),
+                ('zones/zone-b', MagicMock(instances=[_instance('vm3', 'TERMINATED')])),
+            ]
+            second = handle_vm_action(request)
+
+            self.assertFalse(second['baseline'])
+            self.assertEqual((second['instances'], second['added'], second['removed'], second['changed']), (3, 1, 1, 1))
+            diff = {line['instance']['name']: line for line in _read(second['diff'])}
+            self.assertEqual(diff['vm1']['changes'], {'status': ['RUNNING', 'TERMINATED']})
+            self.assertEqual(diff['vm2']['change'], 'removed')
+            self.assertEqual(diff['vm4']['change'], 'added')
+            self.assertNotIn('vm3', diff)
+
+            client.aggregated_list.side_effect = RuntimeError('listing failed')
+            with self.assertRaises(RuntimeError):
+                handle_vm_action(request)
+            client.aggregated_list.side_effect = None
+            self.assertEqual(handle_vm_action(request)['changed'], 0)
+            self.assertFalse(any(name.endswith('.tmp') for name in os.listdir(output_dir)))
+
+    @patch('compute_instance_management.instance_handler.InstanceInventory')
+    def test_inventory_is_not_instrumented_as_a_client(self, mock_inventory):
+        instrumentation.enable()
+        self.addCleanup(instrumentation.enable, False)
+        with patch.object(instance_handler, '_inventory', None):
+            inventory = instance_handler.get_inventory()
+            self.assertIs(instance_handler.get_inventory(), inventory)
+
+        self.assertIs(inventory, mock_inventory.return_value)
+        mock_inventory.assert_called_once_with()
+
+    @patch('compute_instance_management.instance_handler.get_compute_client')
+    def test_reconcile_by_label_only_stops_running_instances(self, mock_get_client):
+        client = mock_get_client.return_value
+        client.aggregated_list.return_value = [
+            ('zones/zone-a', MagicMock(instances=[
+                compute_v1.Instance(name='vm1', status='RUNNING'),
+                compute_v1.Instance(name='vm2', status='TERMINATED'),
+                compute_v1.Instance(name='vm3', status='STOPPING'),
+            ])),
+            ('zones/zone-b', MagicMock(instances=[
+                compute_v1.Instance(name='vm4', status='RUNNING'),
+                compute_v1.Instance(name='vm5', status='SUSPENDED'),
+            ])),
+        ]
+
+        result = handle_vm_action({
+            'action': 'reconcile', 'project': 'project', 'selector': {'labels': {'env': 'dev'}}, 'state': 'TERMINATED',
+        })
+
+        self.assertEqual(client.aggregated_list.call_args.kwargs['request'].filter, '(labels.env = "dev")')
+        self.assertEqual(sorted(call.kwargs['instance'] for call in client.stop.call_args_list), ['vm1', 'vm4'])
+        client.start.assert_not_called()
+        self.assertEqual((result['run'], result['failed'], result['skipped']), (2, 0, 2))
+        self.assertEqual(result['unsupported'], {'zone-b/vm5': 'SUSPENDED'})
+        self.assertEqual(result['transitions']['zone-a/vm1']['action'], 'stop')
+
+    @patch('compute_instance_management.instance_handler.get_compute_client')
+    def test_reconcile_desired_state_map(self, mock_get_client):
+        client = mock_get_client.return_value
+        client.aggregated_list.return_value = [
+            ('zones/zone-a', MagicMock(instances=[
+                compute_v1.Instance(name='vm1', status='TERMINATED'),
+                compute_v1.Instance(name='vm2', status='RUNNING'),
+                compute_v1.Instance(name='vm3', status='RUNNING'),
+            ])),
+        ]
+
+        result = handle_vm_action({
+            'action': 'reconcile', 'project': 'project',
+            'desired': {'zone-a/vm1': 'RUNNING', 'zone-a/vm2': 'RUNNING', 'zone-a/vm9': 'TERMINATED'},
+        })
+
+        self.assertEqual(client.aggregated_list.call_args.kwargs['request'].filter, '')
+        client.start.assert_called_once_with(project='project', zone='zone-a', instance='vm1')
+        client.stop.assert_not_called()
+        self.assertEqual((result['run'], result['skipped']), (1, 1))
+        self.assertEqual(result['missing'], ['zone-a/vm9'])
+
+        with self.assertRaises(ValueError):
+            handle_vm_action({'action': 'reconcile', 'project': 'project', 'desired': {'zone-a/vm1': 'PAUSED'}})
+
+    def test_invalid_action(self):
+        with self.assertRaises(ValueError):
+            handle_vm_action({'action': 'invalid_action'})
+
+if __name__ == '__main__':
+    unittest.main()
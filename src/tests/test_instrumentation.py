@@ -0,0 +1,67 @@
+import unittest
+from unittest.mock import MagicMock
+import sys
+import os
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common import client_registry, instrumentation
+from common.concurrency import run_concurrently
+
+class TestInstrumentation(unittest.TestCase):
+
+    def setUp(self):
+        instrumentation.enable()
+        instrumentation.reset_metrics()
+        client_registry.reset_clients()
+
+    def tearDown(self):
+        instrumentation.enable(False)
+        instrumentation.reset_metrics()
+        client_registry.reset_clients()
+
+    def test_action_counts_rpcs_across_threads_and_lro_waits(self):
+        sdk_client = MagicMock()
+        sdk_client.get.return_value = {'status': 'RUNNING'}
+        sdk_client.stop.return_value = MagicMock(spec=['result', 'done'])
+        client = client_registry.get_client('compute.instances', lambda: sdk_client)
+
+        @instrumentation.instrumented('compute')
+        def dispatcher(request_data):
+            run_concurrently(lambda name: client.get(instance=name), ['vm1', 'vm2', 'vm3'], 2)
+            client.stop(instance='vm1').result(timeout=5)
+            instrumentation.record_retry()
+            return {'message': 'ok'}
+
+        self.assertEqual(dispatcher({'action': 'stop'}), {'message': 'ok'})
+
+        metrics = instrumentation.snapshot()
+        action = metrics['action']['compute.stop']
+        self.assertEqual(action['count'], 1)
+        self.assertEqual(action['rpcs'], 4)
+        self.assertEqual(action['retries'], 1)
+        self.assertEqual(action['payload_bytes'], len('{"message": "ok"}'))
+        self.assertEqual(metrics['rpc']['compute.instances.get']['count'], 3)
+        self.assertEqual(metrics['lro_wait']['compute.instances.stop']['count'], 1)
+        self.assertEqual(metrics['client_init']['compute.instances']['count'], 1)
+
+        text = instrumentation.render_prometheus()
+        self.assertIn('gcp_selfservice_action_seconds_count{action="compute.stop"} 1', text)
+        self.assertIn('gcp_selfservice_action_rpcs_total{action="compute.stop"} 4', text)
+        self.assertIn('gcp_selfservice_rpc_errors_total{method="compute.instances.get"} 0', text)
+
+    def test_disabled_instrumentation_passes_through(self):
+        instrumentation.enable(False)
+        sdk_client = object()
+
+        @instrumentation.instrumented('iam')
+        def dispatcher(request_data):
+            return 'ok'
+
+        self.assertEqual(dispatcher({'action': 'create'}), 'ok')
+        self.assertIs(client_registry.get_client('certificate_expiry_index', lambda: sdk_client), sdk_client)
+        self.assertEqual(instrumentation.snapshot(), {})
+
+if __name__ == '__main__':
+    unittest.main()
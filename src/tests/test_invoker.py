@@ -0,0 +1,200 @@
+import unittest
+from unittest.mock import patch, MagicMock
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import io
+import json
+import threading
+import time
+import sys
+import os
+
+# Add the invoker directory to the Python path
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'src_invoker'))
+
+# parameters.py sets GOOGLE_APPLICATION_CREDENTIALS on import; keep it out of the test environment
+with patch.dict(os.environ):
+    from invoke_function import FunctionInvoker
+    import bulk_invoke
+    import hedged_invoke
+    import requests
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        self.server.requests.append((self.headers['Authorization'], body, self.client_address))
+        payload = json.dumps({"echo": body}).encode()
+        status = 200
+        if body.get('fail_times', 0) > sum(1 for r in self.server.requests if r[1] == body) - 1:
+            status = 503
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+class _StubServerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _StubHandler)
+        self.server.requests = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}/function-1'
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+class TestFunctionInvoker(_StubServerTestCase):
+
+    def test_token_and_connection_are_reused(self):
+        fetcher = MagicMock(return_value='token-1')
+
+        with FunctionInvoker(token_fetcher=fetcher) as invoker:
+            for i in range(3):
+                response = invoker.invoke(self.url, {"action": "hello", "n": i})
+                self.assertEqual(response.json(), {"echo": {"action": "hello", "n": i}})
+
+        fetcher.assert_called_once_with(self.url)
+        self.assertEqual([r[0] for r in self.server.requests], ['Bearer token-1'] * 3)
+        # Keep-alive: every request arrived over the same client connection
+        self.assertEqual(len({r[2] for r in self.server.requests}), 1)
+
+    @patch('invoke_function.token_expiry')
+    def test_token_is_refreshed_before_expiry(self, mock_expiry):
+        fetcher = MagicMock(side_effect=['token-1', 'token-2'])
+        mock_expiry.return_value = 0  # already inside the refresh margin
+
+        with FunctionInvoker(token_fetcher=fetcher) as invoker:
+            invoker.invoke(self.url, {})
+            invoker.invoke(self.url, {})
+
+        self.assertEqual(fetcher.call_count, 2)
+        self.assertEqual([r[0] for r in self.server.requests], ['Bearer token-1', 'Bearer token-2'])
+
+class TestBulkInvoke(_StubServerTestCase):
+
+    @patch('bulk_invoke.retry_delay', return_value=0)
+    def test_run_bulk_streams_responses_and_retries(self, mock_delay):
+        lines = [json.dumps({"action": "get", "n": i, "fail_times": 1 if i == 2 else 0}) for i in range(5)] + ['']
+        output = io.StringIO()
+
+        with FunctionInvoker(token_fetcher=lambda audience: 'token') as invoker:
+            summary = bulk_invoke.run_bulk(invoker, self.url, lines, output, max_in_flight=2)
+
+        records = sorted((json.loads(line) for line in output.getvalue().splitlines()), key=lambda r: r['index'])
+        self.assertEqual([r['index'] for r in records], [0, 1, 2, 3, 4])
+        self.assertTrue(all(r['status'] == 200 for r in records))
+        self.assertEqual(records[2]['attempts'], 2)
+        self.assertEqual(records[2]['response'], {"echo": {"action": "get", "n": 2, "fail_times": 1}})
+        self.assertEqual(summary['total'], 5)
+        self.assertEqual(summary['succeeded'], 5)
+        self.assertIsNotNone(summary['latency_ms']['p99'])
+
+    @patch('bulk_invoke.retry_delay', return_value=0)
+    def test_run_bulk_reports_bad_lines_and_does_not_retry_mutations(self, mock_delay):
+        lines = [
+            json.dumps({"action": "create", "fail_times": 1}),
+            '{"action": "get",',
+            json.dumps({"action": "create", "idempotency_key": "k1", "fail_times": 1}),
+        ]
+        output = io.StringIO()
+
+        with FunctionInvoker(token_fetcher=lambda audience: 'token') as invoker:
+            summary = bulk_invoke.run_bulk(invoker, self.url, lines, output, max_in_flight=1)
+
+        records = sorted((json.loads(line) for line in output.getvalue().splitlines()), key=lambda r: r['index'])
+        # A 503 does not say whether the create was applied, so it is not sent again
+        self.assertEqual((records[0]['status'], records[0]['attempts'], records[0]['ambiguous']), (503, 1, True))
+        self.assertTrue(records[1]['error'].startswith('Invalid JSON'))
+        self.assertEqual((records[2]['status'], records[2]['attempts']), (200, 2))
+        self.assertNotIn('ambiguous', records[2])
+        self.assertEqual((summary['succeeded'], summary['failed']), (1, 2))
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_latency_sample_stays_bounded(self):
+        sample = bulk_invoke.LatencySample(size=100)
+        for latency in range(10000):
+            sample.add(latency)
+
+        self.assertEqual((len(sample.values), sample.seen), (100, 10000))
+        self.assertTrue(2500 < sample.percentile(50) < 7500)
+
+class _RegionalInvoker:
+    """A fake invoker that answers each URL after its own delay, or fails it."""
+
+    def __init__(self, delays, failing=()):
+        self.delays = delays
+        self.failing = set(failing)
+        self.calls = []
+
+    def post(self, function_url, data):
+        self.calls.append(function_url)
+        time.sleep(self.delays.get(function_url, 0))
+        if function_url in self.failing:
+            raise requests.ConnectionError(f"{function_url} is down")
+        return MagicMock(status_code=200, url=function_url)
+
+class TestHedgedInvoke(unittest.TestCase):
+
+    def setUp(self):
+        patcher = patch('hedged_invoke.INITIAL_HEDGE_DELAY', 0.05)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_slow_read_is_hedged_to_next_region(self):
+        invoker = _RegionalInvoker({'a': 1.0})
+
+        with hedged_invoke.HedgedInvoker(invoker, ['a', 'b']) as hedged:
+            response = hedged.post('a', {'action': 'get', 'name': 'cert1'})
+
+        self.assertEqual(response.url, 'b')
+        self.assertEqual(invoker.calls, ['a', 'b'])
+
+    def test_only_read_only_requests_are_hedged(self):
+        invoker = _RegionalInvoker({'a': 0.2})
+
+        with hedged_invoke.HedgedInvoker(invoker, ['a', 'b']) as hedged:
+            self.assertEqual(hedged.post('a', {'action': 'delete', 'name': 'cert1'}).url, 'a')
+            # Each region's function keeps its own idempotency store, so a keyed create is sent once
+            create = {'action': 'create', 'service_account_email': 'sa@example.com', 'idempotency_key': 'k1'}
+            self.assertEqual(hedged.post('a', create).url, 'a')
+            self.assertEqual(invoker.calls, ['a', 'a'])
+
+        invoker.calls.clear()
+        with hedged_invoke.HedgedInvoker(invoker, ['a', 'b'], hedge_keyed=True) as hedged:
+            response = hedged.post('a', create)
+
+        self.assertEqual(response.url, 'b')
+        self.assertEqual(invoker.calls, ['a', 'b'])
+        self.assertTrue(hedged_invoke.is_hedgeable({'action': 'batch', 'actions': [{'action': 'list'}, {'action': 'status'}]}))
+        self.assertFalse(hedged_invoke.is_hedgeable({'action': 'batch', 'actions': [{'action': 'list'}, {'action': 'stop'}]}))
+
+    def test_failing_region_is_routed_around(self):
+        invoker = _RegionalInvoker({}, failing={'a'})
+
+        with hedged_invoke.HedgedInvoker(invoker, ['a', 'b']) as hedged:
+            for _ in range(hedged_invoke.FAILURE_THRESHOLD):
+                # Connection errors fail over straight away, without waiting for the hedge delay
+                self.assertEqual(hedged.post('a', {'action': 'list'}).url, 'b')
+            invoker.calls.clear()
+
+            self.assertEqual(hedged.ordered_endpoints('a'), ['b', 'a'])
+            self.assertEqual(hedged.post('a', {'action': 'stop'}).url, 'b')
+            self.assertEqual(invoker.calls, ['b'])
+            self.assertFalse(hedged.stats()['a']['healthy'])
+
+    def test_hedge_delay_follows_tracked_percentile(self):
+        with hedged_invoke.HedgedInvoker(_RegionalInvoker({}), ['a', 'b'], hedge_percentile=90) as hedged:
+            self.assertEqual(hedged.hedge_delay('a'), 0.05)
+            for i in range(hedged_invoke.MIN_LATENCY_SAMPLES):
+                hedged.endpoints['a'].record_success(0.01 * (i + 1))
+
+            self.assertAlmostEqual(hedged.hedge_delay('a'), 0.18)
+
+if __name__ == '__main__':
+    unittest.main()
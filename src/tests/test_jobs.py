@@ -0,0 +1,164 @@
+import unittest
+from unittest.mock import patch
+import threading
+import sys
+import os
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.cache import MemoryCache, set_cache
+from common.jobs import SQLiteJobStore, run_job_action, set_job_store
+from compute_instance_management.instance_handler import handle_vm_action
+from iam_service_account_key_management.service_account_key_handler import handle_iam_key_action
+
+class _Clock:
+    """A fake clock that only moves when the handler does work."""
+
+    def __init__(self, now):
+        self.now = now
+        self._lock = threading.Lock()
+
+    def time(self):
+        return self.now
+
+    def advance(self, seconds):
+        with self._lock:
+            self.now += seconds
+
+class TestJobs(unittest.TestCase):
+
+    def setUp(self):
+        self.store = SQLiteJobStore(':memory:')
+        set_job_store(self.store)
+        self.clock = _Clock(1000.0)
+        self.calls = []
+        self.fail_vm3 = True
+        patcher = patch('common.jobs.time.time', side_effect=self.clock.time)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        set_job_store(None)
+
+    def handler(self, request_data):
+        self.calls.append(request_data['instance'])
+        self.clock.advance(10)
+        if request_data['instance'] == 'vm3' and self.fail_vm3:
+            raise RuntimeError('quota exceeded')
+        return {"message": f"started {request_data['instance']}"}
+
+    def _submit(self, **fields):
+        return run_job_action(self.handler, {
+            'action': 'job_submit', 'job_id': 'job1', 'project': 'p', 'zone': 'z', 'chunk_size': 2,
+            'max_workers': 1, 'timeout': 100, 'started_at': self.clock.now,
+            'actions': [{'action': 'start', 'instance': f'vm{i}'} for i in range(10)], **fields,
+        })
+
+    def test_hands_off_before_budget_runs_out_and_resumes(self):
+        first = self._submit()
+
+        # Each chunk takes 20s; the fifth would not fit in the 100s budget with the margin
+        self.assertFalse(first['complete'])
+        self.assertEqual(first['processed'], 8)
+        self.assertEqual((first['done'], first['failed'], first['pending']), (7, 1, 2))
+        self.assertIn("job_resume", first['message'])
+
+        second = run_job_action(self.handler, {'action': 'job_resume', 'job_id': 'job1', 'started_at': self.clock.now})
+
+        self.assertTrue(second['complete'])
+        self.assertEqual(second['processed'], 2)
+        self.assertEqual(sorted(self.calls), sorted(f'vm{i}' for i in range(10)))
+
+        status = run_job_action(self.handler, {'action': 'job_status', 'job_id': 'job1', 'include_results': True})
+        self.assertEqual(status['status'], 'done')
+        self.assertEqual(status['chunks_done'], 5)
+        self.assertEqual(status['results'][3], {'index': 3, 'error': 'quota exceeded'})
+        self.assertEqual(status['results'][0]['result'], {'message': 'started vm0'})
+
+    def test_retry_failed_only_reruns_failed_items(self):
+        self._submit(timeout=1000)
+        self.calls.clear()
+        self.fail_vm3 = False
+
+        with self.assertRaises(ValueError):
+            # The job was submitted through another dispatcher
+            run_job_action(lambda request: request, {'action': 'job_resume', 'job_id': 'job1'})
+
+        resumed = run_job_action(self.handler, {
+            'action': 'job_resume', 'job_id': 'job1', 'retry_failed': True, 'started_at': self.clock.now,
+        })
+
+        self.assertEqual(self.calls, ['vm3'])
+        self.assertTrue(resumed['complete'])
+        self.assertEqual((resumed['done'], resumed['failed']), (10, 0))
+
+    def test_items_finished_before_a_crash_are_not_rerun(self):
+        self.store.create('job2', f"{__name__}.handler", [{'instance': 'vm0'}, {'instance': 'vm1'}], 2, 1)
+        self.assertEqual(self.store.claim_chunk('job2', lease_seconds=60), 0)
+        self.store.record_item('job2', 0, result={'message': 'started vm0'})
+        # The invocation died here, so the chunk is leased but not complete
+        self.assertIsNone(self.store.claim_chunk('job2', lease_seconds=60))
+
+        self.clock.advance(61)
+        self.assertEqual(self.store.claim_chunk('job2', lease_seconds=60), 0)
+        self.assertEqual(self.store.pending_items('job2', 0), [(1, {'instance': 'vm1'})])
+
+    def test_unknown_job(self):
+        with self.assertRaises(ValueError):
+            run_job_action(self.handler, {'action': 'job_status', 'job_id': 'missing'})
+
+    def test_secrets_are_scrubbed_at_any_depth_and_secret_actions_rejected(self):
+        def handler(request_data):
+            return {"key_id": "k1", "private_key": "secret",
+                    "results": [{"result": {"key_id": "k2", "private_key": "secret"}}]}
+
+        with self.assertRaises(ValueError):
+            run_job_action(handler, {'action': 'job_submit', 'actions': [{'action': 'create'}]},
+                           secret_actions=('create',))
+
+        result = run_job_action(handler, {'action': 'job_submit', 'job_id': 'job3', 'actions': [{'action': 'audit'}],
+                                          'started_at': self.clock.now})
+        status = run_job_action(handler, {'action': 'job_status', 'job_id': 'job3', 'include_results': True})
+
+        self.assertTrue(result['complete'])
+        self.assertEqual(status['results'][0]['result'], {"key_id": "k1", "results": [{"result": {"key_id": "k2"}}]})
+
+class TestDispatcherJobs(unittest.TestCase):
+
+    def setUp(self):
+        set_cache(MemoryCache())
+        set_job_store(SQLiteJobStore(':memory:'))
+
+    def tearDown(self):
+        set_job_store(None)
+
+    @patch('compute_instance_management.instance_handler.get_compute_client')
+    def test_compute_job(self, mock_get_client):
+        # Mock call counting is not thread-safe, so the stops are recorded by the side effect
+        stopped = []
+        mock_get_client.return_value.stop.side_effect = lambda **kwargs: stopped.append(kwargs['instance'])
+        result = handle_vm_action({
+            'action': 'job_submit', 'project': 'p', 'zone': 'z', 'chunk_size': 2,
+            'actions': [{'action': 'stop', 'instance': f'vm{i}'} for i in range(5)],
+        })
+
+        self.assertTrue(result['complete'])
+        self.assertEqual((result['done'], result['chunks_total']), (5, 3))
+        self.assertEqual(sorted(stopped), [f'vm{i}' for i in range(5)])
+        status = handle_vm_action({'action': 'job_status', 'job_id': result['job_id']})
+        self.assertEqual(status['status'], 'done')
+
+    @patch('iam_service_account_key_management.service_account_key_handler.get_iam_client')
+    def test_iam_job_rejects_key_creation(self, mock_get_client):
+        with self.assertRaises(ValueError):
+            handle_iam_key_action({
+                'action': 'job_submit', 'project_id': 'p', 'service_account_email': 'sa@example.com',
+                'actions': [{'action': 'disable', 'key_id': 'k1'}, {'action': 'rotate', 'key_id': 'k2'}],
+            })
+
+        mock_get_client.return_value.create_service_account_key.assert_not_called()
+        mock_get_client.return_value.disable_service_account_key.assert_not_called()
+
+if __name__ == '__main__':
+    unittest.main()
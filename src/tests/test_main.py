@@ -0,0 +1,55 @@
+import unittest
+from unittest.mock import patch, MagicMock
+import json
+import subprocess
+import sys
+import os
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+
+def _request(body, method='POST'):
+    request = MagicMock(method=method)
+    request.get_json.return_value = body
+    return request
+
+class TestMain(unittest.TestCase):
+
+    @patch('main.get_dispatcher')
+    def test_routes_to_service_dispatcher(self, mock_get_dispatcher):
+        dispatcher = mock_get_dispatcher.return_value
+        dispatcher.return_value = {'private_key': b'key', 'key_id': 'k1'}
+
+        body, status, headers = main.main(_request({'service': 'iam', 'action': 'create', 'project_id': 'p'}))
+
+        mock_get_dispatcher.assert_called_once_with('iam', False)
+        request_data = dispatcher.call_args[0][0]
+        self.assertNotIn('service', request_data)
+        self.assertIn('started_at', request_data)
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(body), {'private_key': 'a2V5', 'key_id': 'k1'})
+
+    def test_unknown_service(self):
+        body, status, _ = main.main(_request({'service': 'storage', 'action': 'get'}))
+        self.assertEqual(status, 400)
+        self.assertEqual(json.loads(body), {'error': 'Unknown service: storage'})
+
+    def test_invalid_body(self):
+        _, status, _ = main.main(_request(None))
+        self.assertEqual(status, 400)
+
+    def test_certificate_route_does_not_load_other_sdks(self):
+        script = (
+            "import sys, main; main.get_dispatcher('certificate'); "
+            "print(sorted(m for m in ('google.cloud.compute_v1', 'google.cloud.iam_admin_v1', "
+            "'google.cloud.certificate_manager_v1') if m in sys.modules)); "
+            "print(main.route_stats()['loaded'])"
+        )
+        output = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout
+        self.assertEqual(output.splitlines(), ["['google.cloud.certificate_manager_v1']", "['certificate']"])
+
+if __name__ == '__main__':
+    unittest.main()
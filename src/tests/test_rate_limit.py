@@ -0,0 +1,105 @@
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+import asyncio
+import sys
+import os
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from google.api_core import exceptions as google_exceptions
+from common import client_registry, rate_limit
+
+class TestRateLimit(unittest.TestCase):
+
+    def setUp(self):
+        rate_limit.reset_buckets()
+        client_registry.reset_clients()
+
+    def tearDown(self):
+        rate_limit.reset_buckets()
+        client_registry.reset_clients()
+
+    @patch('common.rate_limit.time.sleep')
+    def test_quota_errors_are_retried_and_slow_the_bucket(self, mock_sleep):
+        sdk_client = MagicMock()
+        sdk_client.stop.side_effect = [google_exceptions.ResourceExhausted('quota'),
+                                       google_exceptions.ServiceUnavailable('busy'), 'done']
+        client = client_registry.get_client('compute.instances', lambda: sdk_client)
+
+        self.assertEqual(client.stop(project='p1', zone='z', instance='vm1'), 'done')
+
+        self.assertEqual(sdk_client.stop.call_count, 3)
+        bucket = rate_limit.get_bucket('compute.instances', 'p1')
+        self.assertLess(bucket.rate, bucket.max_rate)
+        self.assertIsNot(bucket, rate_limit.get_bucket('compute.instances', 'p2'))
+
+    @patch('common.rate_limit.time.sleep')
+    def test_permanent_errors_fail_fast(self, mock_sleep):
+        sdk_client = MagicMock()
+        sdk_client.delete_service_account_key.side_effect = google_exceptions.PermissionDenied('denied')
+        client = client_registry.get_client('iam', lambda: sdk_client)
+
+        with self.assertRaises(google_exceptions.PermissionDenied):
+            client.delete_service_account_key(name='projects/p1/serviceAccounts/sa/keys/k1')
+
+        sdk_client.delete_service_account_key.assert_called_once()
+        mock_sleep.assert_not_called()
+
+    @patch('common.rate_limit.time.sleep')
+    def test_deadline_and_unavailable_are_not_retried_for_creates(self, mock_sleep):
+        sdk_client = MagicMock()
+        sdk_client.create_service_account_key.side_effect = [google_exceptions.DeadlineExceeded('slow'),
+                                                             google_exceptions.ServiceUnavailable('busy')]
+        sdk_client.get_service_account_key.side_effect = [google_exceptions.DeadlineExceeded('slow'),
+                                                          google_exceptions.ServiceUnavailable('busy'), 'key']
+        client = client_registry.get_client('iam', lambda: sdk_client)
+
+        with self.assertRaises(google_exceptions.DeadlineExceeded):
+            client.create_service_account_key(name='projects/p1/serviceAccounts/sa')
+        with self.assertRaises(google_exceptions.ServiceUnavailable):
+            client.create_service_account_key(name='projects/p1/serviceAccounts/sa')
+        self.assertEqual(client.get_service_account_key(name='projects/p1/serviceAccounts/sa/keys/k1'), 'key')
+
+        self.assertEqual(sdk_client.create_service_account_key.call_count, 2)
+        self.assertEqual(sdk_client.get_service_account_key.call_count, 3)
+
+    @patch('common.rate_limit.MAX_RETRIES', 2)
+    @patch('common.rate_limit.time.sleep')
+    def test_gives_up_after_max_retries(self, mock_sleep):
+        sdk_client = MagicMock()
+        sdk_client.get.side_effect = google_exceptions.TooManyRequests('quota')
+        client = client_registry.get_client('compute.instances', lambda: sdk_client)
+
+        with self.assertRaises(google_exceptions.TooManyRequests):
+            client.get(project='p1', zone='z', instance='vm1')
+
+        self.assertEqual(sdk_client.get.call_count, 3)
+
+    def test_bucket_waits_once_burst_is_spent(self):
+        bucket = rate_limit.TokenBucket(rate=10.0, burst=2)
+        with patch('common.rate_limit.time.sleep') as mock_sleep:
+            bucket.acquire()
+            bucket.acquire()
+            mock_sleep.assert_not_called()
+            with patch('common.rate_limit.time.monotonic', side_effect=[bucket._updated, bucket._updated + 0.1]):
+                bucket.acquire()
+        mock_sleep.assert_called_once()
+        self.assertAlmostEqual(mock_sleep.call_args[0][0], 0.1, places=2)
+
+    @patch('common.rate_limit.asyncio.sleep', new_callable=AsyncMock)
+    def test_async_clients_share_the_retry_policy(self, mock_sleep):
+        sdk_client = MagicMock()
+        sdk_client.get_certificate = AsyncMock(side_effect=[google_exceptions.ServiceUnavailable('busy'), 'cert'])
+
+        async def _get():
+            client = client_registry.get_async_client('certificate_manager', lambda: sdk_client)
+            self.assertIs(client, client_registry.get_async_client('certificate_manager', lambda: None))
+            return await client.get_certificate(name='projects/p1/locations/global/certificates/c1')
+
+        self.assertEqual(asyncio.run(_get()), 'cert')
+        self.assertEqual(sdk_client.get_certificate.await_count, 2)
+        mock_sleep.assert_awaited_once()
+
+if __name__ == '__main__':
+    unittest.main()
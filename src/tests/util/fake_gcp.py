@@ -0,0 +1,322 @@
+"""
+In-process fakes of the Compute, IAM and Certificate Manager clients.
+
+The fakes return real SDK message types, keep their own resource state, and can be
+configured with per-call latency, an error rate and long-running operation durations,
+so handlers can be exercised and benchmarked without network access.
+"""
+import itertools
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+from google.api_core import exceptions as google_exceptions
+from google.cloud import certificate_manager_v1, compute_v1, iam_admin_v1
+from google.longrunning import operations_pb2
+
+from common import client_registry
+
+class FakeBackendConfig:
+    """Latency, error and long-running operation settings shared by all fake clients."""
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 lro_seconds: float = 0.0, seed: Optional[int] = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.lro_seconds = lro_seconds
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def rpc(self, method: str) -> None:
+        """Simulate one RPC: sleep for the configured latency and maybe fail."""
+        with self._lock:
+            delay = self.latency + self._random.uniform(0, self.jitter)
+            fail = self._random.random() < self.error_rate
+        if delay:
+            time.sleep(delay)
+        if fail:
+            raise google_exceptions.ServiceUnavailable(f"Injected failure in {method}")
+
+class FakeOperation:
+    """A long-running operation that completes `lro_seconds` after it was started."""
+
+    _ids = itertools.count()
+
+    def __init__(self, config: FakeBackendConfig, result=None, parent: str = 'projects/fake/locations/global'):
+        self._config = config
+        self._result = result
+        self._done_at = time.monotonic() + config.lro_seconds
+        self.operation = operations_pb2.Operation(name=f"{parent}/operations/op-{next(self._ids)}")
+
+    def done(self) -> bool:
+        return time.monotonic() >= self._done_at
+
+    def result(self, timeout: Optional[float] = None):
+        remaining = self._done_at - time.monotonic()
+        if timeout is not None and remaining > timeout:
+            time.sleep(max(timeout, 0))
+            raise TimeoutError("Operation did not complete within the timeout")
+        if remaining > 0:
+            time.sleep(remaining)
+        return self._result
+
+class FakeInstancesClient:
+    """Fake of compute_v1.InstancesClient keeping instance status in memory."""
+
+    def __init__(self, config: FakeBackendConfig, instances: Optional[Dict[tuple, Dict]] = None):
+        self.config = config
+        # (project, zone, instance) -> {"status": str, "labels": dict}
+        self.instances = instances if instances is not None else {}
+        self._lock = threading.Lock()
+
+    def _set_status(self, method: str, project: str, zone: str, instance: str, status: str):
+        self.config.rpc(method)
+        with self._lock:
+            if (project, zone, instance) not in self.instances:
+                raise google_exceptions.NotFound(f"Instance {instance} not found")
+            self.instances[(project, zone, instance)]["status"] = status
+        return FakeOperation(self.config)
+
+    def start(self, project: str, zone: str, instance: str):
+        return self._set_status('start', project, zone, instance, 'RUNNING')
+
+    def stop(self, project: str, zone: str, instance: str):
+        return self._set_status('stop', project, zone, instance, 'TERMINATED')
+
+    def reset(self, project: str, zone: str, instance: str):
+        return self._set_status('reset', project, zone, instance, 'RUNNING')
+
+    def get(self, project: str, zone: str, instance: str) -> compute_v1.Instance:
+        self.config.rpc('get')
+        with self._lock:
+            data = self.instances.get((project, zone, instance))
+        if data is None:
+            raise google_exceptions.NotFound(f"Instance {instance} not found")
+        return compute_v1.Instance(name=instance, status=data["status"], labels=data.get("labels", {}))
+
+    def aggregated_list(self, request: compute_v1.AggregatedListInstancesRequest):
+        self.config.rpc('aggregated_list')
+        labels = {}
+        for expression in filter(None, request.filter.replace('(', '').split(')')):
+            key, _, value = expression.strip().partition(' = ')
+            if key.startswith('labels.'):
+                labels[key[len('labels.'):]] = value.strip('"')
+        zones: Dict[str, List[compute_v1.Instance]] = {}
+        with self._lock:
+            for (project, zone, instance), data in sorted(self.instances.items()):
+                if project != request.project:
+                    continue
+                if any(data.get("labels", {}).get(k) != v for k, v in labels.items()):
+                    continue
+                zones.setdefault(f"zones/{zone}", []).append(compute_v1.Instance(
+                    name=instance, status=data["status"], labels=data.get("labels", {}),
+                    zone=f"https://www.googleapis.com/compute/v1/projects/{project}/zones/{zone}",
+                    machine_type=data.get("machine_type", ''),
+                ))
+        return [(scope, compute_v1.InstancesScopedList(instances=instances)) for scope, instances in zones.items()]
+
+class FakeIAMClient:
+    """Fake of iam_admin_v1.IAMClient keeping service account keys in memory."""
+
+    def __init__(self, config: FakeBackendConfig):
+        self.config = config
+        # service account resource name -> {key_id: ServiceAccountKey}
+        self.keys: Dict[str, Dict[str, iam_admin_v1.ServiceAccountKey]] = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+
+    def add_service_account(self, project_id: str, email: str, key_count: int = 0,
+                            created: Optional[datetime] = None) -> None:
+        name = f"projects/{project_id}/serviceAccounts/{email}"
+        self.keys.setdefault(name, {})
+        for _ in range(key_count):
+            self._add_key(name, created)
+
+    def _add_key(self, account: str, created: Optional[datetime] = None) -> iam_admin_v1.ServiceAccountKey:
+        key_id = f"key{next(self._ids):06d}"
+        key = iam_admin_v1.ServiceAccountKey(
+            name=f"{account}/keys/{key_id}",
+            private_key_data=b'{"type": "service_account"}',
+            valid_after_time=created or datetime.now(timezone.utc),
+            key_origin=iam_admin_v1.ServiceAccountKeyOrigin.GOOGLE_PROVIDED,
+        )
+        self.keys[account][key_id] = key
+        return key
+
+    def _find(self, name: str):
+        account, _, key_id = name.rpartition('/keys/')
+        with self._lock:
+            key = self.keys.get(account, {}).get(key_id)
+        if key is None:
+            raise google_exceptions.NotFound(f"Key {name} not found")
+        return account, key_id, key
+
+    def create_service_account_key(self, name: str) -> iam_admin_v1.ServiceAccountKey:
+        self.config.rpc('create_service_account_key')
+        with self._lock:
+            if name not in self.keys:
+                raise google_exceptions.NotFound(f"Service account {name} not found")
+            if len(self.keys[name]) >= 10:
+                raise google_exceptions.FailedPrecondition("Key limit reached")
+            return self._add_key(name)
+
+    def delete_service_account_key(self, name: str) -> None:
+        self.config.rpc('delete_service_account_key')
+        account, key_id, _ = self._find(name)
+        with self._lock:
+            self.keys[account].pop(key_id, None)
+
+    def enable_service_account_key(self, name: str) -> None:
+        self.config.rpc('enable_service_account_key')
+        self._find(name)[2].disabled = False
+
+    def disable_service_account_key(self, name: str) -> None:
+        self.config.rpc('disable_service_account_key')
+        self._find(name)[2].disabled = True
+
+    def get_service_account_key(self, name: str) -> iam_admin_v1.ServiceAccountKey:
+        self.config.rpc('get_service_account_key')
+        return self._find(name)[2]
+
+    def list_service_account_keys(self, request=None, name: Optional[str] = None):
+        self.config.rpc('list_service_account_keys')
+        name = request.name if request is not None else name
+        with self._lock:
+            keys = list(self.keys.get(name, {}).values())
+        return iam_admin_v1.ListServiceAccountKeysResponse(keys=keys)
+
+    def list_service_accounts(self, request: iam_admin_v1.ListServiceAccountsRequest):
+        self.config.rpc('list_service_accounts')
+        prefix = f"{request.name}/serviceAccounts/"
+        with self._lock:
+            names = [name for name in self.keys if name.startswith(prefix)]
+        return [iam_admin_v1.ServiceAccount(name=name, email=name[len(prefix):]) for name in names]
+
+class _FakePage:
+    def __init__(self, certificates, next_page_token):
+        self.certificates = certificates
+        self.next_page_token = next_page_token
+
+class _FakeCertificatePager:
+    def __init__(self, client, request):
+        self._client = client
+        self._request = request
+
+    @property
+    def pages(self):
+        token = self._request.page_token
+        while True:
+            page = self._client._page(self._request, token)
+            yield page
+            if not page.next_page_token:
+                return
+            token = page.next_page_token
+
+    def __iter__(self):
+        for page in self.pages:
+            yield from page.certificates
+
+class FakeCertificateManagerClient:
+    """Fake of certificate_manager_v1.CertificateManagerClient keeping certificates in memory."""
+
+    def __init__(self, config: FakeBackendConfig):
+        self.config = config
+        self.certificates: Dict[str, certificate_manager_v1.Certificate] = {}
+        self.operations: Dict[str, FakeOperation] = {}
+        self._lock = threading.Lock()
+
+    def _operation(self, result, parent: str) -> FakeOperation:
+        operation = FakeOperation(self.config, result, parent)
+        self.operations[operation.operation.name] = operation
+        return operation
+
+    def add_certificate(self, project_id: str, certificate_id: str, **fields) -> certificate_manager_v1.Certificate:
+        """Seed a certificate without going through the simulated RPC."""
+        name = f"projects/{project_id}/locations/global/certificates/{certificate_id}"
+        certificate = certificate_manager_v1.Certificate(name=name, update_time=datetime.now(timezone.utc), **fields)
+        self.certificates[name] = certificate
+        return certificate
+
+    def create_certificate(self, parent: str, certificate_id: str, certificate: certificate_manager_v1.Certificate):
+        self.config.rpc('create_certificate')
+        name = f"{parent}/certificates/{certificate_id}"
+        stored = certificate_manager_v1.Certificate(certificate)
+        stored.name = name
+        stored.update_time = datetime.now(timezone.utc)
+        with self._lock:
+            if name in self.certificates:
+                raise google_exceptions.AlreadyExists(f"Certificate {name} already exists")
+            self.certificates[name] = stored
+        return self._operation(stored, parent)
+
+    def delete_certificate(self, name: str):
+        self.config.rpc('delete_certificate')
+        with self._lock:
+            if self.certificates.pop(name, None) is None:
+                raise google_exceptions.NotFound(f"Certificate {name} not found")
+        return self._operation(None, name.rsplit('/certificates/', 1)[0])
+
+    def get_certificate(self, name: str) -> certificate_manager_v1.Certificate:
+        self.config.rpc('get_certificate')
+        with self._lock:
+            certificate = self.certificates.get(name)
+        if certificate is None:
+            raise google_exceptions.NotFound(f"Certificate {name} not found")
+        return certificate
+
+    def update_certificate(self, certificate: certificate_manager_v1.Certificate, update_mask):
+        self.config.rpc('update_certificate')
+        with self._lock:
+            stored = self.certificates.get(certificate.name)
+            if stored is None:
+                raise google_exceptions.NotFound(f"Certificate {certificate.name} not found")
+            for path in update_mask.paths:
+                if path == 'description':
+                    stored.description = certificate.description
+                elif path == 'managed.domains':
+                    stored.managed.domains = certificate.managed.domains
+            stored.update_time = datetime.now(timezone.utc)
+        return self._operation(stored, certificate.name.rsplit('/certificates/', 1)[0])
+
+    def list_certificates(self, request: certificate_manager_v1.ListCertificatesRequest):
+        return _FakeCertificatePager(self, request)
+
+    def _page(self, request, token: str) -> _FakePage:
+        self.config.rpc('list_certificates')
+        prefix = f"{request.parent}/certificates/"
+        with self._lock:
+            names = sorted(name for name in self.certificates if name.startswith(prefix))
+            start = int(token) if token else 0
+            size = request.page_size or 100
+            certificates = [self.certificates[name] for name in names[start:start + size]]
+        next_token = str(start + size) if start + size < len(names) else ''
+        return _FakePage(certificates, next_token)
+
+    def get_operation(self, request: operations_pb2.GetOperationRequest) -> operations_pb2.Operation:
+        self.config.rpc('get_operation')
+        operation = self.operations.get(request.name)
+        if operation is None:
+            raise google_exceptions.NotFound(f"Operation {request.name} not found")
+        status = operations_pb2.Operation(name=request.name, done=operation.done())
+        if status.done and operation._result is not None:
+            status.response.value = certificate_manager_v1.Certificate.serialize(operation._result)
+        return status
+
+def install_fake_clients(config: FakeBackendConfig) -> Dict[str, object]:
+    """
+    Replace the shared clients with fakes so every handler talks to the fake backend.
+
+    Returns:
+        Dict[str, object]: The installed fakes, keyed by their client registry name.
+    """
+    client_registry.reset_clients()
+    fakes = {
+        'compute.instances': FakeInstancesClient(config),
+        'iam': FakeIAMClient(config),
+        'certificate_manager': FakeCertificateManagerClient(config),
+    }
+    for name, fake in fakes.items():
+        client_registry.get_client(name, lambda fake=fake: fake)
+    return fakes
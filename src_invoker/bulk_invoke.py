@@ -0,0 +1,249 @@
+import json
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+DEFAULT_MAX_IN_FLIGHT = 10
+DEFAULT_MAX_RETRIES = 5
+RETRY_INITIAL_DELAY = 0.5
+RETRY_MAX_DELAY = 30.0
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+# Actions that only read state, across all services, and so are safe to send again
+READ_ONLY_ACTIONS = frozenset({'get', 'list', 'status', 'operation_status', 'job_status', 'validate'})
+# Latency percentiles of a run are estimated from a uniform sample of at most this many requests
+LATENCY_SAMPLE_SIZE = 10000
+
+
+class RateLimiter:
+    """Space calls evenly so that no more than `rate` start per second."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next - now
+            self._next = max(self._next, now) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+
+
+class LatencySample:
+    """A fixed-size uniform random sample of a stream of latencies (reservoir sampling)."""
+
+    def __init__(self, size=LATENCY_SAMPLE_SIZE):
+        self.size = size
+        self.values = []
+        self.seen = 0
+        self._lock = threading.Lock()
+
+    def add(self, value):
+        with self._lock:
+            self.seen += 1
+            if len(self.values) < self.size:
+                self.values.append(value)
+                return
+            slot = random.randrange(self.seen)
+            if slot < self.size:
+                self.values[slot] = value
+
+    def percentile(self, pct):
+        with self._lock:
+            return percentile(self.values, pct)
+
+
+def percentile(values, pct):
+    """Return the nearest-rank percentile of a list of numbers, or None if it is empty."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(int(round(pct / 100.0 * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def retry_delay(attempt, response=None):
+    """Return how long to wait before retrying, honouring Retry-After when the server sends it."""
+    if response is not None and response.headers.get('Retry-After', '').isdigit():
+        return float(response.headers['Retry-After'])
+    delay = min(RETRY_INITIAL_DELAY * (2 ** attempt), RETRY_MAX_DELAY)
+    return random.uniform(delay / 2, delay)
+
+
+def is_retry_safe(payload):
+    """
+    Return whether a payload may be sent again after a response that does not say whether it was applied.
+
+    That is the case for read-only actions and for requests carrying an
+    'idempotency_key'. A batch is retry-safe when all of its actions are.
+    """
+    if payload.get('idempotency_key'):
+        return True
+    if payload.get('action') == 'batch':
+        actions = payload.get('actions') or []
+        return bool(actions) and all(is_retry_safe(action) for action in actions)
+    return payload.get('action') in READ_ONLY_ACTIONS
+
+
+def read_payloads(lines):
+    """
+    Yield (index, payload, error) triples from JSONL lines, skipping blank lines.
+
+    A line that is not valid JSON yields a None payload and the parse error, so one
+    bad line does not stop the lines after it.
+    """
+    index = 0
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield index, json.loads(line), None
+        except json.JSONDecodeError as e:
+            yield index, None, f"Invalid JSON: {e}"
+        index += 1
+
+
+def invoke_with_retry(invoker, function_url, payload, limiter, max_retries=DEFAULT_MAX_RETRIES):
+    """
+    Send one payload, retrying failures with jittered backoff.
+
+    A 429 response or a timed-out connection attempt means the request was not
+    applied, so it is always retried. A 5xx response, a timeout or a dropped
+    connection leaves it unknown whether the request was applied; these are only
+    retried for payloads that are safe to send again (see `is_retry_safe`), and are
+    otherwise returned at once with 'ambiguous' set.
+
+    Returns:
+        dict: The record written to the output, with status, attempts, latency and response or error.
+    """
+    started = time.monotonic()
+    retry_safe = is_retry_safe(payload)
+    attempt = 0
+    while True:
+        limiter.acquire()
+        response = None
+        try:
+            response = invoker.post(function_url, payload)
+            if response.status_code not in RETRYABLE_STATUS_CODES or attempt >= max_retries:
+                break
+            if response.status_code != 429 and not retry_safe:
+                return _record(response, attempt, started, ambiguous=True)
+        except requests.RequestException as e:
+            applied_unknown = not isinstance(e, requests.ConnectTimeout)
+            if attempt >= max_retries or (applied_unknown and not retry_safe):
+                record = {
+                    "status": None,
+                    "attempts": attempt + 1,
+                    "latency_ms": round((time.monotonic() - started) * 1000, 1),
+                    "error": str(e),
+                }
+                if applied_unknown and not retry_safe:
+                    record["ambiguous"] = True
+                return record
+        time.sleep(retry_delay(attempt, response))
+        attempt += 1
+
+    return _record(response, attempt, started)
+
+
+def _record(response, attempt, started, ambiguous=False):
+    """Build the output record for a response."""
+    try:
+        body = response.json()
+    except ValueError:
+        body = response.text
+    record = {
+        "status": response.status_code,
+        "attempts": attempt + 1,
+        "latency_ms": round((time.monotonic() - started) * 1000, 1),
+        "response": body,
+    }
+    if ambiguous:
+        # The request may or may not have been applied; check before sending it again
+        record["ambiguous"] = True
+    return record
+
+
+def run_bulk(invoker, function_url, lines, output, max_in_flight=DEFAULT_MAX_IN_FLIGHT,
+             rate=None, max_retries=DEFAULT_MAX_RETRIES):
+    """
+    Send every JSONL payload in `lines` to the function and write one JSONL record per response.
+
+    Payloads are read lazily and at most `max_in_flight` requests are outstanding at
+    any time, and latency percentiles come from a sample of at most LATENCY_SAMPLE_SIZE
+    requests, so memory stays flat however large the input is. Records are written
+    in completion order and carry the 'index' of their input line. A line that is not
+    valid JSON gets an error record and is not sent.
+
+    Args:
+        invoker (FunctionInvoker): The invoker used to send requests.
+        function_url (str): The function URL.
+        lines (Iterable[str]): JSONL request payloads.
+        output (TextIO): Where response records are written.
+        max_in_flight (int): The maximum number of concurrent requests.
+        rate (float, optional): The maximum number of requests started per second.
+        max_retries (int): The maximum number of retries per request.
+
+    Returns:
+        dict: A summary with counts, elapsed time, throughput and latency percentiles.
+    """
+    limiter = RateLimiter(rate)
+    slots = threading.BoundedSemaphore(max_in_flight)
+    write_lock = threading.Lock()
+    latencies = LatencySample()
+    counts = {"succeeded": 0, "failed": 0}
+    started = time.monotonic()
+
+    def _run(index, payload, error):
+        try:
+            if error is not None:
+                record = {"status": None, "attempts": 0, "latency_ms": None, "error": error}
+            else:
+                record = invoke_with_retry(invoker, function_url, payload, limiter, max_retries)
+        except Exception as e:
+            record = {"status": None, "attempts": 1, "latency_ms": None, "error": str(e)}
+        finally:
+            slots.release()
+        record = {"index": index, **record}
+        with write_lock:
+            output.write(json.dumps(record) + '\n')
+            output.flush()
+            if record["latency_ms"] is not None:
+                latencies.add(record["latency_ms"])
+            if record["status"] == 200:
+                counts["succeeded"] += 1
+            else:
+                counts["failed"] += 1
+
+    with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+        for index, payload, error in read_payloads(lines):
+            slots.acquire()
+            executor.submit(_run, index, payload, error)
+
+    elapsed = time.monotonic() - started
+    total = counts["succeeded"] + counts["failed"]
+    return {
+        "total": total,
+        "succeeded": counts["succeeded"],
+        "failed": counts["failed"],
+        "elapsed_seconds": round(elapsed, 3),
+        "requests_per_second": round(total / elapsed, 2) if elapsed else None,
+        "latency_ms": {
+            "p50": latencies.percentile(50),
+            "p95": latencies.percentile(95),
+            "p99": latencies.percentile(99),
+        },
+    }
+
+
+def log_summary(summary):
+    logging.info(f"Bulk invocation summary: {json.dumps(summary)}")
@@ -0,0 +1,198 @@
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+
+from bulk_invoke import READ_ONLY_ACTIONS, RETRYABLE_STATUS_CODES, percentile
+
+DEFAULT_HEDGE_PERCENTILE = 95
+DEFAULT_MAX_HEDGES = 1
+# Hedge after this many seconds until an endpoint has MIN_LATENCY_SAMPLES latencies
+INITIAL_HEDGE_DELAY = 2.0
+MIN_LATENCY_SAMPLES = 20
+LATENCY_WINDOW = 200
+# An endpoint is routed around for EJECT_SECONDS after this many failures in a row
+FAILURE_THRESHOLD = 3
+EJECT_SECONDS = 30.0
+
+
+def is_hedgeable(payload, hedge_keyed=False):
+    """
+    Return whether a payload may be sent to more than one endpoint.
+
+    That is the case for read-only actions. A request carrying an 'idempotency_key'
+    is only deduplicated by the function instance that stores the key, so two
+    regions would both apply it; it is hedgeable only with `hedge_keyed`, which is
+    for deployments whose regions share one idempotency store. A batch is
+    hedgeable when all of its actions are.
+    """
+    if hedge_keyed and payload.get('idempotency_key'):
+        return True
+    if payload.get('action') == 'batch':
+        actions = payload.get('actions') or []
+        return bool(actions) and all(is_hedgeable(action, hedge_keyed) for action in actions)
+    return payload.get('action') in READ_ONLY_ACTIONS
+
+
+class EndpointState:
+    """Recent latencies and consecutive failures of one regional endpoint."""
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self.latencies = deque(maxlen=window)
+        self.failures = 0
+        self.ejected_until = 0.0
+        self._lock = threading.Lock()
+
+    def record_success(self, latency):
+        with self._lock:
+            self.latencies.append(latency)
+            self.failures = 0
+            self.ejected_until = 0.0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= FAILURE_THRESHOLD:
+                self.ejected_until = time.monotonic() + EJECT_SECONDS
+
+    def is_healthy(self):
+        # Once the ejection has expired the endpoint gets traffic again; one more failure re-ejects it
+        return self.ejected_until <= time.monotonic()
+
+    def recent_latencies(self):
+        with self._lock:
+            return list(self.latencies)
+
+    def percentile(self, pct):
+        """Return the `pct` latency percentile in seconds, or None until there are enough samples."""
+        latencies = self.recent_latencies()
+        if len(latencies) < MIN_LATENCY_SAMPLES:
+            return None
+        return percentile(latencies, pct)
+
+
+class HedgedInvoker:
+    """
+    Invoke a function deployed in several regions, hedging slow requests to another region.
+
+    Hedgeable payloads (see `is_hedgeable`) are sent to the first healthy endpoint. If
+    no response has arrived once that endpoint's own `hedge_percentile` latency has
+    passed, the payload is also sent to the next endpoint, up to `max_hedges` times, and
+    the first good response wins. A 429/5xx response or connection error fails over to
+    the next endpoint straight away. Other payloads are sent once, to the first healthy
+    endpoint. Endpoints that fail FAILURE_THRESHOLD times in a row are tried last for
+    EJECT_SECONDS.
+
+    Set `hedge_keyed` only when every region's function uses the same shared
+    idempotency store; the default per-instance stores cannot deduplicate across regions.
+    """
+
+    def __init__(self, invoker, function_urls, hedge_percentile=DEFAULT_HEDGE_PERCENTILE,
+                 max_hedges=DEFAULT_MAX_HEDGES, max_in_flight=10, hedge_keyed=False):
+        if not function_urls:
+            raise ValueError("At least one function URL is required")
+        self.invoker = invoker
+        self.function_urls = list(function_urls)
+        self.hedge_percentile = hedge_percentile
+        self.max_hedges = max_hedges
+        self.hedge_keyed = hedge_keyed
+        self.endpoints = {url: EndpointState() for url in self.function_urls}
+        self._executor = ThreadPoolExecutor(max_workers=max_in_flight * (1 + max_hedges))
+
+    def hedge_delay(self, function_url):
+        """Return how long to wait on `function_url` before hedging to the next endpoint."""
+        delay = self.endpoints[function_url].percentile(self.hedge_percentile)
+        return INITIAL_HEDGE_DELAY if delay is None else delay
+
+    def ordered_endpoints(self, preferred=None):
+        """Return the endpoints to try in order: `preferred` first, then configured order, unhealthy ones last."""
+        urls = sorted(self.function_urls, key=lambda url: url != preferred)
+        return sorted(urls, key=lambda url: not self.endpoints[url].is_healthy())
+
+    def _attempt(self, function_url, data):
+        started = time.monotonic()
+        try:
+            response = self.invoker.post(function_url, data)
+        except requests.RequestException as e:
+            self.endpoints[function_url].record_failure()
+            return None, e
+        if response.status_code in RETRYABLE_STATUS_CODES:
+            self.endpoints[function_url].record_failure()
+        else:
+            self.endpoints[function_url].record_success(time.monotonic() - started)
+        return response, None
+
+    def post(self, function_url, data):
+        """
+        Send `data`, preferring the `function_url` endpoint, and return the winning response.
+
+        Raises:
+            requests.RequestException: If every endpoint tried failed to respond.
+        """
+        remaining = self.ordered_endpoints(function_url)
+        if len(remaining) == 1 or not is_hedgeable(data, self.hedge_keyed):
+            response, error = self._attempt(remaining[0], data)
+            if error is not None:
+                raise error
+            return response
+
+        pending = {}
+        hedges = self.max_hedges
+        last_response, last_error = None, None
+
+        def _launch():
+            url = remaining.pop(0)
+            pending[self._executor.submit(self._attempt, url, data)] = url
+            return url
+
+        latest = _launch()
+        while pending:
+            timeout = self.hedge_delay(latest) if remaining and hedges else None
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                hedges -= 1
+                logging.info(f"No response from {latest} after {timeout:.2f}s, hedging")
+                latest = _launch()
+                continue
+            for future in done:
+                pending.pop(future)
+                response, error = future.result()
+                if error is None and response.status_code not in RETRYABLE_STATUS_CODES:
+                    # Slower attempts finish in the background and still count towards latencies
+                    return response
+                if response is not None:
+                    last_response = response
+                else:
+                    last_error = error
+            if not pending and remaining:
+                latest = _launch()
+
+        if last_response is None:
+            raise last_error
+        return last_response
+
+    def stats(self):
+        """Return each endpoint's latency percentiles (in ms), sample count and health."""
+        stats = {}
+        for url, state in self.endpoints.items():
+            latencies = [latency * 1000 for latency in state.recent_latencies()]
+            stats[url] = {
+                "samples": len(latencies),
+                "healthy": state.is_healthy(),
+                "p50": percentile(latencies, 50),
+                "p95": percentile(latencies, 95),
+                "p99": percentile(latencies, 99),
+            }
+        return stats
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
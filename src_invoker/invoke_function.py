@@ -1,12 +1,22 @@
 import requests
+from requests.adapters import HTTPAdapter
+from google.auth import jwt
 from google.auth.transport.requests import Request
 import google.oauth2.id_token
 import parameters
 import logging
+import threading
+import time
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 
+DEFAULT_TIMEOUT = 70
+# ID tokens are valid for about an hour; refresh them this many seconds before they expire
+TOKEN_REFRESH_MARGIN = 300
+DEFAULT_TOKEN_LIFETIME = 3600
+DEFAULT_POOL_SIZE = 10
+
 
 def fetch_token(function_url):
     request = Request()  # Simplified import usage
@@ -25,8 +35,16 @@ def create_headers(token):
     }
     return headers
 
-def send_request(function_url, headers, data):
-    response = requests.post(function_url, headers=headers, json=data, timeout=70)  # Use a variable for clarity
+def token_expiry(token):
+    """Return the expiry time of an ID token, assuming the default lifetime if it cannot be decoded."""
+    try:
+        return float(jwt.decode(token, verify=False)['exp'])
+    except Exception:
+        return time.time() + DEFAULT_TOKEN_LIFETIME
+
+def send_request(function_url, headers, data, session=None, timeout=DEFAULT_TIMEOUT):
+    http = session or requests
+    response = http.post(function_url, headers=headers, json=data, timeout=timeout)
     return response
 
 def handle_response(response):
@@ -36,22 +54,116 @@ def handle_response(response):
         logging.info(f"Error calling function. Status code: {response.status_code}")
     logging.info(f"Response: {response.text}")
 
+class FunctionInvoker:
+    """
+    Invoke Cloud Functions while reusing ID tokens and HTTP connections across calls.
+
+    Tokens are cached per audience and refreshed `refresh_margin` seconds before they
+    expire. Requests go through a pooled `requests.Session`, so repeated calls to the
+    same host keep their connection alive.
+    """
+
+    def __init__(self, token_fetcher=fetch_token, timeout=DEFAULT_TIMEOUT,
+                 pool_size=DEFAULT_POOL_SIZE, refresh_margin=TOKEN_REFRESH_MARGIN):
+        self.timeout = timeout
+        self.refresh_margin = refresh_margin
+        self._token_fetcher = token_fetcher
+        self._tokens = {}  # audience -> (token, expiry)
+        self._lock = threading.Lock()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def get_token(self, audience):
+        """Return a cached ID token for `audience`, fetching a new one when it is close to expiry."""
+        with self._lock:
+            cached = self._tokens.get(audience)
+            if cached is None or cached[1] - self.refresh_margin <= time.time():
+                token = self._token_fetcher(audience)
+                cached = (token, token_expiry(token))
+                self._tokens[audience] = cached
+            return cached[0]
+
+    def post(self, function_url, data):
+        """Send `data` to the function without logging the response."""
+        headers = create_headers(self.get_token(function_url))
+        return send_request(function_url, headers, data, session=self.session, timeout=self.timeout)
+
+    def invoke(self, function_url, data):
+        response = self.post(function_url, data)
+        handle_response(response)
+        return response
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+_default_invoker = None
+_default_invoker_lock = threading.Lock()
+
+def get_default_invoker():
+    """Return the module-wide invoker, creating it on first use."""
+    global _default_invoker
+    with _default_invoker_lock:
+        if _default_invoker is None:
+            _default_invoker = FunctionInvoker()
+        return _default_invoker
+
 def call_cloud_function(function_url, data):
-    token = fetch_token(function_url)
-    headers = create_headers(token)
-    response = send_request(function_url, headers, data)
-    handle_response(response)
-    return response
+    return get_default_invoker().invoke(function_url, data)
 
 if __name__ == "__main__":
+    import argparse
+    import sys
+    import bulk_invoke
+    import hedged_invoke
+
+    parser = argparse.ArgumentParser(description="Invoke the Cloud Function once, or in bulk from a JSONL file.")
+    parser.add_argument('--input', help="JSONL file of request payloads to send in bulk ('-' for stdin)")
+    parser.add_argument('--output', default='-', help="Where to write JSONL responses in bulk mode ('-' for stdout)")
+    parser.add_argument('--max-in-flight', type=int, default=bulk_invoke.DEFAULT_MAX_IN_FLIGHT, help="Maximum concurrent requests")
+    parser.add_argument('--rate', type=float, default=None, help="Maximum requests started per second")
+    parser.add_argument('--max-retries', type=int, default=bulk_invoke.DEFAULT_MAX_RETRIES, help="Retries per request on 429/5xx")
+    parser.add_argument('--hedge-percentile', type=float, default=hedged_invoke.DEFAULT_HEDGE_PERCENTILE,
+                        help="Latency percentile after which hedgeable requests are also sent to the next region")
+    parser.add_argument('--hedge-keyed', action='store_true',
+                        help="Also hedge requests with an idempotency_key (only if all regions share one idempotency store)")
+    args = parser.parse_args()
+
     # get values from parameters.py
     project_id = parameters.project_id
     region = parameters.region
     function_name = parameters.function_name
     function_url = f"https://{region}-{project_id}.cloudfunctions.net/{function_name}"
+    function_urls = [f"https://{r}-{project_id}.cloudfunctions.net/{function_name}" for r in parameters.regions]
     logging.info(f"Target function: {function_url}")  # Capitalized "Target" for consistency
-    data = {
-        "action": "hello",
-        "target": "world",
-    }
-    call_cloud_function(function_url , data)
\ No newline at end of file
+
+    def _hedged(invoker):
+        return hedged_invoke.HedgedInvoker(invoker, function_urls, args.hedge_percentile,
+                                           max_in_flight=args.max_in_flight, hedge_keyed=args.hedge_keyed)
+
+    if args.input:
+        source = sys.stdin if args.input == '-' else open(args.input)
+        output = sys.stdout if args.output == '-' else open(args.output, 'w')
+        with FunctionInvoker(pool_size=args.max_in_flight) as invoker, _hedged(invoker) as hedged, source, output:
+            summary = bulk_invoke.run_bulk(hedged, function_url, source, output, args.max_in_flight,
+                                           args.rate, args.max_retries)
+            if len(function_urls) > 1:
+                summary["endpoints"] = hedged.stats()
+        bulk_invoke.log_summary(summary)
+    else:
+        data = {
+            "action": "hello",
+            "target": "world",
+        }
+        if len(function_urls) > 1:
+            with _hedged(get_default_invoker()) as hedged:
+                handle_response(hedged.post(function_url, data))
+        else:
+            call_cloud_function(function_url , data)
@@ -23,4 +23,8 @@ else:
     project_id = "default-project"
     region = "asia-southeast1"
     function_name = "function-2"
-    os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = "test.json"
\ No newline at end of file
+    os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = "test.json"
+
+# Regions the function is deployed to, nearest first. With more than one, the invoker
+# hedges slow read-only requests to the next region (see hedged_invoke.py).
+regions = [r.strip() for r in os.environ.get('FUNCTION_REGIONS', region).split(',') if r.strip()]
\ No newline at end of file